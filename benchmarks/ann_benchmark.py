@@ -0,0 +1,106 @@
+"""
+Recall-vs-latency benchmark for the FAISS index types and vector storage modes selectable in
+configs/dev.yaml (faiss_db.index.type / faiss_db.index.storage). Every index is built with the
+same code path FaissManager uses and compared against exact float32 search at full dimension.
+
+--dims also truncates the vectors to their first N components (what the embedding API returns
+for `embedding_model.openai.dimensions`). Synthetic vectors are not Matryoshka-trained, so for a
+meaningful truncation number pass real embeddings with --vectors (an (n, dim) .npy file).
+
+Usage:
+    python -m benchmarks.ann_benchmark --n 100000 --dim 1536 --queries 200
+    python -m benchmarks.ann_benchmark --types flat hnsw --storage float32 float16 int8 binary
+    python -m benchmarks.ann_benchmark --vectors emb.npy --dims 1536 512 256 --types flat
+"""
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from src.core.document_ingestion.faiss_index import (
+    INDEX_TYPES, STORAGE_TYPES, build_index, resolve_index_config,
+)
+
+
+def clustered_vectors(n: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    """Gaussian blobs around random centres: closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    x = centres[labels] + 0.3 * rng.normal(size=(n, dim)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def truncate(x: np.ndarray, dims: int) -> np.ndarray:
+    x = np.ascontiguousarray(x[:, :dims])
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def main(args) -> None:
+    if args.vectors:
+        vectors = np.load(args.vectors).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        rng = np.random.default_rng(1)
+        picked = rng.choice(len(vectors), size=args.queries, replace=False)
+        queries, data = vectors[picked], np.delete(vectors, picked, axis=0)
+    else:
+        data = clustered_vectors(args.n, args.dim, args.clusters)
+        queries = clustered_vectors(args.queries, args.dim, args.clusters, seed=1)
+    n, full_dim = data.shape
+
+    exact = faiss.IndexFlatL2(full_dim)
+    exact.add(data)
+    _, truth = exact.search(queries, args.k)
+
+    print(f"n={n} dim={full_dim} queries={args.queries} k={args.k} (truth: exact float32 at full dim)")
+    print(f"{'type':<10}{'storage':<9}{'dims':>6}{'build_s':>9}{'index_MB':>10}{'recall@k':>10}{'ms/query':>10}")
+    for dims in args.dims or [full_dim]:
+        d_data, d_queries = (data, queries) if dims == full_dim else (truncate(data, dims), truncate(queries, dims))
+        for kind in args.types:
+            for storage in args.storage:
+                if kind == "ivf_pq" and storage != "float32":
+                    continue  # PQ codes replace the stored vectors
+                if storage == "binary" and kind != "flat":
+                    continue
+                cfg = resolve_index_config({"index": {
+                    "type": kind, "storage": storage, "nlist": args.nlist, "nprobe": args.nprobe, "M": args.M,
+                    "ef_search": args.ef_search, "pq_m": args.pq_m, "rescore_factor": args.rescore_factor,
+                }})
+                t0 = time.perf_counter()
+                index = build_index(d_data, cfg)
+                index.add(d_data)
+                build_s = time.perf_counter() - t0
+
+                t0 = time.perf_counter()
+                _, found = index.search(d_queries, args.k)
+                ms = (time.perf_counter() - t0) * 1000 / args.queries
+
+                size_mb = faiss.serialize_index(index).nbytes / 1e6
+                print(f"{kind:<10}{storage:<9}{dims:>6}{build_s:>9.2f}{size_mb:>10.1f}"
+                      f"{recall_at_k(found, truth):>10.3f}{ms:>10.3f}")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--n", type=int, default=50000)
+    p.add_argument("--dim", type=int, default=1536)
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--clusters", type=int, default=200)
+    p.add_argument("--k", type=int, default=10)
+    p.add_argument("--vectors", help="real embeddings (.npy, shape (n, dim)) instead of synthetic data")
+    p.add_argument("--types", nargs="+", default=list(INDEX_TYPES))
+    p.add_argument("--storage", nargs="+", default=list(STORAGE_TYPES))
+    p.add_argument("--dims", nargs="+", type=int, help="Matryoshka truncations to test, e.g. 1536 512 256")
+    p.add_argument("--rescore-factor", dest="rescore_factor", type=int, default=16)
+    p.add_argument("--nlist", type=int, default=1024)
+    p.add_argument("--nprobe", type=int, default=16)
+    p.add_argument("--M", type=int, default=32)
+    p.add_argument("--ef-search", dest="ef_search", type=int, default=64)
+    p.add_argument("--pq-m", dest="pq_m", type=int, default=96)
+    main(p.parse_args())
@@ -0,0 +1,114 @@
+"""
+Deterministic synthetic documents for the offline benchmarks: PDF (PyMuPDF), DOCX (minimal
+WordprocessingML package, readable by docx2txt) and TXT, plus an edited copy of a page list
+for /compare-style workloads.
+"""
+from __future__ import annotations
+
+import random
+import zipfile
+from pathlib import Path
+from typing import List
+from xml.sax.saxutils import escape
+
+import fitz  # PyMuPDF
+
+TOPICS = (
+    "payment", "invoice", "termination", "liability", "warranty", "confidentiality", "delivery",
+    "renewal", "audit", "insurance", "jurisdiction", "subcontractor", "privacy", "security", "pricing",
+    "escalation", "acceptance", "milestone", "penalty", "indemnity",
+)
+FILLER = (
+    "the", "supplier", "customer", "shall", "within", "days", "agreement", "notice", "written", "party",
+    "period", "provided", "service", "schedule", "clause", "terms", "under", "this", "each", "month",
+)
+
+
+def make_pages(n_pages: int, words_per_page: int = 350, seed: int = 0) -> List[str]:
+    """Pages of clause-like paragraphs; each page leans on two topics so queries have real targets."""
+    rng = random.Random(seed)
+    pages = []
+    for i in range(n_pages):
+        topics = rng.sample(TOPICS, 2)
+        paras, words = [], 0
+        while words < words_per_page:
+            n = rng.randint(40, 80)
+            body = [rng.choice(topics) if rng.random() < 0.15 else rng.choice(FILLER) for _ in range(n)]
+            paras.append(f"Clause {i + 1}.{len(paras) + 1} {topics[0].title()}: " + " ".join(body) + ".")
+            words += n
+        pages.append("\n\n".join(paras))
+    return pages
+
+
+def edit_pages(pages: List[str], changed_ratio: float = 0.1, seed: int = 1) -> List[str]:
+    """A revised copy: ~changed_ratio of pages reworded, plus one inserted page near the middle."""
+    rng = random.Random(seed)
+    out = list(pages)
+    for i in rng.sample(range(len(pages)), max(1, int(len(pages) * changed_ratio))):
+        out[i] = out[i].replace("shall", "must").replace("days", "business days", 1) + "\n\nAmended clause."
+    out.insert(len(out) // 2, make_pages(1, seed=seed + 1000)[0])
+    return out
+
+
+def write_pdf(path: Path, pages: List[str], title: str = "Benchmark document") -> Path:
+    doc = fitz.open()
+    for text in pages:
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, 560, 800), text, fontsize=8)
+    doc.set_metadata({"title": title, "author": "Benchmark Author"})
+    doc.save(str(path))
+    doc.close()
+    return path
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+    'officeDocument" Target="word/document.xml"/></Relationships>'
+)
+
+
+def write_docx(path: Path, pages: List[str]) -> Path:
+    paras = "".join(
+        f"<w:p><w:r><w:t xml:space=\"preserve\">{escape(p)}</w:t></w:r></w:p>"
+        for page in pages for p in page.split("\n\n")
+    )
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f"<w:body>{paras}</w:body></w:document>"
+    )
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        z.writestr("_rels/.rels", _RELS)
+        z.writestr("word/document.xml", document)
+    return path
+
+
+def write_txt(path: Path, pages: List[str]) -> Path:
+    path.write_text("\n\n".join(pages), encoding="utf-8")
+    return path
+
+
+WRITERS = {".pdf": write_pdf, ".docx": write_docx, ".txt": write_txt}
+
+
+def write_corpus(target_dir: Path, n_docs: int, pages_per_doc: int, seed: int = 0) -> List[Path]:
+    """n_docs files cycling through PDF, DOCX and TXT, each with distinct content."""
+    target_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(n_docs):
+        ext = (".pdf", ".docx", ".txt")[i % 3]
+        pages = make_pages(pages_per_doc, seed=seed * 10007 + i)
+        paths.append(WRITERS[ext](target_dir / f"doc_{i:03d}{ext}", pages))
+    return paths
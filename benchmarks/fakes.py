@@ -0,0 +1,169 @@
+"""
+Offline stand-ins for the model providers, installed through ModelLoader so every component
+(ingestion, chat, analysis, compare) runs its real code path without network access or API keys.
+
+- FakeChatModel: answers each call site (see metrics.tag_llm) with output its parser accepts,
+  after `latency` seconds plus `completion_tokens / tokens_per_second`; reports token usage.
+- OfflineModelLoader / install_offline_loader(): a ModelLoader serving the fake chat model and
+  the in-process `hashing` embedding provider (or another local provider block).
+"""
+from __future__ import annotations
+
+import asyncio
+import copy
+import json
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from src.common.utils import model_loader
+from src.common.utils.config_loader import load_config
+from src.common.utils.metrics import LLM_CALL_KEY, llm_metrics_callback
+from src.core.document_ingestion.embedding_pipeline import count_tokens
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_PAGE_LABEL_RE = re.compile(r"<<PAGE: ([^>]+)>>")
+_SECTION_RE = re.compile(r"\[Section \d+\]")
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic chat model with a configurable time-to-first-token and generation rate."""
+
+    latency: float = 0.05           # seconds before the first token
+    tokens_per_second: float = 200  # completion speed; 0 = instant
+    model_name: str = "fake-chat"
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name, "latency": self.latency, "tokens_per_second": self.tokens_per_second}
+
+    def _get_ls_params(self, stop: Optional[List[str]] = None, **kwargs: Any):
+        params = super()._get_ls_params(stop=stop, **kwargs)
+        params["ls_model_name"] = self.model_name
+        return params
+
+    # ---------- Responses ----------
+
+    def _respond(self, messages: List[BaseMessage], call: str) -> str:
+        prompt = "\n".join(str(m.content) for m in messages)
+        call = call.removesuffix("_fix")  # output-fixing retries expect the original format
+        if call in ("analysis", "analysis_reduce"):
+            return json.dumps(self._metadata(prompt))
+        if call == "analysis_map":
+            return "Notes: " + " ".join(_WORD_RE.findall(prompt.lower())[-40:])
+        if call in ("compare", "compare_pages"):
+            labels = _PAGE_LABEL_RE.findall(prompt) or ["1"]
+            return json.dumps([{"Page": label, "Changes": f"Wording changed on page {label}"} for label in labels])
+        if call == "rewrite":
+            return str(messages[-1].content)
+        words = _WORD_RE.findall(prompt.lower())
+        return "Based on the context: " + " ".join(words[-60:])
+
+    @staticmethod
+    def _metadata(prompt: str) -> Dict[str, Any]:
+        words = _WORD_RE.findall(prompt.lower())
+        sections = len(_SECTION_RE.findall(prompt))
+        return {
+            "Summary": [" ".join(words[i:i + 12]) for i in range(0, min(len(words), 36), 12)],
+            "Title": " ".join(words[:5]).title() or "Untitled",
+            "Author": ["Benchmark Author"],
+            "DateCreated": "Not Available",
+            "LastModifiedDate": "Not Available",
+            "Publisher": "Not Available",
+            "Language": "English",
+            "PageCount": sections or "Not Available",
+            "SentimentTone": "Neutral",
+        }
+
+    def _call_name(self, run_manager: Any) -> str:
+        return str((getattr(run_manager, "metadata", None) or {}).get(LLM_CALL_KEY, "answer"))
+
+    def _delay(self, completion_tokens: int) -> float:
+        rate = completion_tokens / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        return self.latency + rate
+
+    def _result(self, messages: List[BaseMessage], text: str) -> ChatResult:
+        prompt_tokens = count_tokens("\n".join(str(m.content) for m in messages))
+        completion_tokens = count_tokens(text)
+        message = AIMessage(content=text, usage_metadata={
+            "input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    # ---------- BaseChatModel ----------
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        text = self._respond(messages, self._call_name(run_manager))
+        time.sleep(self._delay(count_tokens(text)))
+        return self._result(messages, text)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        text = self._respond(messages, self._call_name(run_manager))
+        await asyncio.sleep(self._delay(count_tokens(text)))
+        return self._result(messages, text)
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        text = self._respond(messages, self._call_name(run_manager))
+        time.sleep(self.latency)
+        for i, word in enumerate(text.split(" ")):
+            if self.tokens_per_second > 0:
+                time.sleep(1.0 / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+class OfflineModelLoader(model_loader.ModelLoader):
+    """
+    ModelLoader serving FakeChatModel and an in-process embedding provider (the `hashing`
+    provider unless `embedding` names another block of the config); no .env, API keys or network.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None, *, latency: float = 0.05,
+                 tokens_per_second: float = 200, dimensions: int = 384, embedding: Optional[str] = None):
+        # deliberately skips ModelLoader.__init__ (dotenv + API key checks)
+        self.config = copy.deepcopy(config) if config is not None else load_config()
+        self._clients = {}
+        self._lock = threading.RLock()
+        self.warmup_seconds = None
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        emb_cfg = self.config.setdefault("embedding_model", {})
+        if embedding is None:
+            embedding = "benchmark_hashing"
+            emb_cfg[embedding] = {"provider": "hashing", "model_name": f"hashing-{dimensions}",
+                                  "dimensions": int(dimensions)}
+        emb_cfg["active"] = embedding
+
+    def _embedding_block(self):
+        key = self.config["embedding_model"]["active"]  # ignore EMBEDDING_PROVIDER: never reach the API
+        return key, dict(self.config["embedding_model"][key])
+
+    def load_llm(self, temperature: Optional[float] = None):
+        return self._get_or_create(("llm", "fake", self.latency, self.tokens_per_second), lambda: FakeChatModel(
+            latency=self.latency,
+            tokens_per_second=self.tokens_per_second,
+            callbacks=[llm_metrics_callback()],
+        ))
+
+
+def install_offline_loader(loader: OfflineModelLoader) -> Optional[model_loader.ModelLoader]:
+    """Make `loader` the process-wide ModelLoader; returns the previous one."""
+    previous = model_loader._loader
+    model_loader._loader = loader
+    return previous
@@ -0,0 +1,47 @@
+"""
+Concurrent load test against a running API: fires N /chat/query requests at once and reports
+how much their execution windows overlap. With the async request path, wall time should be
+close to the slowest single request rather than the sum of all of them.
+
+Usage:
+    uvicorn src.app.api.main:app --port 8080
+    python -m benchmarks.load_test --session-id <session> --concurrency 8
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+
+async def _one(client: httpx.AsyncClient, args, i: int):
+    start = time.perf_counter()
+    resp = await client.post(
+        f"{args.base_url}/chat/query",
+        data={"question": f"{args.question} ({i})", "session_id": args.session_id, "k": args.k},
+    )
+    return start, time.perf_counter(), resp.status_code
+
+
+async def main(args) -> None:
+    async with httpx.AsyncClient(timeout=args.timeout) as client:
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(_one(client, args, i) for i in range(args.concurrency)))
+        wall = time.perf_counter() - t0
+
+    latencies = sorted(end - start for start, end, _ in results)
+    serial = sum(latencies)
+    print(f"requests={len(results)} ok={sum(1 for *_, s in results if s == 200)}")
+    print(f"wall={wall:.2f}s sum_of_latencies={serial:.2f}s overlap_factor={serial / wall:.2f}x")
+    print(f"p50={latencies[len(latencies) // 2]:.2f}s max={latencies[-1]:.2f}s")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--base-url", default="http://127.0.0.1:8080")
+    p.add_argument("--session-id", required=True)
+    p.add_argument("--question", default="What is this document about?")
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--k", type=int, default=5)
+    p.add_argument("--timeout", type=float, default=120.0)
+    asyncio.run(main(p.parse_args()))
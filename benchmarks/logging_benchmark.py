@@ -0,0 +1,111 @@
+"""
+Logging overhead under concurrent load: each simulated request builds the loggers a request
+builds (one CustomLogger().get_logger() per component constructor) and emits a few INFO events.
+Reports per-request logging time on the calling thread, open file descriptors and log files
+before/after, and how many lines were dropped or sampled.
+
+`--mode legacy` reproduces the previous per-call setup (new FileHandler, basicConfig and
+structlog.configure on every get_logger) for comparison; run each mode in its own process.
+
+Usage:
+    python -m benchmarks.logging_benchmark --requests 2000 --threads 8
+    python -m benchmarks.logging_benchmark --requests 2000 --threads 8 --mode legacy
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import structlog
+
+COMPONENTS = ("ChatIngestor", "FaissManager", "ConversationalRAG", "DocHandler")
+
+
+def open_fds() -> int:
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return -1
+
+
+def legacy_get_logger(log_dir: str, name: str):
+    """The pre-queue CustomLogger().get_logger(): new file path + handlers + global reconfigure."""
+    path = os.path.join(log_dir, f"{datetime.now().strftime('%m_%d_%Y_%H_%M_%S')}.log")
+    file_handler = logging.FileHandler(path)
+    file_handler.setFormatter(logging.Formatter("%(message)s"))
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter("%(message)s"))
+    logging.basicConfig(level=logging.INFO, format="%(message)s", handlers=[console_handler, file_handler])
+    structlog.configure(
+        processors=[
+            structlog.processors.TimeStamper(fmt="iso", utc=True, key="timestamp"),
+            structlog.processors.add_log_level,
+            structlog.processors.EventRenamer(to="event"),
+            structlog.processors.JSONRenderer(),
+        ],
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        cache_logger_on_first_use=True,
+    )
+    return structlog.get_logger(name)
+
+
+def main(args) -> None:
+    log_dir = tempfile.mkdtemp(prefix="logbench-")
+    if args.mode == "queued":
+        from src.common.logger.custom_logger import CustomLogger, configure_logging, logging_stats, shutdown_logging
+        configure_logging(os.path.relpath(log_dir), config={"console": args.console, "sample": args.sample})
+        get_logger = lambda name: CustomLogger(os.path.relpath(log_dir)).get_logger(name)
+    else:
+        if not args.console:
+            sys.stderr = open(os.devnull, "w")
+        get_logger = lambda name: legacy_get_logger(log_dir, name)
+
+    def request(i: int) -> float:
+        start = time.perf_counter()
+        for name in COMPONENTS:
+            log = get_logger(name)
+            for j in range(args.events):
+                log.info("Embeddings resolved" if j % 2 else "Request step", request=i, step=j)
+        return time.perf_counter() - start
+
+    fds_before = open_fds()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        t0 = time.perf_counter()
+        durations = sorted(pool.map(request, range(args.requests)))
+        wall = time.perf_counter() - t0
+    fds_after = open_fds()
+
+    stats = {}
+    if args.mode == "queued":
+        stats = logging_stats()
+        shutdown_logging()  # drain the queue before counting lines
+    files = [f for f in os.listdir(log_dir) if f.endswith(".log")]
+    lines = sum(sum(1 for _ in open(os.path.join(log_dir, f))) for f in files)
+
+    print(f"mode={args.mode} requests={args.requests} threads={args.threads} "
+          f"events/request={len(COMPONENTS) * args.events}", file=sys.__stdout__)
+    print(f"per-request logging: mean={statistics.mean(durations) * 1e6:.0f}us "
+          f"p99={durations[int(len(durations) * 0.99) - 1] * 1e6:.0f}us wall={wall:.2f}s", file=sys.__stdout__)
+    print(f"open fds: before={fds_before} after={fds_after} | log files={len(files)} lines={lines} "
+          f"threads={threading.active_count()}", file=sys.__stdout__)
+    if stats:
+        print(f"dropped(queue full)={stats['dropped_queue_full']} sampled={stats['sampled_events']}",
+              file=sys.__stdout__)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--mode", choices=("queued", "legacy"), default="queued")
+    p.add_argument("--requests", type=int, default=2000)
+    p.add_argument("--threads", type=int, default=8)
+    p.add_argument("--events", type=int, default=4, help="INFO events per component per request")
+    p.add_argument("--console", action="store_true", help="also write to stderr (off: file only)")
+    p.add_argument("--sample", type=lambda s: dict((k, float(v)) for k, v in (kv.split("=") for kv in s.split(","))),
+                   default={}, help='e.g. "Embeddings resolved=0.1"')
+    main(p.parse_args())
@@ -0,0 +1,246 @@
+"""
+Offline end-to-end benchmark: the real ingestion, chat, analysis and compare code paths with the
+model providers replaced through ModelLoader (benchmarks.fakes): a fake chat model with
+configurable latency and token rate, and the in-process hashing embedder or another local
+embedding provider (--embedding). No API keys or network needed, and results only move when our
+code does.
+
+For each corpus size (pages per document) it writes PDF / DOCX / TXT files and runs:
+  ingest   ChatIngestor.built_retriver, one call per file into one session index
+  chat     ConversationalRAG.invoke over distinct questions (answer cache off), --concurrency threads
+  analyze  DocumentAnalyzer.analyze_document per document (map-reduce kicks in on large ones)
+  compare  DocumentComparatorLLM.compare_pages per PDF against an edited copy
+and reports throughput, p50/p95/p99 latency, LLM tokens and peak RSS (process high-water mark,
+so it only grows across workloads).
+
+--save-baseline writes the results as JSON; --baseline compares against one and exits 1 when
+p95 latency or throughput regress by more than --tolerance.
+
+Usage:
+    python -m benchmarks.offline_benchmark --sizes 4 16 64 --docs 6
+    python -m benchmarks.offline_benchmark --save-baseline benchmarks/baselines/offline_benchmark.json
+    python -m benchmarks.offline_benchmark --baseline benchmarks/baselines/offline_benchmark.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from benchmarks.corpus import TOPICS, edit_pages, make_pages, write_corpus, write_pdf
+
+WORKLOADS = ("ingest", "chat", "analyze", "compare")
+DEFAULT_BASELINE = Path(__file__).parent / "baselines" / "offline_benchmark.json"
+
+
+def summarize(latencies: Sequence[float], wall: float, items: float, unit: str) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, round(p * len(ordered)) - 1))] * 1000
+
+    return {
+        "n": len(ordered),
+        "throughput": round(items / wall, 3) if wall > 0 else 0.0,
+        "unit": unit,
+        "mean_ms": round(statistics.mean(ordered) * 1000, 2),
+        "p50_ms": round(pct(0.50), 2),
+        "p95_ms": round(pct(0.95), 2),
+        "p99_ms": round(pct(0.99), 2),
+        "wall_s": round(wall, 3),
+    }
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)  # bytes on macOS, KiB on Linux
+
+
+def timed_calls(fn: Callable[[Any], Any], items: Sequence[Any], concurrency: int = 1):
+    """Run fn over items (optionally on threads); returns (per-call seconds, wall seconds, results)."""
+    def _one(item):
+        start = time.perf_counter()
+        out = fn(item)
+        return time.perf_counter() - start, out
+
+    t0 = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            done = list(pool.map(_one, items))
+    else:
+        done = [_one(item) for item in items]
+    return [d for d, _ in done], time.perf_counter() - t0, [out for _, out in done]
+
+
+def benchmark_config(workdir: Path) -> Dict[str, Any]:
+    """YAML config with every on-disk cache inside `workdir` and the answer cache off."""
+    from src.common.utils.config_loader import load_config
+
+    cfg = json.loads(json.dumps(load_config()))
+    cfg.setdefault("embedding_cache", {})["path"] = str(workdir / "embedding_cache.sqlite")
+    cfg.setdefault("retriever", {}).setdefault("answer_cache", {})["enabled"] = False
+    return cfg
+
+
+def run_benchmark(sizes: Sequence[int], docs: int = 6, queries: int = 20, workloads: Sequence[str] = WORKLOADS,
+                  latency: float = 0.05, tokens_per_second: float = 200, dimensions: int = 384,
+                  concurrency: int = 1, embedding: Optional[str] = None,
+                  workdir: Optional[Path] = None) -> Dict[str, Any]:
+    """Run the selected workloads for every size; returns {"meta": ..., "results": {"<workload>/<size>": ...}}."""
+    from benchmarks.fakes import OfflineModelLoader, install_offline_loader
+    from src.common.utils import extraction_cache
+    from src.common.utils.metrics import LLM_TOKENS
+    from src.core.document_analyzer.data_analysis import DocumentAnalyzer
+    from src.core.document_chat.retrieval import ConversationalRAG
+    from src.core.document_compare.document_comparator import DocumentComparatorLLM
+    from src.core.document_ingestion.data_ingestion import ChatIngestor, DocHandler, DocumentComparator
+    from src.common.utils.parse_workers import pdf_metadata
+
+    workdir = Path(workdir or tempfile.mkdtemp(prefix="offline-bench-"))
+    loader = OfflineModelLoader(benchmark_config(workdir), latency=latency,
+                                tokens_per_second=tokens_per_second, dimensions=dimensions, embedding=embedding)
+    previous_loader = install_offline_loader(loader)
+    previous_extraction = extraction_cache._cache
+    extraction_cache._cache = extraction_cache.ExtractionCache(workdir / "extraction_cache.sqlite")
+
+    results: Dict[str, Dict[str, Any]] = {}
+
+    def record(name: str, size: int, stats: Dict[str, Any], tokens_before: float) -> None:
+        stats["llm_tokens"] = int(LLM_TOKENS.total() - tokens_before)
+        stats["peak_rss_mb"] = peak_rss_mb()
+        results[f"{name}/{size}"] = stats
+        print(f"{name:<8}{size:>6} pages/doc  {stats['throughput']:>9.2f} {stats['unit']:<10}"
+              f"p50={stats['p50_ms']:>9.1f}ms p95={stats['p95_ms']:>9.1f}ms p99={stats['p99_ms']:>9.1f}ms "
+              f"tokens={stats['llm_tokens']:>8} rss={stats['peak_rss_mb']:.0f}MB", file=sys.__stdout__)
+
+    try:
+        for size in sizes:
+            corpus = write_corpus(workdir / f"corpus_{size}", docs, size, seed=size)
+            session = f"bench_{size}"
+
+            if "ingest" in workloads or "chat" in workloads:
+                ingestor = ChatIngestor(temp_base=str(workdir / "data"), faiss_base=str(workdir / "faiss"),
+                                        session_id=session)
+                chunks = 0
+
+                def ingest(path: Path):
+                    nonlocal chunks
+                    with open(path, "rb") as f:
+                        ingestor.built_retriver([f])
+                    chunks += ingestor.last_stats["chunks_added"]
+
+                before = LLM_TOKENS.total()
+                lat, wall, _ = timed_calls(ingest, corpus)
+                stats = summarize(lat, wall, len(corpus) * size, "pages/s")
+                stats["chunks"] = chunks
+                if "ingest" in workloads:
+                    record("ingest", size, stats, before)
+
+            if "chat" in workloads:
+                rag = ConversationalRAG(session_id=session)
+                rag.load_retriever_from_faiss(str(ingestor.faiss_dir), k=5)
+                questions = [f"What does the agreement say about {TOPICS[i % len(TOPICS)]}? ({i})"
+                             for i in range(queries)]
+                before = LLM_TOKENS.total()
+                lat, wall, _ = timed_calls(rag.invoke, questions, concurrency)
+                record("chat", size, summarize(lat, wall, len(questions), "queries/s"), before)
+
+            if "analyze" in workloads:
+                handler = DocHandler(data_dir=str(workdir / "analysis"), session_id=session)
+                analyzer = DocumentAnalyzer()
+                inputs = [(handler.read_pdf(str(p)), pdf_metadata(str(p)) if p.suffix == ".pdf" else None)
+                          for p in corpus]
+                before = LLM_TOKENS.total()
+                lat, wall, _ = timed_calls(lambda x: analyzer.analyze_document(*x), inputs)
+                record("analyze", size, summarize(lat, wall, len(inputs), "docs/s"), before)
+
+            if "compare" in workloads:
+                comparator = DocumentComparator(base_dir=str(workdir / "compare"), session_id=session)
+                llm_compare = DocumentComparatorLLM()
+                pairs = []
+                for i, ref_path in enumerate(p for p in corpus if p.suffix == ".pdf"):
+                    ref_pages = comparator.read_pages(ref_path)
+                    act_path = write_pdf(comparator.session_path / f"edited_{i}.pdf",
+                                         edit_pages(make_pages(size, seed=size * 10007 + i * 3), seed=i))
+                    pairs.append((ref_pages, comparator.read_pages(act_path)))
+                before = LLM_TOKENS.total()
+                lat, wall, _ = timed_calls(lambda x: llm_compare.compare_pages(*x), pairs)
+                record("compare", size, summarize(lat, wall, len(pairs), "pairs/s"), before)
+    finally:
+        install_offline_loader(previous_loader)
+        extraction_cache._cache = previous_extraction
+
+    return {
+        "meta": {
+            "sizes": list(sizes), "docs": docs, "queries": queries, "latency": latency,
+            "tokens_per_second": tokens_per_second, "dimensions": dimensions, "concurrency": concurrency,
+            "embedding": loader.embedding_config().get("model_name"),
+            "python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+
+def compare_to_baseline(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.2) -> List[str]:
+    """Regressions beyond `tolerance` (fraction) in p95 latency or throughput, one line each."""
+    regressions = []
+    for key, cur in report["results"].items():
+        base = baseline.get("results", {}).get(key)
+        if not base:
+            continue
+        if base["p95_ms"] > 0 and cur["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{key}: p95 {base['p95_ms']:.1f}ms -> {cur['p95_ms']:.1f}ms")
+        if base["throughput"] > 0 and cur["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{key}: throughput {base['throughput']:.2f} -> {cur['throughput']:.2f} {cur['unit']}")
+    return regressions
+
+
+def main(args) -> int:
+    from src.common.logger.custom_logger import configure_logging
+    configure_logging(config={"console": args.verbose})  # before any component logger is created
+
+    report = run_benchmark(args.sizes, docs=args.docs, queries=args.queries, workloads=args.workloads,
+                           latency=args.latency, tokens_per_second=args.tokens_per_second,
+                           dimensions=args.dimensions, concurrency=args.concurrency, embedding=args.embedding)
+    if args.save_baseline:
+        Path(args.save_baseline).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.save_baseline).write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"baseline saved to {args.save_baseline}", file=sys.__stdout__)
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        if baseline.get("meta", {}).get("cpus") != report["meta"]["cpus"]:
+            print("note: baseline was recorded with a different CPU count", file=sys.__stdout__)
+        regressions = compare_to_baseline(report, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.__stdout__)
+        if regressions:
+            return 1
+        print(f"no regressions beyond {args.tolerance:.0%} against {args.baseline}", file=sys.__stdout__)
+    return 0
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--sizes", nargs="+", type=int, default=[4, 16, 64], help="pages per document")
+    p.add_argument("--docs", type=int, default=6, help="documents per corpus (cycling PDF, DOCX, TXT)")
+    p.add_argument("--queries", type=int, default=20)
+    p.add_argument("--workloads", nargs="+", choices=WORKLOADS, default=list(WORKLOADS))
+    p.add_argument("--latency", type=float, default=0.05, help="fake LLM seconds before the first token")
+    p.add_argument("--tokens-per-second", dest="tokens_per_second", type=float, default=200)
+    p.add_argument("--dimensions", type=int, default=384, help="hashing embedder dimensions")
+    p.add_argument("--embedding", help="embedding_model block of a local provider (default: hashing)")
+    p.add_argument("--concurrency", type=int, default=1, help="threads issuing chat queries")
+    p.add_argument("--baseline", nargs="?", const=str(DEFAULT_BASELINE), help="compare against a saved report")
+    p.add_argument("--save-baseline", dest="save_baseline", nargs="?", const=str(DEFAULT_BASELINE))
+    p.add_argument("--tolerance", type=float, default=0.2)
+    p.add_argument("--verbose", action="store_true", help="also print the JSON logs to stderr")
+    sys.exit(main(p.parse_args()))
@@ -11,6 +11,16 @@ class Settings(BaseModel):
     UPLOAD_BASE: str = os.getenv("UPLOAD_BASE", "data")
     FAISS_INDEX_NAME: str = os.getenv("FAISS_INDEX_NAME", "index")
 
+    # build LLM/embedding clients at startup instead of on the first request
+    WARM_UP_MODELS: bool = os.getenv("WARM_UP_MODELS", "true").lower() == "true"
+
+    # upload limits (bytes, 0 = unlimited): per file while copying, per request while receiving the body
+    MAX_UPLOAD_BYTES: int = int(os.getenv("MAX_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+    MAX_REQUEST_BYTES: int = int(os.getenv("MAX_REQUEST_BYTES", str(500 * 1024 * 1024)))
+
+    # POST /chat/index returns a job id at once and indexes on the background job workers
+    INDEX_IN_BACKGROUND: bool = os.getenv("INDEX_IN_BACKGROUND", "true").lower() == "true"
+
     # paths for static/UI
     BASE_DIR: Path = Path(__file__).resolve().parent.parent
     STATIC_DIR: Path = BASE_DIR / "static"
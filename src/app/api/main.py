@@ -4,17 +4,46 @@ from fastapi.staticfiles import StaticFiles
 
 from .config import settings
 from .errors import register_error_handlers
+from .middleware import MaxBodySizeMiddleware
+from src.common.utils.model_loader import get_model_loader
+from src.common.utils.concurrency import shutdown_executors
+from src.core.document_ingestion.ingestion_jobs import get_job_queue, shutdown_job_queue
+from src.common.logger.custom_logger import CustomLogger
 from .routes import (
     health_router,
     ui_router,
     analyze_router,
     compare_router,
     chat_router,
+    metrics_router,
 )
 
+log = CustomLogger().get_logger(__name__)
+
 def create_app() -> FastAPI:
     app = FastAPI(title=settings.APP_NAME, version=settings.APP_VERSION)
 
+    # Build the shared model registry once per worker, before the first request
+    @app.on_event("startup")
+    async def warm_up_models() -> None:
+        if not settings.WARM_UP_MODELS:
+            return
+        try:
+            get_model_loader().warm_up()
+        except Exception as e:
+            # keep serving; clients are created lazily on first use instead
+            log.warning("Model warm-up failed", error=str(e))
+
+    # Background ingestion workers; also picks up jobs interrupted by a previous shutdown
+    @app.on_event("startup")
+    async def start_job_workers() -> None:
+        get_job_queue().start()
+
+    @app.on_event("shutdown")
+    async def stop_stage_pools() -> None:
+        shutdown_job_queue()
+        shutdown_executors()
+
     # static mount (same as before)
     app.mount("/static", StaticFiles(directory=str(settings.STATIC_DIR)), name="static")
 
@@ -27,12 +56,16 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
+    # Request size cap, enforced while the body streams in
+    app.add_middleware(MaxBodySizeMiddleware, max_bytes=settings.MAX_REQUEST_BYTES)
+
     # Routers
     app.include_router(ui_router)
     app.include_router(health_router)
     app.include_router(analyze_router)
     app.include_router(compare_router)
     app.include_router(chat_router)
+    app.include_router(metrics_router)
 
     # Errors
     register_error_handlers(app)
@@ -3,6 +3,7 @@ from .ui import router as ui_router
 from .analyze import router as analyze_router
 from .compare import router as compare_router
 from .chat import router as chat_router
+from .metrics import router as metrics_router
 
 __all__ = [
     "health_router",
@@ -10,4 +11,5 @@ __all__ = [
     "analyze_router",
     "compare_router",
     "chat_router",
+    "metrics_router",
 ]
@@ -1,10 +1,13 @@
 from typing import Any, Dict
 from fastapi import APIRouter, UploadFile, File, HTTPException
 from fastapi.responses import JSONResponse
+from ..config import settings
 
 from src.core.document_ingestion.data_ingestion import DocHandler
 from src.core.document_analyzer.data_analysis import DocumentAnalyzer
-from src.common.utils.document_ops import FastAPIFileAdapter, read_pdf_via_handler
+from src.common.utils.document_ops import read_pdf_via_handler
+from src.common.utils.file_io import UploadTooLargeError
+from src.common.utils.concurrency import run_in_stage
 
 router = APIRouter(prefix="/analyze", tags=["analyze"])
 
@@ -12,12 +15,15 @@ router = APIRouter(prefix="/analyze", tags=["analyze"])
 async def analyze_document(file: UploadFile = File(...)) -> Any:
     try:
         dh = DocHandler()
-        saved_path = dh.save_pdf(FastAPIFileAdapter(file))
-        text = read_pdf_via_handler(dh, saved_path)
+        saved_path = await dh.asave_pdf(file, max_bytes=settings.MAX_UPLOAD_BYTES)
+        text = await run_in_stage("parse", read_pdf_via_handler, dh, saved_path)
+        pdf_metadata = await run_in_stage("parse", dh.read_metadata, saved_path)
         analyzer = DocumentAnalyzer()
-        result: Dict = analyzer.analyze_document(text)
+        result: Dict = await analyzer.aanalyze_document(text, pdf_metadata=pdf_metadata)
         return JSONResponse(content=result)
     except HTTPException:
         raise
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {e}")
@@ -1,11 +1,17 @@
-from typing import Any, List, Optional
+import json
+from typing import Any, AsyncIterator, List, Optional
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
 from ..config import settings
 from ..deps import resolve_index_dir
 
 from src.core.document_ingestion.data_ingestion import ChatIngestor
+from src.core.document_ingestion.ingestion_jobs import get_job_queue
 from src.core.document_chat.retrieval import ConversationalRAG
-from src.common.utils.document_ops import FastAPIFileAdapter
+from src.core.document_chat.vectorstore_cache import get_vectorstore_cache
+from src.core.document_chat.answer_cache import get_answer_cache
+from src.common.utils.file_io import UploadTooLargeError
+from src.common.utils.concurrency import run_in_stage
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
@@ -18,24 +24,58 @@ async def chat_build_index(
     chunk_size: int = Form(1000),
     chunk_overlap: int = Form(200),
     k: int = Form(5),
+    background: Optional[bool] = Form(None),
 ) -> Any:
     try:
-        wrapped = [FastAPIFileAdapter(f) for f in files]
         ci = ChatIngestor(
             temp_base=settings.UPLOAD_BASE,
             faiss_base=settings.FAISS_BASE,
             use_session_dirs=use_session_dirs,
             session_id=session_id or None,
         )
+        # chunked async copy to disk (hash + size in the same pass) before the blocking index stage
+        saved = await ci.asave_uploads(
+            files, max_file_bytes=settings.MAX_UPLOAD_BYTES, max_total_bytes=settings.MAX_REQUEST_BYTES
+        )
+        if settings.INDEX_IN_BACKGROUND if background is None else background:
+            queue = get_job_queue()
+            queue.start()
+            job = await run_in_stage("io", queue.submit, "chat_index", {
+                "session_id": ci.session_id,
+                "use_session_dirs": use_session_dirs,
+                "temp_base": settings.UPLOAD_BASE,
+                "faiss_base": settings.FAISS_BASE,
+                "chunk_size": chunk_size,
+                "chunk_overlap": chunk_overlap,
+                "k": k,
+                "files": [{"path": str(sf.path), "name": sf.name, "sha256": sf.sha256, "size": sf.size}
+                          for sf in saved],
+            })
+            return JSONResponse(status_code=202, content={
+                "job_id": job.id, "status": job.status, "session_id": ci.session_id, "k": k,
+                "use_session_dirs": use_session_dirs, "status_url": f"/chat/index/{job.id}",
+            })
         # NOTE: your method name was "built_retriver" in the snippet.
         # If your class actually exposes "build_retriever", update it there.
-        ci.built_retriver(wrapped, chunk_size=chunk_size, chunk_overlap=chunk_overlap, k=k)
-        return {"session_id": ci.session_id, "k": k, "use_session_dirs": use_session_dirs}
+        await run_in_stage(
+            "index", ci.built_retriver, saved, chunk_size=chunk_size, chunk_overlap=chunk_overlap, k=k
+        )
+        return {"session_id": ci.session_id, "k": k, "use_session_dirs": use_session_dirs, **ci.last_stats}
     except HTTPException:
         raise
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Indexing failed: {e}")
 
+# ---------- INDEX JOB STATUS ----------
+@router.get("/index/{job_id}")
+async def chat_index_status(job_id: str) -> Any:
+    job = await run_in_stage("io", get_job_queue().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job.as_dict()
+
 # ---------- QUERY ----------
 @router.post("/query")
 async def chat_query(
@@ -43,15 +83,68 @@ async def chat_query(
     session_id: Optional[str] = Form(None),
     use_session_dirs: bool = Form(True),
     k: int = Form(5),
+    search_type: Optional[str] = Form(None),
 ) -> Any:
     try:
         index_dir = resolve_index_dir(session_id, use_session_dirs)
         # existence check kept in loader (raises 404 if missing)
         rag = ConversationalRAG(session_id=session_id)
-        rag.load_retriever_from_faiss(index_dir, k=k, index_name=settings.FAISS_INDEX_NAME)
-        response = rag.invoke(question, chat_history=[])
+        await run_in_stage(
+            "search", rag.load_retriever_from_faiss, index_dir, k=k, index_name=settings.FAISS_INDEX_NAME,
+            search_type=search_type,
+        )
+        response = await rag.ainvoke(question, chat_history=[])
         return {"answer": response, "session_id": session_id, "k": k, "engine": "LCEL-RAG"}
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Query failed: {e}")
+
+# ---------- QUERY (SSE STREAM) ----------
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+@router.post("/query/stream")
+async def chat_query_stream(
+    question: str = Form(...),
+    session_id: Optional[str] = Form(None),
+    use_session_dirs: bool = Form(True),
+    k: int = Form(5),
+    search_type: Optional[str] = Form(None),
+) -> Any:
+    # resolve + load before streaming starts so missing indexes still fail with a proper status code
+    try:
+        index_dir = resolve_index_dir(session_id, use_session_dirs)
+        rag = ConversationalRAG(session_id=session_id)
+        await run_in_stage(
+            "search", rag.load_retriever_from_faiss, index_dir, k=k, index_name=settings.FAISS_INDEX_NAME,
+            search_type=search_type,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Query failed: {e}")
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            async for ev in rag.astream(question, chat_history=[]):
+                kind = ev.pop("type")
+                if kind == "done":
+                    ev.update({"session_id": session_id, "k": k, "engine": "LCEL-RAG"})
+                yield _sse(kind, ev)
+        except Exception as e:
+            yield _sse("error", {"detail": f"Query failed: {e}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ---------- CACHE STATS ----------
+@router.get("/cache/stats")
+async def chat_cache_stats() -> Any:
+    return {
+        "vectorstore_cache": get_vectorstore_cache().stats(),
+        "answer_cache": get_answer_cache().stats(),
+    }
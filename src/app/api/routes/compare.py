@@ -1,8 +1,10 @@
 from typing import Any
 from fastapi import APIRouter, UploadFile, File, HTTPException
+from ..config import settings
 from src.core.document_ingestion.data_ingestion import DocumentComparator
 from src.core.document_compare.document_comparator import DocumentComparatorLLM
-from src.common.utils.document_ops import FastAPIFileAdapter
+from src.common.utils.file_io import UploadTooLargeError
+from src.common.utils.concurrency import run_in_stage
 
 router = APIRouter(prefix="/compare", tags=["compare"])
 
@@ -15,16 +17,17 @@ async def compare_documents(
     try:
         dc = DocumentComparator()
         
-        ref_path, act_path = dc.save_uploaded_files(
-            FastAPIFileAdapter(reference), FastAPIFileAdapter(actual)
+        ref_path, act_path = await dc.asave_uploaded_files(
+            reference, actual, max_file_bytes=settings.MAX_UPLOAD_BYTES, max_total_bytes=settings.MAX_REQUEST_BYTES
         )
-        # kept for clarity; combine uses internal state
-        _ = (ref_path, act_path)
-        combined_text = dc.combine_documents()
+        ref_pages = await run_in_stage("parse", dc.read_pages, ref_path)
+        act_pages = await run_in_stage("parse", dc.read_pages, act_path)
         comp = DocumentComparatorLLM()
-        df = comp.compare_documents(combined_text)
+        df = await comp.acompare_pages(ref_pages, act_pages)
         return {"rows": df.to_dict(orient="records"), "session_id": dc.session_id}
     except HTTPException:
         raise
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Comparison failed: {e}")
@@ -1,7 +1,10 @@
 from fastapi import APIRouter
+from src.common.utils.model_loader import model_registry_stats
+from src.common.logger.custom_logger import logging_stats
 
 router = APIRouter(tags=["health"])
 
 @router.get("/health")
 def health():
-    return {"status": "ok", "service": "document-portal"}
+    return {"status": "ok", "service": "document-portal", "models": model_registry_stats(),
+            "logging": logging_stats()}
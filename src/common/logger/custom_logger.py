@@ -1,48 +1,234 @@
 import os
+import sys
+import atexit
+import queue
 import logging
+import threading
 from datetime import datetime
+from typing import Any, Dict, Optional
 import structlog
 
-class CustomLogger:
-    def __init__(self, log_dir="logs"):
-        # Ensure logs directory exists
-        self.logs_dir = os.path.join(os.getcwd(), log_dir)
-        os.makedirs(self.logs_dir, exist_ok=True)
+# Fallbacks when `logging:` is absent from the YAML config
+DEFAULT_LOGGING_CONFIG: Dict[str, Any] = {
+    "level": "INFO",
+    "console": True,       # also write JSON lines to stderr
+    "queue_size": 10000,   # records buffered for the writer thread; INFO and below are dropped when full
+    "sample": {},          # event -> fraction of INFO/DEBUG occurrences kept, e.g. {"Embeddings resolved": 0.1}
+}
 
-        # Timestamped log file (for persistence)
-        log_file = f"{datetime.now().strftime('%m_%d_%Y_%H_%M_%S')}.log"
-        self.log_file_path = os.path.join(self.logs_dir, log_file)
 
-    def get_logger(self, name=__file__):
-        logger_name = os.path.basename(name)
+class _QueueLineHandler(logging.Handler):
+    """Enqueues formatted lines for the writer thread; also the sink of `_QueueLogger`."""
 
-        # Configure logging for console + file (both JSON)
-        file_handler = logging.FileHandler(self.log_file_path)
-        file_handler.setLevel(logging.INFO)
-        file_handler.setFormatter(logging.Formatter("%(message)s"))  # Raw JSON lines
+    def __init__(self, q: "queue.Queue[Optional[str]]"):
+        super().__init__()
+        self.queue = q
+        self.dropped = 0
 
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.INFO)
-        console_handler.setFormatter(logging.Formatter("%(message)s"))
+    def put(self, line: str, important: bool) -> None:
+        try:
+            self.queue.put_nowait(line)
+        except queue.Full:
+            if important:
+                self.queue.put(line)  # warnings / errors are never lost
+            else:
+                self.dropped += 1
 
-        logging.basicConfig(
-            level=logging.INFO,
-            format="%(message)s",  # Structlog will handle JSON rendering
-            handlers=[console_handler, file_handler]
-        )
+    def emit(self, record: logging.LogRecord) -> None:
+        # stdlib records (uvicorn, httpx, ...); structlog events bypass this via _QueueLogger
+        try:
+            line = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        self.put(line, record.levelno >= logging.WARNING)
+
+
+class _QueueLogger:
+    """
+    structlog logger writing the rendered JSON line straight to the queue (no LogRecord, no
+    caller lookup). The handler is looked up per call so loggers cached on first use keep
+    working across shutdown_logging() / configure_logging().
+    """
+
+    def debug(self, message: str) -> None:
+        handler = _state.get("queue_handler")
+        if handler is not None:
+            handler.put(message, False)
+
+    info = debug
+
+    def warning(self, message: str) -> None:
+        handler = _state.get("queue_handler")
+        if handler is not None:
+            handler.put(message, True)
+
+    warn = error = critical = fatal = exception = msg = warning
+
+
+class _LineWriter(threading.Thread):
+    """Drains queued lines in batches: one write + flush per batch per sink, not per record."""
+
+    BATCH = 512
+
+    def __init__(self, q: "queue.Queue[Optional[str]]", log_file_path: str, console: bool):
+        super().__init__(name="log-writer", daemon=True)
+        self.queue = q
+        self.log_file_path = log_file_path
+        self.console = console
+
+    def run(self) -> None:
+        with open(self.log_file_path, "a", encoding="utf-8") as f:
+            sinks = [f, sys.stderr] if self.console else [f]
+            stopping = False
+            while not stopping:
+                lines = [self.queue.get()]
+                while len(lines) < self.BATCH:
+                    try:
+                        lines.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if None in lines:  # stop sentinel: write what came before it, then exit
+                    lines = lines[:lines.index(None)]
+                    stopping = True
+                if not lines:
+                    continue
+                text = "\n".join(lines) + "\n"
+                for sink in sinks:
+                    try:
+                        sink.write(text)
+                        sink.flush()
+                    except Exception:
+                        pass  # a closed stderr must not kill the file writer
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self.queue.put(None)
+        self.join(timeout)
+
+
+class _Sampler:
+    """structlog processor keeping 1 in N occurrences of configured high-volume INFO/DEBUG events."""
+
+    def __init__(self, rates: Dict[str, float]):
+        self.every = {event: max(1, round(1 / rate)) for event, rate in rates.items() if 0 < rate < 1}
+        self.muted = {event for event, rate in rates.items() if rate <= 0}
+        self.seen: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, logger: Any, method_name: str, event_dict: Dict[str, Any]) -> Dict[str, Any]:
+        event = event_dict.get("event")
+        if method_name not in ("info", "debug") or not isinstance(event, str):
+            return event_dict
+        if event in self.muted:
+            raise structlog.DropEvent
+        n = self.every.get(event)
+        if n is None:
+            return event_dict
+        with self._lock:
+            seen = self.seen.get(event, 0)
+            self.seen[event] = seen + 1
+        if seen % n:
+            raise structlog.DropEvent
+        event_dict["sampled_1_in"] = n
+        return event_dict
 
+
+_state: Dict[str, Any] = {}
+_configure_lock = threading.Lock()
+
+
+def _logging_config() -> Dict[str, Any]:
+    try:
+        from src.common.utils.config_loader import load_config
+        cfg = load_config().get("logging") or {}
+    except Exception:
+        cfg = {}
+    return {**DEFAULT_LOGGING_CONFIG, **cfg}
+
+
+def configure_logging(log_dir: str = "logs", config: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Configure stdlib logging + structlog once per process; later calls are no-ops.
+
+    Loggers only render the JSON line and enqueue it; a writer thread appends batches of lines to a
+    single timestamped file per process (and to stderr). Returns that file's path.
+    """
+    if _state:
+        return _state["log_file_path"]
+    with _configure_lock:
+        if _state:
+            return _state["log_file_path"]
+        cfg = {**_logging_config(), **(config or {})}
+        level = logging.getLevelName(str(cfg["level"]).upper())
+
+        logs_dir = os.path.join(os.getcwd(), log_dir)
+        os.makedirs(logs_dir, exist_ok=True)
+        # Timestamped log file (for persistence); one per process
+        log_file_path = os.path.join(logs_dir, f"{datetime.now().strftime('%m_%d_%Y_%H_%M_%S')}.log")
+
+        q: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=int(cfg["queue_size"]))
+        queue_handler = _QueueLineHandler(q)
+        queue_handler.setFormatter(logging.Formatter("%(message)s"))  # Raw JSON lines
+        writer = _LineWriter(q, log_file_path, console=bool(cfg.get("console", True)))
+        writer.start()
+
+        # third-party stdlib loggers share the same queue and file
+        root = logging.getLogger()
+        root.setLevel(level)
+        root.addHandler(queue_handler)
+
+        sampler = _Sampler(cfg.get("sample") or {})
         # Configure structlog for JSON structured logging
         structlog.configure(
             processors=[
+                sampler,
                 structlog.processors.TimeStamper(fmt="iso", utc=True, key="timestamp"),
                 structlog.processors.add_log_level,
+                structlog.processors.format_exc_info,
                 structlog.processors.EventRenamer(to="event"),
                 structlog.processors.JSONRenderer()
             ],
-            logger_factory=structlog.stdlib.LoggerFactory(),
+            # below-level calls are no-ops before any processor runs
+            wrapper_class=structlog.make_filtering_bound_logger(level),
+            logger_factory=lambda *args: _QueueLogger(),
             cache_logger_on_first_use=True,
         )
 
+        _state.update(log_file_path=log_file_path, writer=writer, queue_handler=queue_handler, sampler=sampler)
+        atexit.register(shutdown_logging)
+        return log_file_path
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer thread (registered with atexit)."""
+    with _configure_lock:
+        if not _state:
+            return
+        logging.getLogger().removeHandler(_state["queue_handler"])
+        _state["writer"].stop()
+        _state.clear()
+
+
+def logging_stats() -> Dict[str, Any]:
+    if not _state:
+        return {}
+    handler: _QueueLineHandler = _state["queue_handler"]
+    return {
+        "log_file": _state["log_file_path"],
+        "queued": handler.queue.qsize(),
+        "dropped_queue_full": handler.dropped,
+        "sampled_events": dict(_state["sampler"].seen),
+    }
+
+
+class CustomLogger:
+    def __init__(self, log_dir="logs"):
+        # cheap: handlers, the log file and structlog are set up once per process
+        self.log_file_path = configure_logging(log_dir)
+        self.logs_dir = os.path.dirname(self.log_file_path)
+
+    def get_logger(self, name=__file__):
+        logger_name = os.path.basename(name)
         return structlog.get_logger(logger_name)
 
 
@@ -50,4 +236,4 @@ class CustomLogger:
 if __name__ == "__main__":
     logger = CustomLogger().get_logger(__file__)
     logger.info("User uploaded a file", user_id=123, filename="report.pdf")
-    logger.error("Failed to process PDF", error="File not found", user_id=123)
\ No newline at end of file
+    logger.error("Failed to process PDF", error="File not found", user_id=123)
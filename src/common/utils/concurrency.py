@@ -0,0 +1,103 @@
+from __future__ import annotations
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, TypeVar
+
+from src.common.utils.config_loader import load_config
+from src.common.logger.custom_logger import CustomLogger
+
+log = CustomLogger().get_logger(__name__)
+T = TypeVar("T")
+
+# Fallbacks when `concurrency:` is absent from the YAML config
+DEFAULT_LIMITS: Dict[str, int] = {
+    "io": 8,        # upload writes, small file reads
+    "parse": 4,     # threads that hand parse tasks to the process pool and wait on them
+    "index": 2,     # FAISS load/build/save (one writer per index is enforced elsewhere)
+    "search": 8,    # FAISS similarity search
+    "llm": 16,      # in-flight async LLM calls
+    "parse_processes": 0,  # PyMuPDF worker processes (0 = one per CPU)
+}
+
+_limits: Dict[str, int] | None = None
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_process_pool: ProcessPoolExecutor | None = None
+# per event loop, dropped with the loop (tests and workers create and close loops)
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+    weakref.WeakKeyDictionary()
+)
+_lock = threading.Lock()
+
+
+def stage_limits() -> Dict[str, int]:
+    """Per-stage concurrency limits: DEFAULT_LIMITS overlaid with `concurrency:` from config."""
+    global _limits
+    if _limits is None:
+        try:
+            cfg = load_config().get("concurrency") or {}
+        except FileNotFoundError:
+            cfg = {}
+        _limits = {**DEFAULT_LIMITS, **{k: int(v) for k, v in cfg.items()}}
+    return _limits
+
+
+def _executor(stage: str) -> ThreadPoolExecutor:
+    with _lock:
+        ex = _executors.get(stage)
+        if ex is None:
+            workers = stage_limits().get(stage, DEFAULT_LIMITS["io"])
+            ex = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{stage}-worker")
+            _executors[stage] = ex
+            log.info("Stage executor created", stage=stage, workers=workers)
+        return ex
+
+
+async def run_in_stage(stage: str, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run blocking `fn` on the bounded thread pool for `stage`, without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor(stage), functools.partial(fn, *args, **kwargs))
+
+
+@asynccontextmanager
+async def stage_slot(stage: str):
+    """Async semaphore bounding in-flight coroutines of a stage (e.g. LLM calls) per event loop."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        per_loop = _semaphores.get(loop)
+        if per_loop is None:
+            per_loop = _semaphores[loop] = {}
+        sem = per_loop.get(stage)
+        if sem is None:
+            sem = per_loop[stage] = asyncio.Semaphore(stage_limits().get(stage, DEFAULT_LIMITS["llm"]))
+    async with sem:
+        yield
+
+
+def process_pool() -> ProcessPoolExecutor:
+    """Shared process pool for CPU-bound parsing (sized by `concurrency.parse_processes`)."""
+    global _process_pool
+    with _lock:
+        if _process_pool is None:
+            workers = stage_limits().get("parse_processes") or os.cpu_count() or 1
+            # forkserver/spawn: never fork a process that already runs threads (uvicorn, faiss)
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _process_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+            log.info("Parse process pool created", workers=workers, start_method=method)
+        return _process_pool
+
+
+def shutdown_executors() -> None:
+    global _process_pool
+    with _lock:
+        for ex in _executors.values():
+            ex.shutdown(wait=False, cancel_futures=True)
+        _executors.clear()
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
@@ -1,32 +1,145 @@
 from __future__ import annotations
+import os
+from collections import deque
+from concurrent.futures import Future
+from itertools import islice
 from pathlib import Path
-from typing import Iterable, List
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
 from fastapi import UploadFile
 from langchain.schema import Document
-from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
 from src.common.logger.custom_logger import CustomLogger
 from src.common.exception.custom_exception import DocumentPortalException
+from src.common.utils.concurrency import process_pool, stage_limits
+from src.common.utils.metrics import count_items, timed
+from src.common.utils.extraction_cache import ExtractedPage, Extraction, file_sha256, get_extraction_cache
+from src.common.utils.parse_workers import Parsed, parse_docx, parse_pdf_pages, parse_text, pdf_info
 
 log = CustomLogger().get_logger(__name__)
 SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".txt"}
 
 
+PAGES_PER_TASK = 16  # PDF pages per pool task: big PDFs are split across workers too
+_KINDS = {".pdf": "pdf", ".docx": "docx", ".txt": "txt"}
+
+
+def _ordered_results(tasks: List[Tuple[Callable[..., Parsed], tuple]]) -> Iterator[Parsed]:
+    """
+    Run (fn, args) tasks on the shared process pool and yield results in submission order. At
+    most 2x workers tasks are in flight, so parsed text is not buffered far ahead of the consumer.
+    Single tasks go through the pool too: parsing holds the GIL, and the caller is usually a
+    `parse` stage thread of the API process.
+    """
+    if not tasks:
+        return
+
+    pool = process_pool()
+    window = 2 * (stage_limits().get("parse_processes") or os.cpu_count() or 1)
+    pending: Deque[Future] = deque()
+    queued = iter(tasks)
+    try:
+        for fn, args in islice(queued, window):
+            pending.append(pool.submit(fn, *args))
+        while pending:
+            fut = pending.popleft()
+            nxt = next(queued, None)
+            if nxt is not None:
+                pending.append(pool.submit(nxt[0], *nxt[1]))
+            yield fut.result()
+    finally:
+        for fut in pending:
+            fut.cancel()
+
+
+def iter_extractions(paths: Iterable[Path], pages_per_task: int = PAGES_PER_TASK,
+                     shas: Optional[Mapping[str, str]] = None) -> Iterator[Tuple[Path, Extraction]]:
+    """
+    Per-page text of each file, in order. Files whose content hash is in the extraction cache
+    are not opened; the rest are parsed with PyMuPDF / docx2txt on the process pool (PDFs split
+    into page ranges) and stored, so analyze, compare and chat never parse the same bytes twice.
+    `shas` maps str(path) to a sha256 already known (e.g. SavedFile.sha256, computed while the
+    upload streamed in) so those files are not read an extra time just to hash them.
+    """
+    shas = shas or {}
+    cache = get_extraction_cache()
+    plan: List[Tuple[Path, Any, int]] = []  # (path, Extraction | header | sha of an earlier entry, tasks)
+    tasks: List[Tuple[Callable[..., Parsed], tuple]] = []
+    planned = set()
+    for p in map(Path, paths):
+        kind = _KINDS.get(p.suffix.lower())
+        if kind is None:
+            log.warning("Unsupported extension skipped", path=str(p))
+            continue
+        sha = shas.get(str(p)) or file_sha256(p)
+        hit = cache.get(sha) if cache is not None else None
+        if hit is not None:
+            plan.append((p, hit, 0))
+            continue
+        if sha in planned:
+            plan.append((p, sha, 0))  # same bytes twice in one call: parse once
+            continue
+        planned.add(sha)
+        if kind == "pdf":
+            total, encrypted = pdf_info(str(p))
+            file_tasks = [] if encrypted else [
+                (parse_pdf_pages, (str(p), start, start + pages_per_task)) for start in range(0, total, pages_per_task)
+            ]
+        else:
+            total, encrypted = 1, False
+            file_tasks = [(parse_docx if kind == "docx" else parse_text, (str(p),))]
+        plan.append((p, (sha, kind, total, encrypted), len(file_tasks)))
+        tasks.extend(file_tasks)
+
+    results = _ordered_results(tasks)
+    done: Dict[str, Extraction] = {}
+    for p, entry, n_tasks in plan:
+        if isinstance(entry, Extraction):
+            yield p, entry
+        elif isinstance(entry, str):
+            yield p, done[entry]
+        else:
+            sha, kind, total, encrypted = entry
+            pages = tuple(ExtractedPage(index=i, label=label, text=text)
+                          for _ in range(n_tasks) for i, label, text in next(results))
+            extraction = Extraction(sha, kind, total, encrypted, pages)
+            if cache is not None:
+                cache.put(extraction)
+            done[sha] = extraction
+            yield p, extraction
+
+
+def extract_file(path: str | Path) -> Extraction:
+    """Cached per-page text of a single file."""
+    with timed("parse"):
+        for _, extraction in iter_extractions([Path(path)]):
+            count_items("parse", "pages", len(extraction.pages))
+            return extraction
+    raise ValueError(f"Unsupported file type: {path}")
+
+
+def to_documents(path: Path, extraction: Extraction) -> List[Document]:
+    """One Document per PDF page (per file otherwise), with PyPDFLoader-style metadata."""
+    source = str(path)
+    if extraction.kind != "pdf":
+        return [Document(page_content=p.text, metadata={"source": source}) for p in extraction.pages]
+    return [
+        Document(page_content=p.text, metadata={
+            "source": source, "page": p.index, "page_label": p.label, "total_pages": extraction.total_pages,
+        })
+        for p in extraction.pages
+    ]
+
+
+def iter_documents(paths: Iterable[Path], pages_per_task: int = PAGES_PER_TASK,
+                   shas: Optional[Mapping[str, str]] = None) -> Iterator[Document]:
+    """Documents of every file in file and page order (see iter_extractions)."""
+    for path, extraction in iter_extractions(paths, pages_per_task, shas=shas):
+        yield from to_documents(path, extraction)
+
+
 def load_documents(paths: Iterable[Path]) -> List[Document]:
-    """Load docs using appropriate loader based on extension."""
-    docs: List[Document] = []
+    """Load docs (cached page text; misses parsed in parallel across processes) based on extension."""
     try:
-        for p in paths:
-            ext = p.suffix.lower()
-            if ext == ".pdf":
-                loader = PyPDFLoader(str(p))
-            elif ext == ".docx":
-                loader = Docx2txtLoader(str(p))
-            elif ext == ".txt":
-                loader = TextLoader(str(p), encoding="utf-8")
-            else:
-                log.warning("Unsupported extension skipped", path=str(p))
-                continue
-            docs.extend(loader.load())
+        docs = list(iter_documents(paths))
         log.info("Documents loaded", count=len(docs))
         return docs
     except Exception as e:
@@ -51,7 +164,11 @@ class FastAPIFileAdapter:
     def __init__(self, uf: UploadFile):
         self._uf = uf
         self.name = uf.filename
+        self._uf.file.seek(0)
+    def read(self, size: int = -1) -> bytes:
+        return self._uf.file.read(size)
     def getbuffer(self) -> bytes:
+        # whole-file copy; kept for old callers only, file_io streams via read() instead
         self._uf.file.seek(0)
         return self._uf.file.read()
 
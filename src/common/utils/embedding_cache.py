@@ -0,0 +1,154 @@
+from __future__ import annotations
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.common.logger.custom_logger import CustomLogger
+
+log = CustomLogger().get_logger(__name__)
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent content-addressed embedding store (SQLite).
+
+    Rows are keyed by (model_name, dimensions, sha256(text)) and hold the float32 vector bytes,
+    so the same chunk is embedded at most once per model, across sessions and processes.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, dims INTEGER NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, dims, text_hash)) WITHOUT ROWID"
+        )
+
+    def get_many(self, model: str, dims: int, hashes: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        if not hashes:
+            return found
+        with self._lock:
+            # stay under SQLite's bound-parameter limit
+            for i in range(0, len(hashes), 500):
+                batch = hashes[i:i + 500]
+                marks = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model=? AND dims=? AND text_hash IN ({marks})",
+                    (model, dims, *batch),
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, model: str, dims: int, items: Dict[str, List[float]]) -> None:
+        if not items:
+            return
+        rows = [(model, dims, h, np.asarray(v, dtype=np.float32).tobytes()) for h, v in items.items()]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            self._conn.execute("COMMIT")
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that consults an EmbeddingCache before calling the underlying model.
+    Only texts missing from the cache (deduplicated) are sent to the provider. Query vectors are
+    kept in a small in-memory LRU; they are only written to SQLite with `persist_queries`, since
+    one-off questions would otherwise grow the shared store without ever being reused.
+    """
+
+    def __init__(self, inner: Embeddings, cache: EmbeddingCache, model_name: str, dimensions: Optional[int] = None,
+                 query_cache_size: int = 256, persist_queries: bool = False):
+        self.inner = inner
+        self.cache = cache
+        self.model_name = model_name
+        self.dims = int(dimensions or 0)
+        self.query_cache_size = int(query_cache_size)
+        self.persist_queries = bool(persist_queries)
+        self._queries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._queries_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [text_hash(t) for t in texts]
+        found = self.cache.get_many(self.model_name, self.dims, list(dict.fromkeys(hashes)))
+
+        missing: Dict[str, str] = {}
+        for h, t in zip(hashes, texts):
+            if h not in found and h not in missing:
+                missing[h] = t
+
+        if missing:
+            vectors = self.inner.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(self.model_name, self.dims, fresh)
+            found.update(fresh)
+
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        log.info("Embeddings resolved", total=len(texts), cached=len(texts) - len(missing), embedded=len(missing))
+        return [found[h] for h in hashes]
+
+    def lookup(self, texts: List[str]) -> Dict[int, List[float]]:
+        """Vectors already cached, by position in `texts` (no provider call)."""
+        hashes = [text_hash(t) for t in texts]
+        found = self.cache.get_many(self.model_name, self.dims, list(dict.fromkeys(hashes)))
+        return {i: found[h] for i, h in enumerate(hashes) if h in found}
+
+    def embed_query(self, text: str) -> List[float]:
+        h = text_hash(text)
+        with self._queries_lock:
+            vec = self._queries.get(h)
+            if vec is not None:
+                self._queries.move_to_end(h)
+                self.hits += 1
+                return vec
+        found = self.cache.get_many(self.model_name, self.dims, [h])  # e.g. a query equal to a chunk
+        if h in found:
+            vec = found[h]
+            self.hits += 1
+        else:
+            vec = self.inner.embed_query(text)
+            if self.persist_queries:
+                self.cache.put_many(self.model_name, self.dims, {h: vec})
+            self.misses += 1
+        with self._queries_lock:
+            self._queries[h] = vec
+            while len(self._queries) > self.query_cache_size:
+                self._queries.popitem(last=False)
+        return vec
+
+
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(path: str | Path) -> EmbeddingCache:
+    """One shared EmbeddingCache (and SQLite connection) per database path."""
+    key = str(Path(path).resolve())
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = EmbeddingCache(key)
+        return _caches[key]
@@ -0,0 +1,146 @@
+"""
+In-process embedding providers, selected through the `embedding_model` config block.
+
+Besides the OpenAI API (built by ModelLoader), a block may name one of the providers below; they
+run on local CPU with no network, API key or rate limit. EmbeddingPipeline still batches and runs
+`concurrency` batches on threads, so throughput scales with cores for backends that release the
+GIL (numpy, torch, onnxruntime).
+
+    hashing                 feature-hashed word / word-bigram counts; no model files, deterministic
+    sentence_transformers   a SentenceTransformer model from a local directory; `backend: onnx`
+                            runs its ONNX export through onnxruntime instead of torch
+"""
+from __future__ import annotations
+import hashlib
+import os
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Pipeline settings for providers that run in-process: no request / token budget to respect,
+# nothing transient to retry, one batch in flight per core
+LOCAL_PIPELINE_CONFIG: Dict[str, Any] = {
+    "requests_per_minute": 0,
+    "tokens_per_minute": 0,
+    "max_retries": 0,
+    "concurrency": os.cpu_count() or 1,
+}
+
+
+@lru_cache(maxsize=1 << 18)
+def _bucket(token: str, dimensions: int) -> Tuple[int, float]:
+    """(column, sign) of a token; cached because vocabularies repeat heavily across chunks."""
+    h = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+    return h % dimensions, (1.0 if h >> 63 else -1.0)
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Signed feature hashing of lowercased words (plus word bigrams when ngrams=2), L2-normalized.
+    Stateless: vectors never change between runs or machines, so no fitting step and no model
+    files. Captures lexical overlap only, not synonyms.
+    """
+
+    def __init__(self, dimensions: int = 1024, ngrams: int = 1):
+        self.dimensions = int(dimensions)
+        self.ngrams = max(1, int(ngrams))
+
+    def _features(self, text: str) -> List[str]:
+        words = _TOKEN_RE.findall(text.lower())
+        feats = list(words)
+        if self.ngrams > 1:
+            feats.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+        return feats
+
+    def _matrix(self, texts: List[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            feats = self._features(text)
+            if not feats:
+                out[row, 0] = 1.0  # empty / symbol-only text: any unit vector
+                continue
+            cols, signs = zip(*(_bucket(f, self.dimensions) for f in feats))
+            np.add.at(out[row], np.fromiter(cols, dtype=np.int64), np.fromiter(signs, dtype=np.float32))
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0  # every feature cancelled out
+        out[empty, 0], norms[empty] = 1.0, 1.0
+        return out / norms
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._matrix(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._matrix([text])[0].tolist()
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+    """A sentence-transformers model loaded from a local path (optional dependency)."""
+
+    def __init__(self, model_path: str, backend: str = "torch", device: str = "cpu", batch_size: int = 64,
+                 normalize: bool = True):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                "Embedding provider 'sentence_transformers' needs the sentence-transformers package "
+                "(plus onnxruntime / optimum for backend 'onnx')"
+            ) from e
+        if not os.path.isdir(model_path):
+            raise FileNotFoundError(f"Local embedding model directory not found: {model_path}")
+        kwargs: Dict[str, Any] = {"device": device}
+        if backend != "torch":
+            kwargs["backend"] = backend
+        self.model = SentenceTransformer(model_path, **kwargs)
+        self.batch_size = int(batch_size)
+        self.normalize = bool(normalize)
+        self.dimensions = int(self.model.get_sentence_embedding_dimension())
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, batch_size=self.batch_size, normalize_embeddings=self.normalize,
+                                 convert_to_numpy=True, show_progress_bar=False)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(list(texts)).astype(np.float32).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].astype(np.float32).tolist()
+
+
+# ---------- Registry ----------
+
+def _hashing(cfg: Dict[str, Any]) -> Embeddings:
+    return HashingEmbeddings(dimensions=int(cfg.get("dimensions") or 1024), ngrams=int(cfg.get("ngrams", 1)))
+
+
+def _sentence_transformers(cfg: Dict[str, Any]) -> Embeddings:
+    return SentenceTransformerEmbeddings(
+        model_path=cfg.get("model_path") or cfg["model_name"],
+        backend=cfg.get("backend", "torch"),
+        device=cfg.get("device", "cpu"),
+        batch_size=int(cfg.get("batch_size", 64)),
+        normalize=bool(cfg.get("normalize", True)),
+    )
+
+
+LOCAL_EMBEDDING_PROVIDERS: Dict[str, Callable[[Dict[str, Any]], Embeddings]] = {
+    "hashing": _hashing,
+    "sentence_transformers": _sentence_transformers,
+}
+
+
+def register_embedding_provider(name: str, factory: Callable[[Dict[str, Any]], Embeddings]) -> None:
+    """Make `provider: <name>` in an embedding_model block build its model with `factory(block)`."""
+    LOCAL_EMBEDDING_PROVIDERS[name] = factory
+
+
+def build_local_embeddings(cfg: Dict[str, Any]) -> Embeddings:
+    provider = cfg.get("provider")
+    factory = LOCAL_EMBEDDING_PROVIDERS.get(provider)
+    if factory is None:
+        raise ValueError(f"Unsupported embedding provider: {provider}")
+    return factory(cfg)
@@ -0,0 +1,144 @@
+from __future__ import annotations
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from src.common.utils.config_loader import load_config
+from src.common.logger.custom_logger import CustomLogger
+
+log = CustomLogger().get_logger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path: str | Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for piece in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(piece)
+    return digest.hexdigest()
+
+
+@dataclass(frozen=True)
+class ExtractedPage:
+    index: int     # 0-based page number (0 for single-page formats)
+    label: str     # printed page label, "1"-based fallback
+    text: str
+
+
+@dataclass(frozen=True)
+class Extraction:
+    """Per-page text of one file, independent of where the file lives on disk."""
+    sha256: str
+    kind: str                      # "pdf" | "docx" | "txt"
+    total_pages: int
+    encrypted: bool
+    pages: Tuple[ExtractedPage, ...]
+
+
+class ExtractionCache:
+    """
+    Content-addressed page text cache: an in-memory LRU in front of a SQLite file.
+
+    Keyed by the file's sha256, so the same bytes uploaded to analyze, compare or chat (under any
+    name) are parsed once; later readers get the stored pages back without opening the file.
+    """
+
+    def __init__(self, path: str | Path, memory_entries: int = 64):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.memory_entries = memory_entries
+        self._lru: "OrderedDict[str, Extraction]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " sha256 TEXT PRIMARY KEY, kind TEXT NOT NULL, total_pages INTEGER NOT NULL,"
+            " encrypted INTEGER NOT NULL) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " sha256 TEXT NOT NULL, page INTEGER NOT NULL, label TEXT NOT NULL, text TEXT NOT NULL,"
+            " PRIMARY KEY (sha256, page)) WITHOUT ROWID"
+        )
+
+    def get(self, sha256: str) -> Optional[Extraction]:
+        with self._lock:
+            hit = self._lru.get(sha256)
+            if hit is not None:
+                self._lru.move_to_end(sha256)
+                self.hits += 1
+                return hit
+            row = self._conn.execute(
+                "SELECT kind, total_pages, encrypted FROM files WHERE sha256=?", (sha256,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            pages = tuple(
+                ExtractedPage(index=i, label=label, text=text)
+                for i, label, text in self._conn.execute(
+                    "SELECT page, label, text FROM pages WHERE sha256=? ORDER BY page", (sha256,)
+                )
+            )
+            extraction = Extraction(sha256, row[0], row[1], bool(row[2]), pages)
+            self._remember(extraction)
+            self.hits += 1
+            return extraction
+
+    def put(self, extraction: Extraction) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            # pages first, file row last: a reader never sees a file entry with missing pages
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)",
+                [(extraction.sha256, p.index, p.label, p.text) for p in extraction.pages],
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                (extraction.sha256, extraction.kind, extraction.total_pages, int(extraction.encrypted)),
+            )
+            self._conn.execute("COMMIT")
+            self._remember(extraction)
+
+    def _remember(self, extraction: Extraction) -> None:
+        self._lru[extraction.sha256] = extraction
+        self._lru.move_to_end(extraction.sha256)
+        while len(self._lru) > self.memory_entries:
+            self._lru.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            files = self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+            return {"files": files, "memory_entries": len(self._lru), "hits": self.hits, "misses": self.misses}
+
+
+_cache: Optional[ExtractionCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_extraction_cache() -> Optional[ExtractionCache]:
+    """Process-wide cache from `extraction_cache` in the YAML config (None when disabled)."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    cfg = load_config().get("extraction_cache") or {}
+                except FileNotFoundError:
+                    cfg = {}
+                if not cfg.get("enabled", True):
+                    return None
+                _cache = ExtractionCache(
+                    cfg.get("path", "data/extraction_cache.sqlite"),
+                    memory_entries=int(cfg.get("memory_entries", 64)),
+                )
+    return _cache
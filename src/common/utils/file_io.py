@@ -1,15 +1,37 @@
 from __future__ import annotations
-import re
+import os
 import uuid
+import hashlib
+from dataclasses import dataclass
 from pathlib import Path
 from datetime import datetime
 from zoneinfo import ZoneInfo
-from typing import Iterable, List
+from typing import Iterable, Iterator, List, Optional
+import anyio
 from src.common.logger.custom_logger import CustomLogger
 from src.common.exception.custom_exception import DocumentPortalException
+from src.common.utils.metrics import count_items, timed
 
 log = CustomLogger().get_logger(__name__)
 SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".txt"}
+COPY_CHUNK_SIZE = 1024 * 1024  # 1 MiB
+
+
+@dataclass(frozen=True)
+class SavedFile:
+    """A file written to local storage, with the content hash computed while writing."""
+    path: Path
+    name: str
+    sha256: str
+    size: int
+
+class UploadTooLargeError(ValueError):
+    """An upload exceeded the per-file or per-request byte limit while it was being copied."""
+    def __init__(self, name: str, limit: int, scope: str = "file"):
+        self.name = name
+        self.limit = limit
+        self.scope = scope
+        super().__init__(f"Upload '{name}' exceeds the {scope} size limit of {limit} bytes")
 
 # ----------------------------- #
 # Helpers (file I/O + loading)  #
@@ -18,30 +40,152 @@ def generate_session_id(prefix: str = "session") -> str:
     ist = ZoneInfo("Asia/Kolkata")
     return f"{prefix}_{datetime.now(ist).strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
 
-def save_uploaded_files(uploaded_files: Iterable, target_dir: Path) -> List[Path]:
-    """Save uploaded files (Streamlit-like) and return local paths."""
+def atomic_write_bytes(path: Path, data: bytes) -> None:
+    """Write via temp file + fsync + rename so readers see either the old or the new file."""
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:6]}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def atomic_write_text(path: Path, text: str) -> None:
+    atomic_write_bytes(path, text.encode("utf-8"))
+
+
+def iter_upload_chunks(uf, chunk_size: int = COPY_CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield an uploaded file's bytes in fixed-size pieces (falls back to getbuffer())."""
+    if hasattr(uf, "read"):
+        while True:
+            piece = uf.read(chunk_size)
+            if not piece:
+                break
+            yield piece
+    else:
+        buf = memoryview(uf.getbuffer())
+        for i in range(0, len(buf), chunk_size):
+            yield bytes(buf[i:i + chunk_size])
+
+
+def write_chunks(chunks: Iterable[bytes], out: Path) -> tuple[str, int]:
+    """Write chunks to `out`, returning (sha256 hex, size) computed in the same pass."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(out, "wb") as f:
+        for piece in chunks:
+            digest.update(piece)
+            size += len(piece)
+            f.write(piece)
+    return digest.hexdigest(), size
+
+
+def save_uploaded_files(uploaded_files: Iterable, target_dir: Path) -> List[SavedFile]:
+    """Save uploaded files (Streamlit-like) and return local paths with content hashes."""
     try:
         target_dir.mkdir(parents=True, exist_ok=True)
-        saved: List[Path] = []
+        saved: List[SavedFile] = []
         for uf in uploaded_files:
+            if isinstance(uf, SavedFile):
+                saved.append(uf)  # already streamed to disk by the API layer
+                continue
             name = getattr(uf, "name", "file")
             ext = Path(name).suffix.lower()
             if ext not in SUPPORTED_EXTENSIONS:
                 log.warning("Unsupported file skipped", filename=name)
                 continue
-            # Clean file name (only alphanum, dash, underscore)
-            safe_name = re.sub(r'[^a-zA-Z0-9_\-]', '_', Path(name).stem).lower()
-            fname = f"{safe_name}_{uuid.uuid4().hex[:6]}{ext}"
             fname = f"{uuid.uuid4().hex[:8]}{ext}"
             out = target_dir / fname
-            with open(out, "wb") as f:
-                if hasattr(uf, "read"):
-                    f.write(uf.read())
-                else:
-                    f.write(uf.getbuffer())  # fallback
-            saved.append(out)
-            log.info("File saved for ingestion", uploaded=name, saved_as=str(out))
+            sha256, size = write_chunks(iter_upload_chunks(uf), out)
+            saved.append(SavedFile(path=out, name=name, sha256=sha256, size=size))
+            log.info("File saved for ingestion", uploaded=name, saved_as=str(out), sha256=sha256[:12], size=size)
         return saved
     except Exception as e:
         log.error("Failed to save uploaded files", error=str(e), dir=str(target_dir))
-        raise DocumentPortalException("Failed to save uploaded files", e) from e
\ No newline at end of file
+        raise DocumentPortalException("Failed to save uploaded files", e) from e
+
+
+# ---------- Async (API) uploads ----------
+
+async def save_upload_async(upload, out: Path, *, max_bytes: Optional[int] = None,
+                            chunk_size: int = COPY_CHUNK_SIZE) -> SavedFile:
+    """
+    Copy a Starlette/FastAPI UploadFile to `out` in fixed-size chunks with async file I/O,
+    hashing as it goes. At most one chunk is held in memory; exceeding `max_bytes` aborts the
+    copy, removes the partial file and raises UploadTooLargeError.
+    """
+    name = getattr(upload, "filename", None) or getattr(upload, "name", "file")
+    digest = hashlib.sha256()
+    size = 0
+    await upload.seek(0)
+    try:
+        async with await anyio.open_file(out, "wb") as f:
+            while True:
+                piece = await upload.read(chunk_size)
+                if not piece:
+                    break
+                size += len(piece)
+                if max_bytes is not None and size > max_bytes:
+                    raise UploadTooLargeError(name, max_bytes)
+                digest.update(piece)
+                await f.write(piece)
+    except BaseException:
+        Path(out).unlink(missing_ok=True)
+        raise
+    return SavedFile(path=Path(out), name=name, sha256=digest.hexdigest(), size=size)
+
+
+async def save_uploads_async(uploads: Iterable, target_dir: Path, *, max_file_bytes: Optional[int] = None,
+                             max_total_bytes: Optional[int] = None, keep_names: bool = False,
+                             extensions: Iterable[str] = SUPPORTED_EXTENSIONS) -> List[SavedFile]:
+    """
+    Stream several uploads into `target_dir`; unsupported extensions are skipped. Files get a
+    random name unless `keep_names`. If the per-file or combined limit is exceeded, every file
+    saved by this call is removed before UploadTooLargeError propagates.
+    """
+    with timed("upload_save"):
+        saved = await _save_uploads(uploads, target_dir, max_file_bytes, max_total_bytes, keep_names, extensions)
+    count_items("upload_save", "files", len(saved))
+    count_items("upload_save", "bytes", sum(sf.size for sf in saved))
+    return saved
+
+
+async def _save_uploads(uploads: Iterable, target_dir: Path, max_file_bytes: Optional[int],
+                        max_total_bytes: Optional[int], keep_names: bool, extensions: Iterable[str]) -> List[SavedFile]:
+    target_dir = Path(target_dir)
+    target_dir.mkdir(parents=True, exist_ok=True)
+    extensions = {e.lower() for e in extensions}
+    saved: List[SavedFile] = []
+    total = 0
+    try:
+        for up in uploads:
+            name = getattr(up, "filename", None) or "file"
+            ext = Path(name).suffix.lower()
+            if ext not in extensions:
+                log.warning("Unsupported file skipped", filename=name)
+                continue
+            out = target_dir / (os.path.basename(name) if keep_names else f"{uuid.uuid4().hex[:8]}{ext}")
+            limit, request_bound = max_file_bytes or None, False
+            if max_total_bytes:
+                # the remaining request budget caps this file too, so the overflow is caught mid-copy
+                remaining = max(0, max_total_bytes - total)
+                if limit is None or remaining < limit:
+                    limit, request_bound = remaining, True
+            try:
+                sf = await save_upload_async(up, out, max_bytes=limit)
+            except UploadTooLargeError as e:
+                if request_bound:
+                    raise UploadTooLargeError(name, max_total_bytes, scope="request") from e
+                raise
+            total += sf.size
+            saved.append(sf)
+            log.info("File saved for ingestion", uploaded=name, saved_as=str(out), sha256=sf.sha256[:12], size=sf.size)
+        return saved
+    except BaseException:
+        for sf in saved:
+            sf.path.unlink(missing_ok=True)
+        raise
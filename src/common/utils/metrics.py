@@ -0,0 +1,275 @@
+"""
+In-process metrics with Prometheus text exposition, no client library required.
+
+Counters and histograms are plain dicts of floats behind one lock per metric, so recording costs
+a lock, a bisect and a few additions. Stage timings go through `timed(stage)`; LLM calls are
+measured by `LLMMetricsCallback`, attached to every chat model built by ModelLoader.
+"""
+from __future__ import annotations
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import RunnableLambda
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# seconds; covers sub-ms cache hits up to multi-minute ingestion stages
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, key)) + ([extra] if extra else [])
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def total(self, **labels: Any) -> float:
+        """Sum over every series matching the given labels (the others are unconstrained)."""
+        idx = [(self.labelnames.index(k), str(v)) for k, v in labels.items()]
+        with self._lock:
+            return sum(v for key, v in self._values.items() if all(key[i] == want for i, want in idx))
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return super().render() + [f"{self.name}{self._labels(k)} {_fmt(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [per-bucket counts (non-cumulative, last = +Inf), sum]
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][i] += 1
+            series[1][0] += value
+
+    def count(self, **labels: Any) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(c), s[0])) for k, (c, s) in self._series.items())
+        lines = super().render()
+        for key, (counts, total) in items:
+            running = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                running += n
+                lines.append(f"{self.name}_bucket{self._labels(key, ('le', _fmt(bound)))} {running}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{self._labels(key)} {running}")
+        return lines
+
+
+M = TypeVar("M", bound=_Metric)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: M) -> M:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for m in metrics for line in m.render()) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "docportal_stage_seconds", "Wall time of pipeline stages.", ["stage"]))
+STAGE_ERRORS = REGISTRY.register(Counter(
+    "docportal_stage_errors_total", "Pipeline stage executions that raised.", ["stage"]))
+STAGE_ITEMS = REGISTRY.register(Counter(
+    "docportal_stage_items_total", "Items processed per stage (files, pages, chunks, vectors).", ["stage", "unit"]))
+LLM_SECONDS = REGISTRY.register(Histogram(
+    "docportal_llm_call_seconds", "Latency of individual LLM calls.", ["call", "model"]))
+LLM_ERRORS = REGISTRY.register(Counter(
+    "docportal_llm_call_errors_total", "LLM calls that raised.", ["call", "model"]))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "docportal_llm_tokens_total", "Tokens reported by the provider per LLM call.", ["call", "model", "kind"]))
+PARSER_RETRIES = REGISTRY.register(Counter(
+    "docportal_parser_retries_total", "Output-fixing parser retries (LLM output that failed to parse).", ["parser"]))
+
+
+# ---------- Stage timing ----------
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Record the block's wall time under `stage`; exceptions are counted and re-raised."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def count_items(stage: str, unit: str, n: float) -> None:
+    if n:
+        STAGE_ITEMS.inc(n, stage=stage, unit=unit)
+
+
+# ---------- LLM calls ----------
+
+LLM_CALL_KEY = "llm_call"  # run metadata naming the call site (see tag_llm)
+
+
+def tag_llm(llm: Any, call: str) -> Any:
+    """The same model, with its calls reported under `call` in the LLM metrics."""
+    return llm.with_config(metadata={LLM_CALL_KEY: call})
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """Times every LLM call and counts prompt / completion tokens when the provider reports them."""
+
+    def __init__(self):
+        self._starts: Dict[UUID, Tuple[float, str, str]] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id: UUID, serialized: Optional[Dict[str, Any]], metadata: Optional[Dict[str, Any]]) -> None:
+        metadata = metadata or {}
+        model = str(metadata.get("ls_model_name") or (serialized or {}).get("kwargs", {}).get("model_name") or "unknown")
+        with self._lock:
+            self._starts[run_id] = (time.perf_counter(), str(metadata.get(LLM_CALL_KEY, "other")), model)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata=None, **kwargs: Any) -> None:
+        self._start(run_id, serialized, metadata)
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, metadata=None, **kwargs: Any) -> None:
+        self._start(run_id, serialized, metadata)
+
+    def _finish(self, run_id: UUID) -> Optional[Tuple[str, str]]:
+        with self._lock:
+            started = self._starts.pop(run_id, None)
+        if started is None:
+            return None
+        t0, call, model = started
+        LLM_SECONDS.observe(time.perf_counter() - t0, call=call, model=model)
+        return call, model
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        labels = self._finish(run_id)
+        if labels is None:
+            return
+        call, model = labels
+        prompt, completion = llm_token_usage(response)
+        if prompt:
+            LLM_TOKENS.inc(prompt, call=call, model=model, kind="prompt")
+        if completion:
+            LLM_TOKENS.inc(completion, call=call, model=model, kind="completion")
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        labels = self._finish(run_id)
+        if labels is not None:
+            LLM_ERRORS.inc(call=labels[0], model=labels[1])
+
+
+def llm_token_usage(response: LLMResult) -> Tuple[int, int]:
+    """(prompt, completion) tokens from llm_output["token_usage"] or the messages' usage_metadata."""
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return int(usage.get("prompt_tokens") or 0), int(usage.get("completion_tokens") or 0)
+    prompt = completion = 0
+    for generations in response.generations:
+        for gen in generations:
+            meta = getattr(getattr(gen, "message", None), "usage_metadata", None) or {}
+            prompt += int(meta.get("input_tokens") or 0)
+            completion += int(meta.get("output_tokens") or 0)
+    return prompt, completion
+
+
+_llm_callback = LLMMetricsCallback()
+
+
+def llm_metrics_callback() -> LLMMetricsCallback:
+    """Shared handler; pass as `callbacks=[...]` when constructing a chat model."""
+    return _llm_callback
+
+
+def count_parser_retries(fixing_parser: Any, name: str) -> Any:
+    """Count each retry of an OutputFixingParser (its retry chain only runs after a parse failure)."""
+    def _count(inputs: Any) -> Any:
+        PARSER_RETRIES.inc(parser=name)
+        return inputs
+
+    fixing_parser.retry_chain = RunnableLambda(_count) | tag_llm(fixing_parser.retry_chain, f"{name}_fix")
+    return fixing_parser
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
@@ -1,13 +1,17 @@
 import os
 import sys
 import json
+import time
+import threading
 from dotenv import load_dotenv
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
 from src.common.utils.config_loader import load_config
 from langchain_groq import ChatGroq
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from src.common.logger.custom_logger import CustomLogger
 from src.common.exception.custom_exception import DocumentPortalException
+from src.common.utils.metrics import llm_metrics_callback
+from src.common.utils.embedding_providers import LOCAL_PIPELINE_CONFIG, build_local_embeddings
 
 log = CustomLogger().get_logger(__name__)
 
@@ -58,6 +62,10 @@ class ApiKeyManager:
 class ModelLoader:
     """
     Loads embedding models and LLMs based on config and environment.
+
+    Clients are memoized per (kind, provider, model, temperature), so every caller sharing a
+    loader also shares the underlying HTTP connection pool. Use `get_model_loader()` to get
+    the process-wide instance instead of constructing a new one per request.
     """
 
     def __init__(self):
@@ -71,36 +79,81 @@ class ModelLoader:
         self.config = load_config()
         log.info("YAML config loaded", config_keys=list(self.config.keys()))
 
+        self._clients: Dict[Tuple, Any] = {}
+        self._lock = threading.RLock()
+        self.warmup_seconds: Optional[float] = None
+
+    def _get_or_create(self, key: Tuple, factory):
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = factory()
+                self._clients[key] = client
+                log.info("Model client created", key="/".join(str(k) for k in key))
+            return client
+
+    def _embedding_block(self) -> Tuple[str, Dict[str, Any]]:
+        """(key, block) of the active embedding provider: EMBEDDING_PROVIDER env, `active`, or the only block."""
+        emb_cfg: Dict[str, Any] = self.config.get("embedding_model", {})
+        blocks = {k: v for k, v in emb_cfg.items() if isinstance(v, dict)}
+        key = os.getenv("EMBEDDING_PROVIDER") or emb_cfg.get("active") or next(iter(blocks), "openai")
+        if key not in blocks:
+            raise ValueError(f"Embedding provider '{key}' not found in config")
+        return key, dict(blocks[key])
+
+    def embedding_config(self) -> Dict[str, Any]:
+        """Return the active embedding provider block (model_name, dimensions, ...)."""
+        try:
+            return self._embedding_block()[1]
+        except ValueError:
+            return {}
+
+    def embedding_pipeline_config(self) -> Dict[str, Any]:
+        """`embedding_pipeline`, without API rate limits for in-process providers, plus the block's `pipeline`."""
+        cfg = self.embedding_config()
+        local = LOCAL_PIPELINE_CONFIG if cfg.get("provider", "openai") != "openai" else {}
+        return {**(self.config.get("embedding_pipeline") or {}), **local, **(cfg.get("pipeline") or {})}
+
     def load_embeddings(self):
         """
-        Load and return embedding model from Google Generative AI.
+        Load and return the configured embedding model (shared instance).
         """
         try:
-            log.info("Loading embedding model...")
-            emb_cfg: Dict[str, Any] = self.config.get("embedding_model", {})
-
-            # Pick the single provider block present (e.g., "openai")
-            if "openai" in emb_cfg:
-                cfg = emb_cfg["openai"]
-                provider = cfg.get("provider", "openai")
-                model_name = cfg["model_name"]
-
-                if provider != "openai":
-                    raise ValueError(
-                        f"Unsupported embedding provider for this build: {provider}"
-                    )
-
-                return OpenAIEmbeddings(
-                    model=model_name, api_key=self.api_key_mgr.get("OPENAI_API_KEY")
+            _, cfg = self._embedding_block()
+            provider = cfg.get("provider", "openai")
+            model_name = cfg["model_name"]
+
+            if provider == "openai":
+                # text-embedding-3-* are Matryoshka-trained: the API returns the first N dims, renormalized
+                dimensions = cfg.get("dimensions")
+                if dimensions and not model_name.startswith("text-embedding-3"):
+                    log.warning("Model does not support reduced dimensions, ignoring", model=model_name,
+                                dimensions=dimensions)
+                    dimensions = None
+                dimensions = int(dimensions) if dimensions else None
+
+                return self._get_or_create(
+                    ("embeddings", provider, model_name, dimensions),
+                    lambda: OpenAIEmbeddings(
+                        model=model_name,
+                        dimensions=dimensions,
+                        api_key=self.api_key_mgr.get("OPENAI_API_KEY"),
+                    ),
                 )
 
+            # in-process CPU providers (hashing, sentence_transformers, ...)
+            return self._get_or_create(
+                ("embeddings", provider, model_name, json.dumps(cfg, sort_keys=True, default=str)),
+                lambda: build_local_embeddings(cfg),
+            )
+
         except Exception as e:
             log.error("Error loading embedding model", error=str(e))
             raise DocumentPortalException("Failed to load embedding model", sys)
 
-    def load_llm(self):
+    def load_llm(self, temperature: Optional[float] = None):
         """
-        Load and return the configured LLM model.
+        Load and return the configured LLM model (shared instance).
         """
         llm_block = self.config["llm"]
         provider_key = os.getenv("LLM_PROVIDER", "openai")
@@ -112,28 +165,66 @@ class ModelLoader:
         llm_config = llm_block[provider_key]
         provider = llm_config.get("provider")
         model_name = llm_config.get("model_name")
-        temperature = llm_config.get("temperature", 0.1)
+        if temperature is None:
+            temperature = llm_config.get("temperature", 0.1)
 
-        log.info("Loading LLM", provider=provider, model=model_name)
+        key = ("llm", provider, model_name, float(temperature))
 
         if provider == "groq":
-            return ChatGroq(
+            return self._get_or_create(key, lambda: ChatGroq(
                 model=model_name,
-                api_key=self.api_key_mgr.get("GROQ_API_KEY"),  
-                temperature=temperature
-            )
+                api_key=self.api_key_mgr.get("GROQ_API_KEY"),
+                temperature=temperature,
+                callbacks=[llm_metrics_callback()],  # per-call latency + token counters
+            ))
 
         elif provider == "openai":
-            return ChatOpenAI(
+            return self._get_or_create(key, lambda: ChatOpenAI(
                 model=model_name,
                 api_key=self.api_key_mgr.get("OPENAI_API_KEY"),
-                temperature=temperature
-            )
+                temperature=temperature,
+                callbacks=[llm_metrics_callback()],
+            ))
 
         else:
             log.error("Unsupported LLM provider", provider=provider)
             raise ValueError(f"Unsupported LLM provider: {provider}")
 
+    def warm_up(self) -> float:
+        """Eagerly build the default LLM and embedding clients; returns elapsed seconds."""
+        start = time.perf_counter()
+        self.load_llm()
+        self.load_embeddings()
+        self.warmup_seconds = round(time.perf_counter() - start, 4)
+        log.info("Model registry warmed up", seconds=self.warmup_seconds, clients=len(self._clients))
+        return self.warmup_seconds
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "clients": ["/".join(str(k) for k in key) for key in self._clients],
+                "warmup_seconds": self.warmup_seconds,
+            }
+
+
+_loader: Optional[ModelLoader] = None
+_loader_lock = threading.Lock()
+
+
+def get_model_loader() -> ModelLoader:
+    """Process-wide ModelLoader: env, API keys and YAML are read once."""
+    global _loader
+    if _loader is None:
+        with _loader_lock:
+            if _loader is None:
+                _loader = ModelLoader()
+    return _loader
+
+
+def model_registry_stats() -> Optional[Dict[str, Any]]:
+    """Stats of the process-wide loader, or None if it has not been built yet."""
+    return _loader.stats() if _loader is not None else None
+
 
 if __name__ == "__main__":
     loader = ModelLoader()
@@ -0,0 +1,61 @@
+"""
+Picklable parsing tasks run in the parse process pool. Kept free of FastAPI / LangChain imports
+so pool workers start quickly; results are plain (page index, page label, text) tuples.
+"""
+from __future__ import annotations
+import re
+from typing import Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+Parsed = List[Tuple[int, str, str]]
+
+_PDF_DATE_RE = re.compile(r"^D:(\d{4})(\d{2})?(\d{2})?(\d{2})?(\d{2})?(\d{2})?")
+
+
+def pdf_info(path: str) -> Tuple[int, bool]:
+    """(page count, encrypted); encrypted files are not parsed."""
+    with fitz.open(path) as doc:
+        return doc.page_count, bool(doc.is_encrypted)
+
+
+def pdf_date(value: Optional[str]) -> str:
+    """PDF date string ("D:20240131093000+01'00'") as ISO 8601; "" when absent or malformed."""
+    m = _PDF_DATE_RE.match((value or "").strip())
+    if not m:
+        return ""
+    y, mo, d, h, mi, sec = (g or default for g, default in zip(m.groups(), ("", "01", "01", None, "00", "00")))
+    return f"{y}-{mo}-{d}" if h is None else f"{y}-{mo}-{d}T{h}:{mi}:{sec}"
+
+
+def pdf_metadata(path: str) -> Dict[str, object]:
+    """Document info dictionary plus page count; read without extracting any page text."""
+    with fitz.open(path) as doc:
+        meta = doc.metadata or {}
+        return {
+            "page_count": doc.page_count,
+            "title": (meta.get("title") or "").strip(),
+            "author": (meta.get("author") or "").strip(),
+            "created": pdf_date(meta.get("creationDate")),
+            "modified": pdf_date(meta.get("modDate")),
+        }
+
+
+def parse_pdf_pages(path: str, start: int, stop: int) -> Parsed:
+    """Text of pages [start, stop)."""
+    out: Parsed = []
+    with fitz.open(path) as doc:
+        for i in range(start, min(stop, doc.page_count)):
+            page = doc.load_page(i)
+            out.append((i, page.get_label() or str(i + 1), page.get_text()))
+    return out
+
+
+def parse_docx(path: str) -> Parsed:
+    import docx2txt
+    return [(0, "1", docx2txt.process(path))]
+
+
+def parse_text(path: str) -> Parsed:
+    with open(path, "r", encoding="utf-8") as f:
+        return [(0, "1", f.read())]
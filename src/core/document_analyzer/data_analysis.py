@@ -1,31 +1,89 @@
 import sys
-from src.common.utils.model_loader import ModelLoader
+import re
+import asyncio
+from typing import Any, Dict, List, Optional
+from src.common.utils.model_loader import get_model_loader
+from src.common.utils.concurrency import stage_slot
 from src.common.logger.custom_logger import CustomLogger
 from src.common.exception.custom_exception import DocumentPortalException
-from src.model.models import Metadata
-from langchain_core.output_parsers import JsonOutputParser
+from src.core.document_ingestion.embedding_pipeline import count_tokens
+from src.common.utils.metrics import count_parser_retries, tag_llm
+from src.model.models import Metadata, PromptType
+from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
 from langchain.output_parsers import OutputFixingParser
 from src.core.prompt.prompt_library import PROMPT_REGISTRY
 
+DEFAULT_ANALYSIS_CONFIG: Dict[str, Any] = {
+    "single_pass_tokens": 12000,
+    "section_tokens": 6000,
+    "max_concurrency": 4,
+}
+
+_PAGE_BREAK_RE = re.compile(r"(?=\n--- Page \d+ ---\n)")
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+
+
+def split_sections(text: str, max_tokens: int) -> List[str]:
+    """
+    Token-bounded sections in document order. Cuts fall on page markers (as written by
+    DocHandler.read_pdf), then paragraph breaks, and only as a last resort inside a paragraph.
+    """
+    units: List[str] = []
+    for page in _PAGE_BREAK_RE.split(text):
+        if not page.strip():
+            continue
+        if count_tokens(page) <= max_tokens:
+            units.append(page)
+            continue
+        for para in _PARAGRAPH_RE.split(page):
+            if count_tokens(para) <= max_tokens:
+                units.append(para)
+            else:
+                step = max_tokens * 4  # ~4 chars per token
+                units.extend(para[i:i + step] for i in range(0, len(para), step))
+
+    sections: List[str] = []
+    cur: List[str] = []
+    cur_tokens = 0
+    for unit in units:
+        n = count_tokens(unit)
+        if cur and cur_tokens + n > max_tokens:
+            sections.append("\n\n".join(cur))
+            cur, cur_tokens = [], 0
+        cur.append(unit)
+        cur_tokens += n
+    if cur:
+        sections.append("\n\n".join(cur))
+    return sections
+
 
 class DocumentAnalyzer:
     """
     Analyzes documents using a pre-trained model.
     Automatically logs all actions and supports session-based organization.
+
+    Documents above `analysis.single_pass_tokens` are analyzed map-reduce: token-bounded sections
+    are summarized concurrently and the notes are reduced into the Metadata schema.
     """
 
     def __init__(self):
         self.log = CustomLogger().get_logger(__name__)
         try:
-            self.loader = ModelLoader()
+            self.loader = get_model_loader()
             self.llm = self.loader.load_llm()
 
             # Prepare parsers
             self.parser = JsonOutputParser(pydantic_object=Metadata)
-            self.fixing_parser = OutputFixingParser.from_llm(
-                parser=self.parser, llm=self.llm)
+            self.fixing_parser = count_parser_retries(OutputFixingParser.from_llm(
+                parser=self.parser, llm=self.llm), "analysis")
 
             self.prompt = PROMPT_REGISTRY["document_analysis"]
+            self.map_chain = (PROMPT_REGISTRY[PromptType.DOCUMENT_ANALYSIS_MAP.value]
+                              | tag_llm(self.llm, "analysis_map") | StrOutputParser())
+            self.reduce_chain = (PROMPT_REGISTRY[PromptType.DOCUMENT_ANALYSIS_REDUCE.value]
+                                 | tag_llm(self.llm, "analysis_reduce") | self.fixing_parser)
+            self.cfg = {**DEFAULT_ANALYSIS_CONFIG,
+                        **((getattr(self.loader, "config", None) or {}).get("analysis") or {})}
 
             self.log.info("DocumentAnalyzer initialized successfully")
 
@@ -34,25 +92,115 @@ class DocumentAnalyzer:
             raise DocumentPortalException(
                 "Error in DocumentAnalyzer initialization", sys)
 
-    def analyze_document(self, document_text: str) -> dict:
+    def analyze_document(self, document_text: str, pdf_metadata: Optional[Dict[str, Any]] = None) -> dict:
         """
         Analyze a document's text and extract structured metadata & summary.
         """
         try:
-            chain = self.prompt | self.llm | self.fixing_parser
+            if count_tokens(document_text) <= int(self.cfg["single_pass_tokens"]):
+                chain = self.prompt | tag_llm(self.llm, "analysis") | self.fixing_parser
+
+                self.log.info("Meta-data analysis chain initialized")
+
+                response = chain.invoke({
+                    "format_instructions": self.parser.get_format_instructions(),
+                    "document_text": document_text
+                })
+            else:
+                notes = self._map(split_sections(document_text, int(self.cfg["section_tokens"])))
+                while (groups := self._collapse_groups(notes)) is not None:
+                    notes = self._map(groups)
+                response = self.reduce_chain.invoke(self._reduce_inputs(notes))
+
+            self.log.info("Metadata extraction successful",
+                        keys=list(response.keys()))
+
+            return self._apply_pdf_metadata(response, pdf_metadata)
+
+        except Exception as e:
+            self.log.error("Metadata analysis failed", error=str(e))
+            raise DocumentPortalException("Metadata extraction failed", sys)
 
-            self.log.info("Meta-data analysis chain initialized")
+    async def aanalyze_document(self, document_text: str, pdf_metadata: Optional[Dict[str, Any]] = None) -> dict:
+        """
+        Async variant of analyze_document(); the LLM calls do not block the event loop.
+        """
+        try:
+            if count_tokens(document_text) <= int(self.cfg["single_pass_tokens"]):
+                chain = self.prompt | tag_llm(self.llm, "analysis") | self.fixing_parser
 
-            response = chain.invoke({
-                "format_instructions": self.parser.get_format_instructions(),
-                "document_text": document_text
-            })
+                async with stage_slot("llm"):
+                    response = await chain.ainvoke({
+                        "format_instructions": self.parser.get_format_instructions(),
+                        "document_text": document_text
+                    })
+            else:
+                notes = await self._amap(split_sections(document_text, int(self.cfg["section_tokens"])))
+                while (groups := self._collapse_groups(notes)) is not None:
+                    notes = await self._amap(groups)
+                async with stage_slot("llm"):
+                    response = await self.reduce_chain.ainvoke(self._reduce_inputs(notes))
 
             self.log.info("Metadata extraction successful",
                         keys=list(response.keys()))
 
-            return response
+            return self._apply_pdf_metadata(response, pdf_metadata)
 
         except Exception as e:
             self.log.error("Metadata analysis failed", error=str(e))
             raise DocumentPortalException("Metadata extraction failed", sys)
+
+    # ---------- Map-reduce ----------
+
+    @staticmethod
+    def _map_inputs(sections: List[str]) -> List[Dict[str, Any]]:
+        return [
+            {"section_number": i + 1, "section_count": len(sections), "section_text": text}
+            for i, text in enumerate(sections)
+        ]
+
+    def _map(self, sections: List[str]) -> List[str]:
+        self.log.info("Map step started", sections=len(sections))
+        return self.map_chain.batch(self._map_inputs(sections),
+                                    config={"max_concurrency": int(self.cfg["max_concurrency"])})
+
+    async def _amap(self, sections: List[str]) -> List[str]:
+        self.log.info("Map step started", sections=len(sections))
+        limit = asyncio.Semaphore(int(self.cfg["max_concurrency"]))
+
+        async def _one(inputs: Dict[str, Any]) -> str:
+            async with limit, stage_slot("llm"):
+                return await self.map_chain.ainvoke(inputs)
+
+        return list(await asyncio.gather(*(_one(x) for x in self._map_inputs(sections))))
+
+    def _collapse_groups(self, notes: List[str]) -> Optional[List[str]]:
+        """Notes regrouped for another map pass while they are too long to reduce in one call."""
+        if count_tokens("\n\n".join(notes)) <= int(self.cfg["single_pass_tokens"]):
+            return None
+        groups = split_sections("\n\n".join(notes), int(self.cfg["section_tokens"]))
+        if len(groups) >= len(notes):
+            return None  # notes are not shrinking: reduce what we have
+        return groups
+
+    def _reduce_inputs(self, notes: List[str]) -> Dict[str, str]:
+        summaries = "\n\n".join(f"[Section {i + 1}]\n{n.strip()}" for i, n in enumerate(notes))
+        return {"format_instructions": self.parser.get_format_instructions(), "section_summaries": summaries}
+
+    @staticmethod
+    def _apply_pdf_metadata(result: dict, pdf_metadata: Optional[Dict[str, Any]]) -> dict:
+        """Fields the PDF states authoritatively override the model's guesses."""
+        if not pdf_metadata:
+            return result
+        result = dict(result)
+        if pdf_metadata.get("page_count") is not None:
+            result["PageCount"] = pdf_metadata["page_count"]
+        if pdf_metadata.get("title"):
+            result["Title"] = pdf_metadata["title"]
+        if pdf_metadata.get("author"):
+            result["Author"] = [a.strip() for a in pdf_metadata["author"].split(";") if a.strip()]
+        if pdf_metadata.get("created"):
+            result["DateCreated"] = pdf_metadata["created"]
+        if pdf_metadata.get("modified"):
+            result["LastModifiedDate"] = pdf_metadata["modified"]
+        return result
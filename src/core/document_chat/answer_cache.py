@@ -0,0 +1,184 @@
+from __future__ import annotations
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.common.utils.config_loader import load_config
+from src.common.logger.custom_logger import CustomLogger
+
+log = CustomLogger().get_logger(__name__)
+
+Scope = Tuple[str, str]  # (index key, index version)
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+
+def history_hash(chat_history: Optional[Sequence[Any]]) -> str:
+    turns = [(getattr(m, "type", ""), getattr(m, "content", str(m))) for m in chat_history or []]
+    return hashlib.sha256(json.dumps(turns, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+class _Entry:
+    def __init__(self, scope: Scope, answer: str, sources: List[Dict[str, Any]],
+                 vector: Optional[np.ndarray], expires_at: float):
+        self.scope = scope
+        self.answer = answer
+        self.sources = sources
+        self.vector = vector
+        self.expires_at = expires_at
+
+
+class AnswerCache:
+    """
+    Two-tier answer cache in front of ConversationalRAG, scoped by index version.
+
+    - exact tier: normalized question + chat-history hash
+    - semantic tier: cosine similarity of query embeddings (history-free questions only)
+
+    Entries expire after `ttl_seconds`; the cache holds at most `max_entries` (LRU).
+    """
+
+    def __init__(self, ttl_seconds: float = 3600, max_entries: int = 2048, semantic_threshold: float = 0.95):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.threshold = semantic_threshold
+        self._entries: "OrderedDict[Tuple, _Entry]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    # ---------- Public API ----------
+
+    def get(self, scope: Scope, question: str, chat_history=None,
+            query_vector: Optional[Sequence[float]] = None) -> Optional[_Entry]:
+        now = time.monotonic()
+        key = (scope, normalize_question(question), history_hash(chat_history))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > now:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry
+
+            if query_vector is not None and not chat_history:
+                best = self._nearest(scope, self._unit(query_vector), now)
+                if best is not None:
+                    self.semantic_hits += 1
+                    return best
+
+            self.misses += 1
+            return None
+
+    def put(self, scope: Scope, question: str, answer: str, chat_history=None,
+            sources: Optional[List[Dict[str, Any]]] = None,
+            query_vector: Optional[Sequence[float]] = None) -> None:
+        key = (scope, normalize_question(question), history_hash(chat_history))
+        vector = self._unit(query_vector) if query_vector is not None and not chat_history else None
+        with self._lock:
+            self._entries[key] = _Entry(scope, answer, sources or [], vector, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, index_key: str) -> int:
+        """Drop every entry for an index (all versions)."""
+        with self._lock:
+            doomed = [k for k, e in self._entries.items() if e.scope[0] == index_key]
+            for k in doomed:
+                del self._entries[k]
+        if doomed:
+            log.info("Answer cache invalidated", index=index_key, removed=len(doomed))
+        return len(doomed)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.exact_hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+    # ---------- Internals ----------
+
+    @staticmethod
+    def _unit(vec: Sequence[float]) -> np.ndarray:
+        v = np.asarray(vec, dtype=np.float32)
+        n = float(np.linalg.norm(v))
+        return v / n if n else v
+
+    def _nearest(self, scope: Scope, qv: np.ndarray, now: float) -> Optional[_Entry]:
+        candidates = [e for e in self._entries.values()
+                      if e.scope == scope and e.vector is not None and e.expires_at > now
+                      and e.vector.shape == qv.shape]
+        if not candidates:
+            return None
+        sims = np.stack([e.vector for e in candidates]) @ qv
+        i = int(np.argmax(sims))
+        return candidates[i] if sims[i] >= self.threshold else None
+
+
+class MemoizedQueryEmbeddings(Embeddings):
+    """
+    Remembers the last few query embeddings so the answer cache's semantic lookup and the
+    retriever's similarity search share one embedding call per question.
+    """
+
+    def __init__(self, inner: Embeddings, max_items: int = 256):
+        self.inner = inner
+        self.max_items = max_items
+        self._memo: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with self._lock:
+            vec = self._memo.get(text)
+            if vec is not None:
+                self._memo.move_to_end(text)
+                return vec
+        vec = self.inner.embed_query(text)
+        with self._lock:
+            self._memo[text] = vec
+            while len(self._memo) > self.max_items:
+                self._memo.popitem(last=False)
+        return vec
+
+
+_cache: Optional[AnswerCache] = None
+_cache_lock = threading.Lock()
+
+
+def answer_cache_config() -> Dict[str, Any]:
+    try:
+        return (load_config().get("retriever") or {}).get("answer_cache") or {}
+    except FileNotFoundError:
+        return {}
+
+
+def get_answer_cache() -> AnswerCache:
+    """Process-wide answer cache, sized from `retriever.answer_cache` in the YAML config."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                cfg = answer_cache_config()
+                _cache = AnswerCache(
+                    ttl_seconds=float(cfg.get("ttl_seconds", 3600)),
+                    max_entries=int(cfg.get("max_entries", 2048)),
+                    semantic_threshold=float(cfg.get("semantic_threshold", 0.95)),
+                )
+    return _cache
@@ -0,0 +1,254 @@
+from __future__ import annotations
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from src.common.logger.custom_logger import CustomLogger
+
+log = CustomLogger().get_logger(__name__)
+
+# keeps part numbers / clause ids such as "AB-1234", "4.2.1", "po_778" as single tokens
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Compact BM25 inverted index with CSR (array-backed) posting lists.
+
+    Postings for term t live in `post_docs[indptr[t]:indptr[t+1]]` / `post_tf[...]`, so scoring a
+    query is a handful of vectorized numpy ops per query term regardless of corpus size.
+    Documents are identified by the same ids used in the FAISS docstore.
+
+    add() only appends postings to a delta (plain lists, turned into a small CSR of its own on the
+    next search) that is scored alongside the main CSR, so its cost is O(new postings). merge()
+    folds the delta into the main CSR (one lexsort over every posting); it runs from save() and,
+    when `merge_ratio` is set, once the delta outgrows that fraction of the CSR, which keeps the
+    amortized cost of an add constant.
+    """
+
+    NPZ_FILE = "{name}.bm25.npz"
+    VOCAB_FILE = "{name}.bm25.json"
+    MIN_MERGE_POSTINGS = 4096
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, merge_ratio: Optional[float] = 0.5):
+        self.k1 = k1
+        self.b = b
+        self.merge_ratio = merge_ratio
+        self.vocab: Dict[str, int] = {}
+        self.doc_ids: List[str] = []
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.post_docs = np.zeros(0, dtype=np.int32)
+        self.post_tf = np.zeros(0, dtype=np.float32)
+        self.doc_len = np.zeros(0, dtype=np.float32)
+        # postings added since the last merge, as (term, doc, tf) triples, and those docs' lengths
+        self._delta_terms: List[int] = []
+        self._delta_docs: List[int] = []
+        self._delta_tfs: List[int] = []
+        self._delta_len: List[float] = []
+        self._delta_csr: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    @property
+    def delta_postings(self) -> int:
+        return len(self._delta_terms)
+
+    # ---------- Build ----------
+
+    def add(self, items: Iterable[Tuple[str, str]]) -> int:
+        """Add (doc_id, text) pairs to the delta; cost is proportional to the new text only."""
+        added = 0
+        for doc_id, text in items:
+            toks = tokenize(text)
+            counts: Dict[int, int] = {}
+            for tok in toks:
+                tid = self.vocab.setdefault(tok, len(self.vocab))
+                counts[tid] = counts.get(tid, 0) + 1
+            # the doc before its postings: a concurrent search never sees a posting past len(doc_ids)
+            doc = len(self.doc_ids)
+            self._delta_len.append(len(toks))
+            self.doc_ids.append(doc_id)
+            self._delta_terms.extend(counts.keys())
+            self._delta_docs.extend([doc] * len(counts))
+            self._delta_tfs.extend(counts.values())
+            added += 1
+        if added:
+            self._delta_csr = None
+        if self.merge_ratio is not None and self.delta_postings > max(
+                self.MIN_MERGE_POSTINGS, self.merge_ratio * len(self.post_docs)):
+            self.merge()
+        return added
+
+    def merge(self) -> None:
+        """Fold the delta postings into the CSR arrays (one numpy merge + sort over all postings)."""
+        if not self._delta_len:
+            return
+        # expand existing CSR back into (term, doc, tf) triples and merge with the new ones
+        old_terms = np.repeat(np.arange(len(self.indptr) - 1, dtype=np.int64), np.diff(self.indptr))
+        terms = np.concatenate([old_terms, np.asarray(self._delta_terms, dtype=np.int64)])
+        docs = np.concatenate([self.post_docs, np.asarray(self._delta_docs, dtype=np.int32)])
+        tfs = np.concatenate([self.post_tf, np.asarray(self._delta_tfs, dtype=np.float32)])
+        self.indptr, self.post_docs, self.post_tf = self._csr(terms, docs, tfs, len(self.vocab))
+
+        self.doc_len = np.concatenate([self.doc_len, np.asarray(self._delta_len, dtype=np.float32)])
+        self._delta_terms, self._delta_docs, self._delta_tfs, self._delta_len = [], [], [], []
+        self._delta_csr = None
+
+    @staticmethod
+    def _csr(terms: np.ndarray, docs: np.ndarray, tfs: np.ndarray, n_terms: int):
+        order = np.lexsort((docs, terms))
+        indptr = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=n_terms), out=indptr[1:])
+        return indptr, docs[order], tfs[order]
+
+    # ---------- Query ----------
+
+    @staticmethod
+    def _slice(csr: Tuple[np.ndarray, np.ndarray, np.ndarray], tid: int) -> Tuple[np.ndarray, np.ndarray]:
+        indptr, docs, tfs = csr
+        if tid + 1 >= len(indptr):  # term first seen after this CSR was built
+            return docs[:0], tfs[:0]
+        lo, hi = indptr[tid], indptr[tid + 1]
+        return docs[lo:hi], tfs[lo:hi]
+
+    def _postings(self, tid: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(doc positions, tfs) of a term across the main CSR and the delta."""
+        docs, tf = self._slice((self.indptr, self.post_docs, self.post_tf), tid)
+        if not self._delta_terms:
+            return docs, tf
+        if self._delta_csr is None:
+            self._delta_csr = self._csr(np.asarray(self._delta_terms, dtype=np.int64),
+                                        np.asarray(self._delta_docs, dtype=np.int32),
+                                        np.asarray(self._delta_tfs, dtype=np.float32), len(self.vocab))
+        d_docs, d_tf = self._slice(self._delta_csr, tid)
+        if not len(d_docs):
+            return docs, tf
+        return np.concatenate([docs, d_docs]), np.concatenate([tf, d_tf])
+
+    def _doc_lengths(self) -> np.ndarray:
+        if not self._delta_len:
+            return self.doc_len
+        return np.concatenate([self.doc_len, np.asarray(self._delta_len, dtype=np.float32)])
+
+    def idf(self, terms: Sequence[str]) -> np.ndarray:
+        """Corpus-wide BM25 idf per term (terms never indexed get the maximum)."""
+        n = len(self.doc_ids)
+        df = np.asarray([len(self._postings(t)[0]) if (t := self.vocab.get(term)) is not None else 0
+                         for term in terms], dtype=np.float32)
+        return np.log1p((n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        n = len(self.doc_ids)
+        if n == 0:
+            return []
+        scores = np.zeros(n, dtype=np.float32)
+        doc_len = self._doc_lengths()
+        avgdl = float(doc_len.mean()) or 1.0
+        norm = self.k1 * (1.0 - self.b + self.b * doc_len / avgdl)
+        for tok in set(tokenize(query)):
+            tid = self.vocab.get(tok)
+            if tid is None:
+                continue
+            docs, tf = self._postings(tid)
+            df = len(docs)
+            idf = np.log1p((n - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tf * (self.k1 + 1.0) / (tf + norm[docs])
+        nz = np.flatnonzero(scores)
+        if nz.size == 0:
+            return []
+        top = nz[np.argsort(-scores[nz], kind="stable")[:k]]
+        return [(self.doc_ids[i], float(scores[i])) for i in top]
+
+    # ---------- Persistence ----------
+
+    def save(self, index_dir: str | Path, index_name: str = "index") -> None:
+        self.merge()  # only the CSR is persisted
+        index_dir = Path(index_dir)
+        npz_path = index_dir / self.NPZ_FILE.format(name=index_name)
+        vocab_path = index_dir / self.VOCAB_FILE.format(name=index_name)
+        tmp_npz = npz_path.with_suffix(".tmp.npz")
+        np.savez(tmp_npz, indptr=self.indptr, post_docs=self.post_docs,
+                 post_tf=self.post_tf, doc_len=self.doc_len)
+        tmp_vocab = vocab_path.with_suffix(".tmp")
+        terms = [""] * len(self.vocab)
+        for term, tid in self.vocab.items():
+            terms[tid] = term
+        tmp_vocab.write_text(json.dumps({"k1": self.k1, "b": self.b, "terms": terms, "doc_ids": self.doc_ids}),
+                             encoding="utf-8")
+        # atomic swap so readers never see a half-written index
+        os.replace(tmp_npz, npz_path)
+        os.replace(tmp_vocab, vocab_path)
+
+    @classmethod
+    def exists(cls, index_dir: str | Path, index_name: str = "index") -> bool:
+        index_dir = Path(index_dir)
+        return (index_dir / cls.NPZ_FILE.format(name=index_name)).exists() and \
+            (index_dir / cls.VOCAB_FILE.format(name=index_name)).exists()
+
+    @classmethod
+    def load(cls, index_dir: str | Path, index_name: str = "index",
+             merge_ratio: Optional[float] = 0.5) -> "BM25Index":
+        index_dir = Path(index_dir)
+        meta = json.loads((index_dir / cls.VOCAB_FILE.format(name=index_name)).read_text(encoding="utf-8"))
+        idx = cls(k1=meta.get("k1", 1.5), b=meta.get("b", 0.75), merge_ratio=merge_ratio)
+        idx.vocab = {t: i for i, t in enumerate(meta["terms"])}
+        idx.doc_ids = list(meta["doc_ids"])
+        with np.load(index_dir / cls.NPZ_FILE.format(name=index_name)) as z:
+            idx.indptr, idx.post_docs = z["indptr"], z["post_docs"]
+            idx.post_tf, idx.doc_len = z["post_tf"], z["doc_len"]
+        return idx
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], weights: Optional[Sequence[float]] = None,
+                           rrf_k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists: score(id) = sum_i w_i / (rrf_k + rank_i(id))."""
+    weights = weights or [1.0] * len(rankings)
+    fused: Dict[str, float] = {}
+    for ranking, w in zip(rankings, weights):
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + w / (rrf_k + rank)
+    return sorted(fused.items(), key=lambda kv: kv[1], reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """Dense FAISS search + BM25 lexical search, fused with reciprocal rank fusion."""
+
+    vectorstore: Any
+    bm25: Any
+    k: int = 5
+    fetch_k: int = 20
+    rrf_k: int = 60
+    dense_weight: float = 1.0
+    lexical_weight: float = 1.0
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        dense = self.vectorstore.similarity_search(query, k=self.fetch_k)
+        by_id: Dict[str, Document] = {d.id: d for d in dense if getattr(d, "id", None)}
+        lexical = [doc_id for doc_id, _ in self.bm25.search(query, k=self.fetch_k)]
+
+        fused = reciprocal_rank_fusion(
+            [list(by_id.keys()), lexical], weights=[self.dense_weight, self.lexical_weight], rrf_k=self.rrf_k
+        )
+        out: List[Document] = []
+        for doc_id, _ in fused:
+            doc = by_id.get(doc_id)
+            if doc is None:
+                found = self.vectorstore.docstore.search(doc_id)
+                doc = found if isinstance(found, Document) else None
+            if doc is not None:
+                out.append(doc)
+            if len(out) >= self.k:
+                break
+        return out
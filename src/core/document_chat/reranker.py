@@ -0,0 +1,170 @@
+"""
+Second retrieval stage: the retriever over-fetches `retriever.top_k` candidates and a local
+scorer keeps the best `k` for the answer prompt, so fewer (and less redundant) chunks reach the LLM.
+
+    lexical         BM25 over the candidate set blended with the first-stage rank, then MMR over
+                    hashed term vectors so near-duplicate chunks do not crowd out the rest (numpy)
+    cross_encoder   a sentence-transformers CrossEncoder from a local path scores (query, chunk)
+                    pairs on CPU; optional dependency
+"""
+from __future__ import annotations
+import json
+import os
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.common.utils.embedding_providers import HashingEmbeddings
+from src.core.document_chat.hybrid_retriever import tokenize
+
+DEFAULT_RERANK_CONFIG: Dict[str, Any] = {
+    "enabled": True,
+    "method": "lexical",         # lexical | cross_encoder
+    "lexical_weight": 0.6,       # vs. first-stage rank in the relevance score
+    "mmr_lambda": 0.7,           # relevance vs. novelty; 1.0 = plain relevance order
+    "dimensions": 512,           # hashed term vectors used for redundancy
+    "model_path": None,          # cross_encoder: local model directory
+    "batch_size": 32,
+    "max_chars": 2000,           # chunk text scored by the cross-encoder
+}
+
+
+def _with_score(doc: Any, score: float) -> Any:
+    """Copy with `rerank_score` in metadata; docstore objects are shared, so never mutate them."""
+    if not isinstance(doc, Document):
+        return doc
+    return Document(page_content=doc.page_content, metadata={**doc.metadata, "rerank_score": round(float(score), 4)},
+                    id=doc.id)
+
+
+def _minmax(x: np.ndarray) -> np.ndarray:
+    span = float(x.max() - x.min()) if len(x) else 0.0
+    return (x - x.min()) / span if span > 0 else np.ones_like(x)
+
+
+def mmr_select(relevance: np.ndarray, similarity: np.ndarray, top_n: int, mmr_lambda: float) -> List[int]:
+    """Greedy maximal marginal relevance; returns indices in selection order."""
+    n = len(relevance)
+    selected: List[int] = []
+    max_sim = np.full(n, -np.inf)
+    available = np.ones(n, dtype=bool)
+    for _ in range(min(top_n, n)):
+        score = relevance if not selected else mmr_lambda * relevance - (1 - mmr_lambda) * max_sim
+        i = int(np.argmax(np.where(available, score, -np.inf)))
+        selected.append(i)
+        available[i] = False
+        max_sim = np.maximum(max_sim, similarity[i])
+    return selected
+
+
+class LexicalReranker:
+    """BM25 + first-stage rank relevance, MMR selection. No model, a few ms for ~50 candidates."""
+
+    def __init__(self, lexical_weight: float = 0.6, mmr_lambda: float = 0.7, dimensions: int = 512,
+                 k1: float = 1.5, b: float = 0.75):
+        self.lexical_weight = float(lexical_weight)
+        self.mmr_lambda = float(mmr_lambda)
+        self.hasher = HashingEmbeddings(dimensions)
+        self.k1 = k1
+        self.b = b
+
+    def bm25(self, query: str, texts: Sequence[str], corpus: Any = None) -> np.ndarray:
+        """
+        BM25 of each text for `query`. Term idf comes from `corpus` (the collection's BM25Index)
+        when given: within a candidate set the query's key term is usually in every text, so a
+        candidate-local idf would discount exactly the term that matters.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not texts:
+            return np.zeros(len(texts), dtype=np.float32)
+        counts = [Counter(tokenize(t)) for t in texts]
+        tf = np.asarray([[c.get(term, 0) for term in terms] for c in counts], dtype=np.float32)
+        lengths = np.asarray([sum(c.values()) for c in counts], dtype=np.float32)
+        if corpus is not None and len(corpus):
+            idf = corpus.idf(terms)
+        else:
+            n, df = len(texts), (tf > 0).sum(axis=0)
+            idf = np.log1p((n - df + 0.5) / (df + 0.5))
+        norm = self.k1 * (1 - self.b + self.b * lengths / max(float(lengths.mean()), 1.0))
+        return (tf * (self.k1 + 1) / (tf + norm[:, None]) * idf).sum(axis=1)
+
+    def relevance(self, query: str, texts: Sequence[str], corpus: Any = None) -> np.ndarray:
+        n = len(texts)
+        prior = 1.0 - np.arange(n, dtype=np.float32) / max(n, 1)  # first-stage order
+        return self.lexical_weight * _minmax(self.bm25(query, texts, corpus)) + (1 - self.lexical_weight) * prior
+
+    def rerank(self, query: str, docs: Sequence[Any], top_n: int, corpus: Any = None) -> List[Any]:
+        if not docs:
+            return []
+        texts = [getattr(d, "page_content", str(d)) for d in docs]
+        relevance = self.relevance(query, texts, corpus)
+        vectors = np.asarray(self.hasher.embed_documents(texts), dtype=np.float32)
+        order = mmr_select(relevance, vectors @ vectors.T, top_n, self.mmr_lambda)
+        return [_with_score(docs[i], relevance[i]) for i in order]
+
+
+class CrossEncoderReranker:
+    """sentence-transformers CrossEncoder loaded from a local directory (optional dependency)."""
+
+    def __init__(self, model_path: str, device: str = "cpu", batch_size: int = 32, max_chars: int = 2000):
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError as e:
+            raise ImportError("Rerank method 'cross_encoder' needs the sentence-transformers package") from e
+        if not model_path or not os.path.isdir(model_path):
+            raise FileNotFoundError(f"Local cross-encoder model directory not found: {model_path}")
+        self.model = CrossEncoder(model_path, device=device)
+        self.batch_size = int(batch_size)
+        self.max_chars = int(max_chars)
+
+    def rerank(self, query: str, docs: Sequence[Any], top_n: int, corpus: Any = None) -> List[Any]:
+        if not docs:
+            return []
+        pairs = [(query, getattr(d, "page_content", str(d))[:self.max_chars]) for d in docs]
+        scores = np.asarray(self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False))
+        order = np.argsort(-scores, kind="stable")[:top_n]
+        return [_with_score(docs[i], scores[i]) for i in order]
+
+
+def rerank_config(retriever_cfg: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {**DEFAULT_RERANK_CONFIG, **((retriever_cfg or {}).get("rerank") or {})}
+
+
+def build_reranker(cfg: Dict[str, Any]):
+    """Reranker for a resolved `retriever.rerank` block, or None when disabled."""
+    if not cfg.get("enabled"):
+        return None
+    method = cfg.get("method", "lexical")
+    if method == "lexical":
+        return LexicalReranker(lexical_weight=float(cfg["lexical_weight"]), mmr_lambda=float(cfg["mmr_lambda"]),
+                               dimensions=int(cfg["dimensions"]))
+    if method == "cross_encoder":
+        return CrossEncoderReranker(cfg.get("model_path"), device=cfg.get("device", "cpu"),
+                                    batch_size=int(cfg["batch_size"]), max_chars=int(cfg["max_chars"]))
+    raise ValueError(f"Unsupported rerank method: {method}")
+
+
+_rerankers: Dict[str, Any] = {}
+_rerankers_lock = threading.Lock()
+
+
+def get_reranker(cfg: Dict[str, Any]):
+    """Process-wide reranker per config (a cross-encoder is loaded once, not per request)."""
+    if not cfg.get("enabled"):
+        return None
+    key = json.dumps(cfg, sort_keys=True, default=str)
+    with _rerankers_lock:
+        reranker = _rerankers.get(key)
+        if reranker is None:
+            reranker = _rerankers[key] = build_reranker(cfg)
+        return reranker
+
+
+def fetch_size(k: int, retriever_cfg: Optional[Dict[str, Any]], rerank_enabled: bool) -> int:
+    """First-stage candidates: `retriever.top_k` (at least k) when re-ranking, else k."""
+    if not rerank_enabled:
+        return k
+    return max(k, int((retriever_cfg or {}).get("top_k", k)))
@@ -1,17 +1,26 @@
 import sys
 import os
+import json
 from operator import itemgetter
-from typing import List, Optional, Dict, Any
+from typing import AsyncIterator, List, Optional, Dict, Any
 
 from langchain_core.messages import BaseMessage
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_community.vectorstores import FAISS
+from langchain_core.runnables import RunnableBranch, RunnableLambda, RunnableParallel
 
-from src.common.utils.model_loader import ModelLoader
+from src.common.utils.model_loader import get_model_loader
+from src.common.utils.concurrency import run_in_stage, stage_slot
+from src.common.utils.metrics import tag_llm, timed
 from src.common.exception.custom_exception import DocumentPortalException
 from src.common.logger.custom_logger import CustomLogger
 from src.core.prompt.prompt_library import PROMPT_REGISTRY
+from src.core.document_chat.vectorstore_cache import get_vectorstore_cache
+from src.core.document_chat.answer_cache import MemoizedQueryEmbeddings, get_answer_cache
+from src.core.document_chat.hybrid_retriever import HybridRetriever
+from src.core.document_chat.reranker import fetch_size, get_reranker, rerank_config
+from src.core.document_ingestion.faiss_index import resolve_index_config
+from src.core.document_ingestion.faiss_store import SegmentedFaissStore
 from src.model.models import PromptType
 
 
@@ -39,9 +48,30 @@ class ConversationalRAG:
                 PromptType.CONTEXT_QA.value
             ]
 
+            # Question-rewrite routing (retriever.rewrite in config)
+            self.retriever_cfg: Dict[str, Any] = get_model_loader().config.get("retriever") or {}
+            rewrite_cfg = self.retriever_cfg.get("rewrite") or {}
+            self.min_history_for_rewrite = int(rewrite_cfg.get("min_history_messages", 1))
+            self.parallel_raw_retrieval = bool(rewrite_cfg.get("parallel_raw_retrieval", True))
+
+            # Two-stage retrieval (retriever.rerank): over-fetch top_k, keep the best k for the prompt
+            self.rerank_cfg = rerank_config(self.retriever_cfg)
+            self.reranker = get_reranker(self.rerank_cfg)
+            self.final_k: Optional[int] = None
+            self._rerank_corpus = None  # the collection's BM25Index: corpus-wide term statistics
+
+            # Answer cache (retriever.answer_cache in config); scope is set when an index is loaded
+            answer_cfg = self.retriever_cfg.get("answer_cache") or {}
+            self.answer_cache = get_answer_cache() if answer_cfg.get("enabled", True) else None
+            self.semantic_cache = bool(answer_cfg.get("semantic", True))
+            self.vectorstore = None
+            self._cache_scope = None
+
             # Lazy pieces
             self.retriever = retriever
             self.chain = None
+            self.retrieve_chain = None  # input/chat_history -> List[Document]
+            self.answer_chain = None    # context/input/chat_history -> str
             if self.retriever is not None:
                 self._build_lcel_chain()
 
@@ -57,30 +87,73 @@ class ConversationalRAG:
         index_path: str,
         k: int = 5,
         index_name: str = "index",
-        search_type: str = "similarity",
+        search_type: Optional[str] = None,
         search_kwargs: Optional[Dict[str, Any]] = None,
     ):
         """
-        Load FAISS vectorstore from disk and build retriever + LCEL chain.
+        Load FAISS vectorstore (through the process-wide cache) and build retriever + LCEL chain.
+
+        search_type: any FAISS retriever type ("similarity", "mmr", ...) or "hybrid" for
+        BM25 + dense reciprocal rank fusion. Defaults to `retriever.search_type` in config.
+
+        With `retriever.rerank` enabled the search returns `retriever.top_k` candidates and the
+        re-ranker passes the best `k` of them to the answer prompt.
         """
         try:
             if not os.path.isdir(index_path):
                 raise FileNotFoundError(f"FAISS index directory not found: {index_path}")
 
-            embeddings = ModelLoader().load_embeddings()
-            vectorstore = FAISS.load_local(
-                index_path,
-                embeddings,
-                index_name=index_name,
-                allow_dangerous_deserialization=True,  # ok if you trust the index
-            )
+            def _load():
+                # memoized so the answer cache's semantic lookup and the search share one embedding call
+                loader = get_model_loader()
+                embeddings = MemoizedQueryEmbeddings(loader.load_embeddings())
+                index_cfg = resolve_index_config(loader.config.get("faiss_db"), os.path.basename(os.path.normpath(index_path)))
+                store = SegmentedFaissStore(index_path, embeddings, index_name=index_name, index_cfg=index_cfg)
+                with timed("index_load"):
+                    store.load()  # base snapshot + replayed segments
+                return store
 
-            if search_kwargs is None:
-                search_kwargs = {"k": k}
+            cache = get_vectorstore_cache()
+            version = cache.version(index_path, index_name)
+            store = cache.get_vectorstore(index_path, index_name, _load)
+            vectorstore = store.vs
+            self.vectorstore = vectorstore
 
-            self.retriever = vectorstore.as_retriever(
-                search_type=search_type, search_kwargs=search_kwargs
+            search_type = search_type or self.retriever_cfg.get("search_type", "similarity")
+            if search_type == "hybrid" and store.bm25 is None:
+                self.log.warning("No BM25 index found, falling back to similarity search", index_path=index_path)
+                search_type = "similarity"
+            if search_kwargs is None:
+                search_kwargs = {"k": fetch_size(k, self.retriever_cfg, self.reranker is not None)}
+            self.final_k = k if self.reranker is not None else None
+            self._rerank_corpus = store.bm25
+            rerank_key = json.dumps({"k": k, **self.rerank_cfg}, sort_keys=True, default=str) if self.reranker else ""
+            self._cache_scope = (
+                os.path.abspath(index_path),
+                f"{index_name}@{version}:{search_type}:{json.dumps(search_kwargs, sort_keys=True, default=str)}:{rerank_key}",
             )
+
+            hybrid_cfg = self.retriever_cfg.get("hybrid") or {}
+
+            def _build():
+                if search_type == "hybrid":
+                    top_k = int(search_kwargs.get("k", k))
+                    return HybridRetriever(
+                        vectorstore=vectorstore,
+                        bm25=store.bm25,
+                        k=top_k,
+                        fetch_k=max(top_k, int(hybrid_cfg.get("fetch_k", 4 * top_k))),
+                        rrf_k=int(hybrid_cfg.get("rrf_k", 60)),
+                        dense_weight=float(hybrid_cfg.get("dense_weight", 1.0)),
+                        lexical_weight=float(hybrid_cfg.get("lexical_weight", 1.0)),
+                    )
+                return vectorstore.as_retriever(search_type=search_type, search_kwargs=search_kwargs)
+
+            # only the retriever (bound to the shared vectorstore) is cached; the LCEL graph holds
+            # this instance's LLM and re-ranker, so every instance builds its own (a few runnables)
+            retriever_key = (search_type, json.dumps(search_kwargs, sort_keys=True, default=str),
+                             json.dumps(hybrid_cfg, sort_keys=True, default=str) if search_type == "hybrid" else "")
+            self.retriever = cache.get_chain(index_path, index_name, retriever_key, _build)
             self._build_lcel_chain()
 
             self.log.info(
@@ -104,29 +177,93 @@ class ConversationalRAG:
                     "RAG chain not initialized. Call load_retriever_from_faiss() before invoke().", sys
                 )
             chat_history = chat_history or []
+            hit, query_vector = self._cache_lookup(user_input, chat_history)
+            if hit is not None:
+                return hit.answer
             payload = {"input": user_input, "chat_history": chat_history}
-            answer = self.chain.invoke(payload)
-            if not answer:
-                self.log.warning(
-                    "No answer generated", user_input=user_input, session_id=self.session_id
+            answer = self._finalize_answer(user_input, self.chain.invoke(payload))
+            self._cache_store(user_input, chat_history, answer, query_vector=query_vector)
+            return answer
+        except Exception as e:
+            self.log.error("Failed to invoke ConversationalRAG", error=str(e))
+            raise DocumentPortalException("Invocation error in ConversationalRAG", sys)
+
+    async def ainvoke(self, user_input: str, chat_history: Optional[List[BaseMessage]] = None) -> str:
+        """Invoke the LCEL pipeline without blocking the event loop (LLM calls via ainvoke)."""
+        try:
+            if self.chain is None:
+                raise DocumentPortalException(
+                    "RAG chain not initialized. Call load_retriever_from_faiss() before invoke().", sys
                 )
-                return "no answer generated."
-            self.log.info(
-                "Chain invoked successfully",
-                session_id=self.session_id,
-                user_input=user_input,
-                answer_preview=str(answer)[:150],
-            )
+            chat_history = chat_history or []
+            hit, query_vector = await run_in_stage("search", self._cache_lookup, user_input, chat_history)
+            if hit is not None:
+                return hit.answer
+            payload = {"input": user_input, "chat_history": chat_history}
+            async with stage_slot("llm"):
+                answer = self._finalize_answer(user_input, await self.chain.ainvoke(payload))
+            self._cache_store(user_input, chat_history, answer, query_vector=query_vector)
             return answer
         except Exception as e:
             self.log.error("Failed to invoke ConversationalRAG", error=str(e))
             raise DocumentPortalException("Invocation error in ConversationalRAG", sys)
 
+    async def astream(
+        self, user_input: str, chat_history: Optional[List[BaseMessage]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream the answer as events: one "sources" event with the retrieved chunks' metadata
+        as soon as retrieval finishes, then "token" events as the LLM produces them, then "done".
+        """
+        if self.retrieve_chain is None or self.answer_chain is None:
+            raise DocumentPortalException(
+                "RAG chain not initialized. Call load_retriever_from_faiss() before astream().", sys
+            )
+        chat_history = chat_history or []
+        hit, query_vector = await run_in_stage("search", self._cache_lookup, user_input, chat_history)
+        if hit is not None:
+            yield {"type": "sources", "sources": hit.sources, "cached": True}
+            yield {"type": "token", "text": hit.answer}
+            yield {"type": "done", "answer": hit.answer, "cached": True}
+            return
+
+        payload = {"input": user_input, "chat_history": chat_history}
+        docs = await self.retrieve_chain.ainvoke(payload)
+        sources = [dict(getattr(d, "metadata", {}) or {}) for d in docs]
+        yield {"type": "sources", "sources": sources}
+
+        parts: List[str] = []
+        async with stage_slot("llm"):
+            async for token in self.answer_chain.astream(
+                {"context": self._format_docs(docs), **payload}
+            ):
+                if token:
+                    parts.append(token)
+                    yield {"type": "token", "text": token}
+
+        answer = self._finalize_answer(user_input, "".join(parts))
+        self._cache_store(user_input, chat_history, answer, sources=sources, query_vector=query_vector)
+        yield {"type": "done", "answer": answer}
+
+    def _finalize_answer(self, user_input: str, answer: str) -> str:
+        if not answer:
+            self.log.warning(
+                "No answer generated", user_input=user_input, session_id=self.session_id
+            )
+            return "no answer generated."
+        self.log.info(
+            "Chain invoked successfully",
+            session_id=self.session_id,
+            user_input=user_input,
+            answer_preview=str(answer)[:150],
+        )
+        return answer
+
     # ---------- Internals ----------
 
     def _load_llm(self):
         try:
-            llm = ModelLoader().load_llm()
+            llm = get_model_loader().load_llm()
             if not llm:
                 raise ValueError("LLM could not be loaded")
             self.log.info("LLM loaded successfully", session_id=self.session_id)
@@ -135,6 +272,45 @@ class ConversationalRAG:
             self.log.error("Failed to load LLM", error=str(e))
             raise DocumentPortalException("LLM loading error in ConversationalRAG", sys)
 
+    def _cache_lookup(self, user_input: str, chat_history: List[BaseMessage]):
+        """Return (cached entry or None, query embedding used for the semantic tier or None)."""
+        if self.answer_cache is None or self._cache_scope is None:
+            return None, None
+        query_vector = None
+        if self.semantic_cache and not chat_history and self.vectorstore is not None:
+            query_vector = self.vectorstore.embedding_function.embed_query(user_input)
+        hit = self.answer_cache.get(self._cache_scope, user_input, chat_history, query_vector=query_vector)
+        if hit is not None:
+            self.log.info("Answer served from cache", session_id=self.session_id, user_input=user_input)
+        return hit, query_vector
+
+    def _cache_store(self, user_input: str, chat_history: List[BaseMessage], answer: str,
+                     sources: Optional[List[Dict[str, Any]]] = None, query_vector=None) -> None:
+        if self.answer_cache is None or self._cache_scope is None or answer == "no answer generated.":
+            return
+        self.answer_cache.put(self._cache_scope, user_input, answer, chat_history,
+                              sources=sources, query_vector=query_vector)
+
+    def _needs_rewrite(self, payload: Dict[str, Any]) -> bool:
+        history = payload.get("chat_history") or []
+        return len(history) >= max(self.min_history_for_rewrite, 1)
+
+    @staticmethod
+    def _merge_candidates(results: Dict[str, List[Any]]) -> List[Any]:
+        """Interleave rewritten/raw hits (rewritten first), dropping duplicate chunks; keeps k results."""
+        rewritten, raw = results.get("rewritten") or [], results.get("raw") or []
+        k = max(len(rewritten), len(raw))
+        merged, seen = [], set()
+        for pair in zip(rewritten + [None] * (k - len(rewritten)), raw + [None] * (k - len(raw))):
+            for d in pair:
+                if d is None:
+                    continue
+                key = getattr(d, "page_content", str(d))
+                if key not in seen:
+                    seen.add(key)
+                    merged.append(d)
+        return merged[:k]
+
     @staticmethod
     def _format_docs(docs) -> str:
         return "\n\n".join(getattr(d, "page_content", str(d)) for d in docs)
@@ -148,23 +324,52 @@ class ConversationalRAG:
             question_rewriter = (
                 {"input": itemgetter("input"), "chat_history": itemgetter("chat_history")}
                 | self.contextualize_prompt
-                | self.llm
+                | tag_llm(self.llm, "rewrite")
                 | StrOutputParser()
             )
 
-            # 2) Retrieve docs for rewritten question
-            retrieve_docs = question_rewriter | self.retriever | self._format_docs
+            # 2) Retrieve docs (async path searches on the bounded "search" pool), then re-rank
+            #    the over-fetched candidates for that query down to k
+            retriever, reranker, final_k, corpus = self.retriever, self.reranker, self.final_k, self._rerank_corpus
+
+            def _retrieve(query: str):
+                with timed("retrieve"):  # query embedding + vector / hybrid search
+                    docs = retriever.invoke(query)
+                if reranker is None or final_k is None:
+                    return docs
+                with timed("rerank"):
+                    return reranker.rerank(query, docs, final_k, corpus=corpus)
+
+            async def _aretrieve(query: str):
+                return await run_in_stage("search", _retrieve, query)
+
+            search = RunnableLambda(_retrieve, afunc=_aretrieve)
+            raw_search = itemgetter("input") | search
+
+            if self.parallel_raw_retrieval:
+                # raw-question retrieval runs alongside rewrite+retrieval; the rewrite is off the critical path
+                rewritten_search = RunnableParallel(
+                    raw=raw_search, rewritten=question_rewriter | search
+                ) | RunnableLambda(self._merge_candidates)
+            else:
+                rewritten_search = question_rewriter | search
+
+            # No (or trivially short) history: a rewrite can only echo the input, so skip that LLM call
+            self.retrieve_chain = RunnableBranch(
+                (self._needs_rewrite, rewritten_search),
+                raw_search,
+            )
+            retrieve_docs = self.retrieve_chain | self._format_docs
 
             # 3) Answer using retrieved context + original input + chat history
+            self.answer_chain = self.qa_prompt | tag_llm(self.llm, "answer") | StrOutputParser()
             self.chain = (
                 {
                     "context": retrieve_docs,
                     "input": itemgetter("input"),
                     "chat_history": itemgetter("chat_history"),
                 }
-                | self.qa_prompt
-                | self.llm
-                | StrOutputParser()
+                | self.answer_chain
             )
 
             self.log.info("LCEL graph built successfully", session_id=self.session_id)
@@ -0,0 +1,203 @@
+from __future__ import annotations
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from src.common.utils.config_loader import load_config
+from src.common.logger.custom_logger import CustomLogger
+from src.core.document_ingestion.faiss_store import SegmentedFaissStore
+
+log = CustomLogger().get_logger(__name__)
+
+CacheKey = Tuple[str, str]
+
+
+class _Entry:
+    """One loaded vectorstore plus the retrievers built on top of it."""
+    def __init__(self, vectorstore: Any, signature: Tuple, size_bytes: int):
+        self.vectorstore = vectorstore
+        self.signature = signature
+        self.size_bytes = size_bytes
+        self.chains: Dict[Hashable, Any] = {}
+
+
+class VectorStoreCache:
+    """
+    Process-wide LRU cache of loaded FAISS vectorstores and the retrievers built on them.
+
+    Entries are keyed by (index_dir, index_name). Every lookup compares the mtime/size of the
+    index manifest and segment directory against the signature captured at load time, so an
+    index appended to by ChatIngestor is transparently reloaded on the next query.
+    """
+
+    def __init__(self, max_memory_mb: float = 1024, max_entries: int = 32):
+        self.max_bytes = int(max_memory_mb * 1024 * 1024)
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[CacheKey, _Entry]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._key_locks: Dict[CacheKey, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.evictions = 0
+
+    # ---------- Public API ----------
+
+    def get_vectorstore(self, index_path: str, index_name: str, loader: Callable[[], Any]) -> Any:
+        """Return the cached vectorstore for the index, calling `loader()` on miss or staleness."""
+        key = self._key(index_path, index_name)
+        signature = self._signature(index_path, index_name)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.signature == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.vectorstore
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Load outside the global lock; concurrent requests for the same index wait on the key lock
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry.signature == signature:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.vectorstore
+                stale = entry is not None
+                self.misses += 1
+                if stale:
+                    self.reloads += 1
+
+            vectorstore = loader()
+            size_bytes = self._estimate_size(index_path, index_name)
+
+            with self._lock:
+                self._entries[key] = _Entry(vectorstore, signature, size_bytes)
+                self._entries.move_to_end(key)
+                self._evict()
+
+        log.info("Vectorstore loaded into cache", index_path=key[0], index_name=index_name,
+                 reloaded=stale, size_bytes=size_bytes, entries=len(self._entries))
+        return vectorstore
+
+    def get_chain(self, index_path: str, index_name: str, chain_key: Hashable,
+                  builder: Callable[[], Any]) -> Any:
+        """
+        Return an object (e.g. a retriever) cached against the loaded vectorstore, building it with
+        `builder()` if absent. Only cache what depends on the vectorstore and `chain_key` alone.
+        """
+        key = self._key(index_path, index_name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return builder()
+            chain = entry.chains.get(chain_key)
+            if chain is not None:
+                return chain
+        chain = builder()
+        with self._lock:
+            # the entry may have been reloaded in between; only attach to the live one
+            if self._entries.get(key) is entry:
+                entry.chains[chain_key] = chain
+        return chain
+
+    def invalidate(self, index_path: str, index_name: Optional[str] = None) -> int:
+        """Drop cached entries for an index directory (all index names if none given)."""
+        norm = self._norm(index_path)
+        with self._lock:
+            doomed = [k for k in self._entries if k[0] == norm and (index_name is None or k[1] == index_name)]
+            for k in doomed:
+                del self._entries[k]
+        if doomed:
+            log.info("Vectorstore cache invalidated", index_path=norm, removed=len(doomed))
+        return len(doomed)
+
+    def version(self, index_path: str, index_name: str) -> str:
+        """Short token that changes whenever the index files on disk change."""
+        sig = repr(self._signature(index_path, index_name)).encode("utf-8")
+        return hashlib.sha1(sig).hexdigest()[:12]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "memory_bytes": sum(e.size_bytes for e in self._entries.values()),
+                "max_memory_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    # ---------- Internals ----------
+
+    @staticmethod
+    def _norm(index_path: str) -> str:
+        return str(Path(index_path).resolve())
+
+    def _key(self, index_path: str, index_name: str) -> CacheKey:
+        return (self._norm(index_path), index_name)
+
+    @staticmethod
+    def _index_files(index_path: str, index_name: str):
+        # manifest / segment dir / legacy files: their stat changes on every append or compaction
+        return SegmentedFaissStore.signature_paths(index_path, index_name)
+
+    def _signature(self, index_path: str, index_name: str) -> Tuple:
+        sig = []
+        for p in self._index_files(index_path, index_name):
+            try:
+                st = p.stat()
+                sig.append((p.name, st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                sig.append((p.name, None, None))
+        return tuple(sig)
+
+    def _estimate_size(self, index_path: str, index_name: str) -> int:
+        # Mapped index + id map + live segments; chunk text stays in SQLite until a hit is fetched
+        try:
+            return SegmentedFaissStore.footprint_bytes(index_path, index_name)
+        except Exception:
+            return 0
+
+    def _evict(self) -> None:
+        # Always keep the most recently used entry, even if it alone exceeds the budget
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries
+            or sum(e.size_bytes for e in self._entries.values()) > self.max_bytes
+        ):
+            key, entry = self._entries.popitem(last=False)
+            self.evictions += 1
+            log.info("Vectorstore evicted from cache", index_path=key[0], index_name=key[1],
+                     size_bytes=entry.size_bytes)
+
+
+_cache: Optional[VectorStoreCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_vectorstore_cache() -> VectorStoreCache:
+    """Process-wide cache instance, sized from `faiss_db.cache` in the YAML config."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    cfg = (load_config().get("faiss_db") or {}).get("cache") or {}
+                except FileNotFoundError:
+                    cfg = {}
+                _cache = VectorStoreCache(
+                    max_memory_mb=float(os.getenv("VECTORSTORE_CACHE_MAX_MB", cfg.get("max_memory_mb", 1024))),
+                    max_entries=int(cfg.get("max_entries", 32)),
+                )
+    return _cache
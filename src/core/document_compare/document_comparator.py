@@ -1,24 +1,39 @@
 import sys
+import asyncio
+import re
+from typing import Any, Dict, List, Sequence
 from dotenv import load_dotenv
 import pandas as pd
 from langchain_core.output_parsers import JsonOutputParser
 from langchain.output_parsers import OutputFixingParser
-from src.common.utils.model_loader import ModelLoader
+from src.common.utils.model_loader import get_model_loader
+from src.common.utils.concurrency import stage_slot
+from src.common.utils.metrics import count_parser_retries, tag_llm
 from src.common.logger.custom_logger import CustomLogger
 from src.common.exception.custom_exception import DocumentPortalException
 from src.core.prompt.prompt_library import PROMPT_REGISTRY
+from src.core.document_compare.page_alignment import PagePair, align_pages, diff_summary
 from src.model.models import SummaryResponse, PromptType
 
+NO_CHANGE = "NO CHANGE"
+DEFAULT_COMPARE_CONFIG: Dict[str, Any] = {
+    "fuzzy_threshold": 0.5,
+    "batch_chars": 12000,
+    "max_pages_per_batch": 8,
+}
+
 class DocumentComparatorLLM:
     def __init__(self):
         load_dotenv()
         self.log = CustomLogger().get_logger(__name__)
-        self.loader = ModelLoader()
+        self.loader = get_model_loader()
         self.llm = self.loader.load_llm()
         self.parser = JsonOutputParser(pydantic_object=SummaryResponse)
-        self.fixing_parser = OutputFixingParser.from_llm(parser=self.parser, llm=self.llm)
+        self.fixing_parser = count_parser_retries(OutputFixingParser.from_llm(parser=self.parser, llm=self.llm), "compare")
         self.prompt = PROMPT_REGISTRY[PromptType.DOCUMENT_COMPARISON.value]
-        self.chain = self.prompt | self.llm | self.parser
+        self.chain = self.prompt | tag_llm(self.llm, "compare") | self.parser
+        self.pages_chain = PROMPT_REGISTRY[PromptType.DOCUMENT_COMPARISON_PAGES.value] | tag_llm(self.llm, "compare_pages") | self.parser
+        self.compare_cfg = {**DEFAULT_COMPARE_CONFIG, **((getattr(self.loader, "config", None) or {}).get("compare") or {})}
         self.log.info("DocumentComparatorLLM initialized", model=self.llm)
 
     def compare_documents(self, combined_docs: str) -> pd.DataFrame:
@@ -36,6 +51,111 @@ class DocumentComparatorLLM:
             self.log.error("Error in compare_documents", error=str(e))
             raise DocumentPortalException("Error comparing documents", sys)
 
+    async def acompare_documents(self, combined_docs: str) -> pd.DataFrame:
+        try:
+            inputs = {
+                "combined_docs": combined_docs,
+                "format_instruction": self.parser.get_format_instructions()
+            }
+
+            self.log.info("Invoking document comparison LLM chain (async)")
+            async with stage_slot("llm"):
+                response = await self.chain.ainvoke(inputs)
+            self.log.info("Chain invoked successfully", response_preview=str(response)[:200])
+            return self._format_response(response)
+        except Exception as e:
+            self.log.error("Error in compare_documents", error=str(e))
+            raise DocumentPortalException("Error comparing documents", sys)
+
+    # ---------- Page-level comparison ----------
+
+    def plan_pages(self, ref_pages: Sequence[str], act_pages: Sequence[str]):
+        """Align pages and group the ones that differ into LLM batches: (pairs, batches)."""
+        pairs = align_pages(ref_pages, act_pages, fuzzy_threshold=float(self.compare_cfg["fuzzy_threshold"]))
+        budget = int(self.compare_cfg["batch_chars"])
+        per_batch = int(self.compare_cfg["max_pages_per_batch"])
+        batches: List[List[PagePair]] = []
+        cur: List[PagePair] = []
+        cur_chars = 0
+        for pair in pairs:
+            if pair.status == "same":
+                continue
+            size = len(pair.ref_text) + len(pair.act_text)
+            if cur and (cur_chars + size > budget or len(cur) >= per_batch):
+                batches.append(cur)
+                cur, cur_chars = [], 0
+            cur.append(pair)
+            cur_chars += size
+        if cur:
+            batches.append(cur)
+        self.log.info("Pages aligned", ref_pages=len(ref_pages), act_pages=len(act_pages),
+                      unchanged=sum(p.status == "same" for p in pairs), changed=sum(len(b) for b in batches),
+                      batches=len(batches))
+        return pairs, batches
+
+    def _batch_inputs(self, batch: List[PagePair]) -> Dict[str, str]:
+        blocks = [
+            f"<<PAGE: {p.label}>>\nREFERENCE:\n{p.ref_text.strip()}\n\nACTUAL:\n{p.act_text.strip()}"
+            for p in batch
+        ]
+        return {"page_pairs": "\n\n".join(blocks), "format_instruction": self.parser.get_format_instructions()}
+
+    def compare_pages(self, ref_pages: Sequence[str], act_pages: Sequence[str]) -> pd.DataFrame:
+        """Page-wise comparison; only page pairs that differ are sent to the LLM."""
+        try:
+            pairs, batches = self.plan_pages(ref_pages, act_pages)
+            responses = self.pages_chain.batch([self._batch_inputs(b) for b in batches]) if batches else []
+            return self._format_response(self._merge_rows(pairs, batches, responses))
+        except Exception as e:
+            self.log.error("Error in compare_pages", error=str(e))
+            raise DocumentPortalException("Error comparing documents", e) from e
+
+    async def acompare_pages(self, ref_pages: Sequence[str], act_pages: Sequence[str]) -> pd.DataFrame:
+        try:
+            pairs, batches = self.plan_pages(ref_pages, act_pages)
+
+            async def _run(batch: List[PagePair]):
+                async with stage_slot("llm"):
+                    return await self.pages_chain.ainvoke(self._batch_inputs(batch))
+
+            responses = await asyncio.gather(*(_run(b) for b in batches))
+            return self._format_response(self._merge_rows(pairs, batches, list(responses)))
+        except Exception as e:
+            self.log.error("Error in compare_pages", error=str(e))
+            raise DocumentPortalException("Error comparing documents", e) from e
+
+    @staticmethod
+    def _label_key(label: Any) -> str:
+        return re.sub(r"^page\s*", "", str(label).strip().lower())
+
+    def _merge_rows(self, pairs: List[PagePair], batches: List[List[PagePair]], responses: List[Any]) -> List[Dict[str, str]]:
+        """Rows in page order: local NO CHANGE rows plus the LLM's rows for the changed pairs."""
+        changes: Dict[PagePair, str] = {}
+        for batch, response in zip(batches, responses):
+            keys = {self._label_key(p.label) for p in batch}
+            matched: Dict[str, str] = {}
+            leftovers: List[str] = []
+            for row in response if isinstance(response, list) else []:
+                if not isinstance(row, dict):
+                    continue
+                key, text = self._label_key(row.get("Page", "")), str(row.get("Changes", ""))
+                if key in keys and key not in matched:
+                    matched[key] = text
+                else:
+                    leftovers.append(text)
+            # labels rewritten by the model: match positionally, then fall back to a local diff summary
+            for p in batch:
+                key = self._label_key(p.label)
+                if key in matched:
+                    changes[p] = matched[key]
+                elif leftovers:
+                    changes[p] = leftovers.pop(0)
+                else:
+                    self.log.warning("No LLM row for changed page", page=p.label)
+                    changes[p] = diff_summary(p.ref_text, p.act_text)
+        rows = [{"Page": p.label, "Changes": NO_CHANGE if p.status == "same" else changes[p]} for p in pairs]
+        return SummaryResponse.model_validate(rows).model_dump()
+
     def _format_response(self, response_parsed: list[dict]) -> pd.DataFrame: #type: ignore
         try:
             df = pd.DataFrame(response_parsed)
@@ -0,0 +1,123 @@
+from __future__ import annotations
+import difflib
+import hashlib
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+_WS_RE = re.compile(r"\s+")
+_WORD_RE = re.compile(r"\w+")
+
+# fuzzy alignment runs a DP over each unmatched block; above this many cells pair positionally
+MAX_DP_CELLS = 10000
+
+
+def normalize_page(text: str) -> str:
+    return _WS_RE.sub(" ", text).strip()
+
+
+def page_hash(text: str) -> str:
+    return hashlib.sha1(normalize_page(text).encode("utf-8")).hexdigest()
+
+
+def page_similarity(a: str, b: str) -> float:
+    """Jaccard overlap of lower-cased word sets: cheap and stable for whole pages."""
+    wa, wb = set(_WORD_RE.findall(a.lower())), set(_WORD_RE.findall(b.lower()))
+    if not wa and not wb:
+        return 1.0
+    return len(wa & wb) / len(wa | wb)
+
+
+@dataclass(frozen=True)
+class PagePair:
+    ref_index: Optional[int]   # 0-based page in the reference PDF (None = page added)
+    act_index: Optional[int]   # 0-based page in the actual PDF (None = page removed)
+    ref_text: str
+    act_text: str
+    status: str                # "same" | "changed" | "added" | "removed"
+    similarity: float
+
+    @property
+    def label(self) -> str:
+        """Page label used in the comparison rows (reference numbering, actual noted when shifted)."""
+        if self.ref_index is None:
+            return f"{self.act_index + 1} (added in actual)"
+        if self.act_index is None:
+            return f"{self.ref_index + 1} (removed in actual)"
+        if self.ref_index == self.act_index:
+            return str(self.ref_index + 1)
+        return f"{self.ref_index + 1} (actual {self.act_index + 1})"
+
+
+def _align_block(ref: Sequence[str], act: Sequence[str], r0: int, a0: int, threshold: float) -> List[PagePair]:
+    """Monotonic alignment of a block of non-identical pages maximizing total similarity."""
+    n, m = len(ref), len(act)
+    if n * m > MAX_DP_CELLS:
+        sims = None
+    else:
+        sims = [[page_similarity(ref[i], act[j]) for j in range(m)] for i in range(n)]
+    if sims is None:
+        out = [PagePair(r0 + i, a0 + i, ref[i], act[i], "changed", 0.0) for i in range(min(n, m))]
+        out += [PagePair(r0 + i, None, ref[i], "", "removed", 0.0) for i in range(m, n)]
+        out += [PagePair(None, a0 + j, "", act[j], "added", 0.0) for j in range(n, m)]
+        return out
+
+    # score[i][j]: best total similarity aligning ref[i:] with act[j:]
+    score = [[0.0] * (m + 1) for _ in range(n + 1)]
+    for i in range(n - 1, -1, -1):
+        for j in range(m - 1, -1, -1):
+            best = max(score[i + 1][j], score[i][j + 1])
+            if sims[i][j] >= threshold:
+                best = max(best, sims[i][j] + score[i + 1][j + 1])
+            score[i][j] = best
+
+    out: List[PagePair] = []
+    i = j = 0
+    while i < n and j < m:
+        if sims[i][j] >= threshold and score[i][j] == sims[i][j] + score[i + 1][j + 1]:
+            out.append(PagePair(r0 + i, a0 + j, ref[i], act[j], "changed", sims[i][j]))
+            i, j = i + 1, j + 1
+        elif score[i][j] == score[i + 1][j]:
+            out.append(PagePair(r0 + i, None, ref[i], "", "removed", 0.0))
+            i += 1
+        else:
+            out.append(PagePair(None, a0 + j, "", act[j], "added", 0.0))
+            j += 1
+    out += [PagePair(r0 + k, None, ref[k], "", "removed", 0.0) for k in range(i, n)]
+    out += [PagePair(None, a0 + k, "", act[k], "added", 0.0) for k in range(j, m)]
+    return out
+
+
+def align_pages(ref_pages: Sequence[str], act_pages: Sequence[str], fuzzy_threshold: float = 0.5) -> List[PagePair]:
+    """
+    Pair reference and actual pages in document order.
+
+    Identical pages (after whitespace normalization) are matched by hash with difflib's
+    sequence alignment, which also absorbs inserted/removed pages that shift the rest. The
+    remaining blocks are aligned fuzzily by word overlap; pairs below `fuzzy_threshold` are
+    reported as removed + added rather than as one edited page.
+    """
+    ref_h = [page_hash(p) for p in ref_pages]
+    act_h = [page_hash(p) for p in act_pages]
+    matcher = difflib.SequenceMatcher(None, ref_h, act_h, autojunk=False)
+    pairs: List[PagePair] = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            pairs += [PagePair(i1 + k, j1 + k, ref_pages[i1 + k], act_pages[j1 + k], "same", 1.0)
+                      for k in range(i2 - i1)]
+        else:
+            pairs += _align_block(ref_pages[i1:i2], act_pages[j1:j2], i1, j1, fuzzy_threshold)
+    return pairs
+
+
+def diff_summary(ref_text: str, act_text: str) -> str:
+    """Deterministic fallback description of a changed page pair."""
+    ref_lines = [normalize_page(l) for l in ref_text.splitlines() if l.strip()]
+    act_lines = [normalize_page(l) for l in act_text.splitlines() if l.strip()]
+    added = removed = 0
+    for line in difflib.ndiff(ref_lines, act_lines):
+        if line.startswith("+ "):
+            added += 1
+        elif line.startswith("- "):
+            removed += 1
+    return f"Text changed: {added} line(s) added, {removed} line(s) removed."
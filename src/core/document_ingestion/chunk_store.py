@@ -0,0 +1,86 @@
+from __future__ import annotations
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Union
+
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+from src.common.logger.custom_logger import CustomLogger
+
+log = CustomLogger().get_logger(__name__)
+
+
+class SQLiteDocstore(Docstore, AddableMixin):
+    """
+    Chunk text + metadata for one FAISS collection, stored in SQLite instead of a pickled
+    InMemoryDocstore.
+
+    Opening the store is O(1): nothing is read until a search hit asks for its chunk, so only the
+    top-k rows of a query are ever materialized as Documents. Rows are keyed by the same ids the
+    FAISS index maps positions to; inserts are idempotent (INSERT OR IGNORE) so replaying a
+    segment after a crash is safe.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " id TEXT PRIMARY KEY, text TEXT NOT NULL, metadata TEXT NOT NULL) WITHOUT ROWID"
+        )
+
+    # ---------- Docstore API ----------
+
+    def search(self, search: str) -> Union[str, Document]:
+        with self._lock:
+            row = self._conn.execute("SELECT text, metadata FROM chunks WHERE id=?", (search,)).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        if not texts:
+            return
+        rows = [(_id, doc.page_content, json.dumps(doc.metadata or {}, ensure_ascii=False, default=str))
+                for _id, doc in texts.items()]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT OR IGNORE INTO chunks VALUES (?, ?, ?)", rows)
+            self._conn.execute("COMMIT")
+
+    def delete(self, ids: List) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("DELETE FROM chunks WHERE id=?", [(i,) for i in ids])
+            self._conn.execute("COMMIT")
+
+    # ---------- Bulk helpers ----------
+
+    def mget(self, ids: Iterable[str]) -> Dict[str, Document]:
+        ids = list(ids)
+        found: Dict[str, Document] = {}
+        with self._lock:
+            # stay under SQLite's bound-parameter limit
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                marks = ",".join("?" * len(batch))
+                for _id, text, md in self._conn.execute(
+                    f"SELECT id, text, metadata FROM chunks WHERE id IN ({marks})", batch
+                ):
+                    found[_id] = Document(id=_id, page_content=text, metadata=json.loads(md))
+        return found
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -5,29 +5,42 @@ import json
 import hashlib
 import shutil
 from pathlib import Path
-from typing import Iterable, List, Optional, Dict, Any
+from typing import Any, Callable, Dict, Iterable, List, Optional
 
-import fitz  # PyMuPDF
 from langchain.schema import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
+import numpy as np
 
-from src.common.utils.model_loader import ModelLoader
+from src.common.utils.model_loader import ModelLoader, get_model_loader
 from src.common.logger.custom_logger import CustomLogger
 from src.common.exception.custom_exception import DocumentPortalException
 
-from src.common.utils.file_io import generate_session_id, save_uploaded_files
-from src.common.utils.document_ops import load_documents
+from src.common.utils.file_io import (
+    SavedFile, UploadTooLargeError, atomic_write_text, generate_session_id, iter_upload_chunks,
+    save_upload_async, save_uploaded_files, save_uploads_async, write_chunks,
+)
+from src.common.utils.document_ops import extract_file, iter_documents
+from src.common.utils.parse_workers import pdf_metadata
+from src.common.utils.metrics import count_items, timed
+from src.common.utils.embedding_cache import CachedEmbeddings, get_embedding_cache
+from src.core.document_chat.vectorstore_cache import get_vectorstore_cache
+from src.core.document_chat.answer_cache import get_answer_cache
+from src.core.document_ingestion.embedding_pipeline import EmbeddingPipeline, EmbeddingStats
+from src.core.document_ingestion.faiss_index import build_index, resolve_index_config
+from src.core.document_ingestion.faiss_store import SegmentedFaissStore
 
 SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".txt"}
 
 # FAISS Manager (load-or-create)
 class FaissManager:
     def __init__(self, index_dir: Path, model_loader: Optional[ModelLoader] = None):
+        self.log = CustomLogger().get_logger(__name__)
         self.index_dir = Path(index_dir)
         self.index_dir.mkdir(parents=True, exist_ok=True)
         
         self.meta_path = self.index_dir / "ingested_meta.json"
+        self.meta_log_path = self.index_dir / "ingested_meta.log"  # append-only, folded into the json on compaction
         self._meta: Dict[str, Any] = {"rows": {}} ## this is dict of rows
         
         if self.meta_path.exists():
@@ -35,26 +48,101 @@ class FaissManager:
                 self._meta = json.loads(self.meta_path.read_text(encoding="utf-8")) or {"rows": {}} # load it if alrady there
             except Exception:
                 self._meta = {"rows": {}} # init the empty one if dones not exists
-        
+        self._replay_meta_log()
 
-        self.model_loader = model_loader or ModelLoader()
-        self.emb = self.model_loader.load_embeddings()
+        self.model_loader = model_loader or get_model_loader()
+        self.emb = self._load_embeddings()
+        # batched / concurrent / rate-limited embedding stage; finished batches stream into the store
+        pipeline_cfg = getattr(self.model_loader, "embedding_pipeline_config", None)
+        self.pipeline = EmbeddingPipeline.from_config(
+            self.emb, pipeline_cfg() if callable(pipeline_cfg) else self.model_loader.config.get("embedding_pipeline"))
+        self.embedding_stats: Optional[EmbeddingStats] = None
         self.vs: Optional[FAISS] = None
+        self.created = 0  # rows written by load_or_create() when it builds a new index
+        # optional progress(stage, **counters) hook, e.g. a background ingestion job
+        self.progress: Optional[Callable[..., None]] = None
+        self.chunks_embedded = 0
+        self.vectors_written = 0
+        # index type/params: faiss_db.index, overridable per collection (= index dir name)
+        faiss_cfg = self.model_loader.config.get("faiss_db") or {}
+        self.index_cfg = resolve_index_config(faiss_cfg, self.index_dir.name)
+        persist_cfg = faiss_cfg.get("persistence") or {}
+        hybrid_cfg = (self.model_loader.config.get("retriever") or {}).get("hybrid") or {}
+        self.store = SegmentedFaissStore(
+            self.index_dir,
+            self.emb,
+            index_cfg=self.index_cfg,
+            compact_ratio=float(persist_cfg.get("compact_ratio", 0.25)),
+            max_segments=int(persist_cfg.get("max_segments", 512)),
+            bm25_enabled=bool(hybrid_cfg.get("enabled", True)),  # lexical side of hybrid retrieval
+        )
+        if (self._meta["rows"] or self._meta.get("files")) and not self._exists():
+            # meta left behind by an index that is gone (deleted, or a crash before the first
+            # snapshot): it would make every chunk look ingested and leave nothing to build from
+            self.log.warning("Ignoring ingestion meta without an index", index_dir=str(self.index_dir),
+                             rows=len(self._meta["rows"]))
+            self._meta = {"rows": {}}
+
+    def _on_embedded(self, done: int) -> None:
+        self.chunks_embedded = done
+        self._report("embed")
+
+    def _report(self, stage: str) -> None:
+        if self.progress is not None:
+            self.progress(stage, chunks_embedded=self.chunks_embedded, vectors_written=self.vectors_written)
+
+    def _load_embeddings(self):
+        emb = self.model_loader.load_embeddings()
+        cache_cfg = self.model_loader.config.get("embedding_cache") or {}
+        if not cache_cfg.get("enabled", True):
+            return emb
+        emb_cfg = self.model_loader.embedding_config()
+        # content-addressed cache shared across sessions: identical chunks are embedded once
+        cache = get_embedding_cache(cache_cfg.get("path", "faiss_index/embedding_cache.sqlite"))
+        return CachedEmbeddings(emb, cache, emb_cfg.get("model_name", "default"), emb_cfg.get("dimensions"),
+                                query_cache_size=int(cache_cfg.get("query_cache_size", 256)),
+                                persist_queries=bool(cache_cfg.get("persist_queries", False)))
         
     def _exists(self)-> bool:
-        return (self.index_dir / "index.faiss").exists() and (self.index_dir / "index.pkl").exists()
+        return self.store.exists()
     
     @staticmethod
     def _fingerprint(text: str, md: Dict[str, Any]) -> str:
-        src = md.get("source") or md.get("file_path")
-        rid = md.get("row_id")
-        if src is not None:
-            return f"{src}::{'' if rid is None else rid}"
-        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+        # content hash of whitespace/case-normalized text: independent of the (random) upload filename
+        normalized = " ".join(text.split()).lower()
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+    
+    def _replay_meta_log(self):
+        if not self.meta_log_path.exists():
+            return
+        with open(self.meta_log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line after a crash
+                for key in entry.get("rows", []):
+                    self._meta["rows"][key] = True
+                self._meta.setdefault("files", {}).update(entry.get("files", {}))
+    
+    def _append_meta(self, rows: Optional[List[str]] = None, files: Optional[Dict[str, Any]] = None):
+        # O(new rows): one JSON line per append instead of rewriting every fingerprint
+        with open(self.meta_log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"rows": rows or [], "files": files or {}}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
     
     def _save_meta(self):
-        self.meta_path.write_text(json.dumps(self._meta, ensure_ascii=False, indent=2), encoding="utf-8")
+        atomic_write_text(self.meta_path, json.dumps(self._meta, ensure_ascii=False))
+        self.meta_log_path.unlink(missing_ok=True)
         
+    def has_file(self, sha256: str) -> bool:
+        return sha256 in self._meta.get("files", {})
+    
+    def record_files(self, files: Iterable[SavedFile]):
+        entries = {sf.sha256: {"name": sf.name, "size": sf.size} for sf in files}
+        self._meta.setdefault("files", {}).update(entries)
+        self._append_meta(files=entries)
         
     def add_documents(self,docs: List[Document]):
         
@@ -62,36 +150,84 @@ class FaissManager:
             raise RuntimeError("Call load_or_create() before add_documents_idempotent().")
         
         new_docs: List[Document] = []
+        new_ids: List[str] = []
+        seen = set()
         
         for d in docs:
             
             key = self._fingerprint(d.page_content, d.metadata or {})
-            if key in self._meta["rows"]:
+            if key in self._meta["rows"] or key in seen:
                 continue
-            self._meta["rows"][key] = True
+            seen.add(key)
             new_docs.append(d)
+            new_ids.append(key)
             
-        if new_docs:
-            self.vs.add_documents(new_docs)
-            self.vs.save_local(str(self.index_dir))
-            self._save_meta()
+        if not new_docs:
+            return 0
+        
+        texts = [d.page_content for d in new_docs]
+        
+        def _index_batch(indices: List[int], vectors: np.ndarray):
+            # one segment file + one meta line per batch: rows are durable as soon as their batch lands
+            ids = [new_ids[i] for i in indices]
+            self.chunks_embedded += len(ids)
+            self._report("embed")
+            with timed("index_write"):
+                self.store.append(ids, [texts[i] for i in indices], [new_docs[i].metadata for i in indices], vectors)
+                self._append_meta(rows=ids)
+            count_items("index_write", "vectors", len(ids))
+            for key in ids:
+                self._meta["rows"][key] = True
+            self.vectors_written += len(ids)
+            self._report("write")
+        
+        try:
+            self.embedding_stats = self.pipeline.run(texts, _index_batch)
+        finally:
+            # also after a partial failure: the batches that landed are part of the index now
+            if self.store.needs_compaction():
+                with timed("index_compact"):
+                    self.store.compact()
+                    self._save_meta()
+            # answers computed against the previous index version are stale now
+            get_answer_cache().invalidate(os.path.abspath(self.index_dir))
         return len(new_docs)
     
     def load_or_create(self,texts:Optional[List[str]]=None, metadatas: Optional[List[dict]] = None):
         ## if we running first time then it will not go in this block
         if self._exists():
-            self.vs = FAISS.load_local(
-                str(self.index_dir),
-                embeddings=self.emb,
-                allow_dangerous_deserialization=True,
-            )
+            self.vs = self.store.load()
+            # rows replayed from segments whose meta line never made it to disk
+            for key in self.store.replayed_ids:
+                self._meta["rows"][key] = True
             return self.vs
         
         
         if not texts:
             raise DocumentPortalException("No existing FAISS index and no data to create one", sys)
-        self.vs = FAISS.from_texts(texts=texts, embedding=self.emb, metadatas=metadatas or [])
-        self.vs.save_local(str(self.index_dir))
+        metadatas = metadatas or [{} for _ in texts]
+        # drop repeated chunks and record what went into the new index so add_documents() skips it
+        uniq_texts, uniq_metas, uniq_ids = [], [], []
+        for t, md in zip(texts, metadatas):
+            key = self._fingerprint(t, md or {})
+            if key in self._meta["rows"]:
+                continue
+            self._meta["rows"][key] = True
+            uniq_texts.append(t)
+            uniq_metas.append(md)
+            uniq_ids.append(key)
+        if not uniq_texts:
+            raise DocumentPortalException("No existing FAISS index and nothing new to index", sys)
+        vectors, self.embedding_stats = self.pipeline.embed(uniq_texts, progress=self._on_embedded)
+        # ANN index (flat / IVF / HNSW / IVF-PQ) trained on a sample of this first batch
+        with timed("index_write"):
+            index = build_index(vectors, self.index_cfg)
+            self.vs = self.store.create(index, uniq_ids, uniq_texts, uniq_metas, vectors)
+            self._save_meta()
+        count_items("index_write", "vectors", len(uniq_ids))
+        self.created = len(uniq_texts)
+        self.vectors_written += self.created
+        self._report("write")
         return self.vs
         
         
@@ -104,7 +240,7 @@ class ChatIngestor:
     ):
         try:
             self.log = CustomLogger().get_logger(__name__)
-            self.model_loader = ModelLoader()
+            self.model_loader = get_model_loader()
             
             self.use_session = use_session_dirs
             self.session_id = session_id or generate_session_id()
@@ -116,6 +252,7 @@ class ChatIngestor:
             
             self.temp_dir = self._resolve_dir(self.temp_base)
             self.faiss_dir = self._resolve_dir(self.faiss_base)
+            self.last_stats: Dict[str, int] = {}
             
             self.log.info("ChatIngestor initialized",
                           session_id=self.session_id,
@@ -134,9 +271,17 @@ class ChatIngestor:
             return d
         return base # fallback: "faiss_index/"
         
+    async def asave_uploads(self, uploads: Iterable, max_file_bytes: Optional[int] = None,
+                            max_total_bytes: Optional[int] = None) -> List[SavedFile]:
+        """Stream FastAPI uploads into the session temp dir; pass the result to built_retriver()."""
+        return await save_uploads_async(uploads, self.temp_dir, max_file_bytes=max_file_bytes,
+                                        max_total_bytes=max_total_bytes)
+    
     def _split(self, docs: List[Document], chunk_size=1000, chunk_overlap=200) -> List[Document]:
         splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-        chunks = splitter.split_documents(docs)
+        with timed("split"):
+            chunks = splitter.split_documents(docs)
+        count_items("split", "chunks", len(chunks))
         self.log.info("Documents split", chunks=len(chunks), chunk_size=chunk_size, overlap=chunk_overlap)
         return chunks
     
@@ -145,28 +290,69 @@ class ChatIngestor:
         *,
         chunk_size: int = 1000,
         chunk_overlap: int = 200,
-        k: int = 5,):
+        k: int = 5,
+        progress: Optional[Callable[..., None]] = None,):
+        """
+        Parse, split, embed and index the uploads. `progress(stage, **counters)` is called as work
+        advances (stages: parse, split, embed, write) with running totals.
+        """
+        report = progress or (lambda stage, **counters: None)
         try:
-            paths = save_uploaded_files(uploaded_files, self.temp_dir)
-            docs = load_documents(paths)
+            ## FAISS manager very very important class for the docchat
+            fm = FaissManager(self.faiss_dir, self.model_loader)
+            fm.progress = progress
+            
+            saved = save_uploaded_files(uploaded_files, self.temp_dir)
+            fresh: List[SavedFile] = []
+            seen = set()
+            for sf in saved:
+                # same bytes already indexed in this session (or twice in this upload): skip parsing entirely
+                if fm.has_file(sf.sha256) or sf.sha256 in seen:
+                    sf.path.unlink(missing_ok=True)
+                    continue
+                seen.add(sf.sha256)
+                fresh.append(sf)
+            
+            stats = {"files_added": len(fresh), "files_skipped": len(saved) - len(fresh),
+                     "chunks_added": 0, "chunks_skipped": 0}
+            self.last_stats = stats
+            report("parse", files_added=len(fresh), files_skipped=len(saved) - len(fresh), pages_parsed=0)
+            
+            if not fresh:
+                if not saved or not fm._exists():
+                    raise ValueError("No valid documents loaded")
+                vs = fm.load_or_create()
+                self.log.info("All uploaded files already ingested", index=str(self.faiss_dir), **stats)
+                return vs.as_retriever(search_type="similarity", search_kwargs={"k": k})
+            
+            docs: List[Document] = []
+            # hashes from the upload stream: the files are only read again to be parsed
+            shas = {str(sf.path): sf.sha256 for sf in fresh}
+            with timed("parse"):
+                for doc in iter_documents([sf.path for sf in fresh], shas=shas):
+                    docs.append(doc)
+                    report("parse", pages_parsed=len(docs))
+            count_items("parse", "pages", len(docs))
             if not docs:
                 raise ValueError("No valid documents loaded")
             
             chunks = self._split(docs, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-            
-            ## FAISS manager very very important class for the docchat
-            fm = FaissManager(self.faiss_dir, self.model_loader)
+            report("split", chunks=len(chunks))
             
             texts = [c.page_content for c in chunks]
             metas = [c.metadata for c in chunks]
             
-            try:
-                vs = fm.load_or_create(texts=texts, metadatas=metas)
-            except Exception:
-                vs = fm.load_or_create(texts=texts, metadatas=metas)
+            vs = fm.load_or_create(texts=texts, metadatas=metas)
                 
-            added = fm.add_documents(chunks)
-            self.log.info("FAISS index updated", added=added, index=str(self.faiss_dir))
+            added = fm.created + fm.add_documents(chunks)
+            fm.record_files(fresh)
+            stats["chunks_added"] = added
+            stats["chunks_skipped"] = len(chunks) - added
+            if fm.embedding_stats is not None:
+                stats["embedding"] = fm.embedding_stats.as_dict()
+            # drop any cached copy eagerly; the mtime check would also catch it on next query
+            get_vectorstore_cache().invalidate(str(self.faiss_dir))
+            self.log.info("FAISS index updated", index=str(self.faiss_dir), **stats)
             
             return vs.as_retriever(search_type="similarity", search_kwargs={"k": k})
             
@@ -195,31 +381,49 @@ class DocHandler:
             if not filename.lower().endswith(".pdf"):
                 raise ValueError("Invalid file type. Only PDFs are allowed.")
             save_path = os.path.join(self.session_path, filename)
-            with open(save_path, "wb") as f:
-                if hasattr(uploaded_file, "read"):
-                    f.write(uploaded_file.read())
-                else:
-                    f.write(uploaded_file.getbuffer())
+            write_chunks(iter_upload_chunks(uploaded_file), Path(save_path))
             self.log.info("PDF saved successfully", file=filename, save_path=save_path, session_id=self.session_id)
             return save_path
         except Exception as e:
             self.log.error("Failed to save PDF", error=str(e), session_id=self.session_id)
             raise DocumentPortalException(f"Failed to save PDF: {str(e)}", e) from e
 
+    async def asave_pdf(self, upload, max_bytes: Optional[int] = None) -> str:
+        """Async, chunked variant of save_pdf for FastAPI UploadFile (enforces `max_bytes`)."""
+        try:
+            filename = os.path.basename(upload.filename or "")
+            if not filename.lower().endswith(".pdf"):
+                raise ValueError("Invalid file type. Only PDFs are allowed.")
+            sf = await save_upload_async(upload, Path(self.session_path) / filename, max_bytes=max_bytes)
+            self.log.info("PDF saved successfully", file=filename, save_path=str(sf.path), size=sf.size,
+                          session_id=self.session_id)
+            return str(sf.path)
+        except UploadTooLargeError:
+            raise
+        except Exception as e:
+            self.log.error("Failed to save PDF", error=str(e), session_id=self.session_id)
+            raise DocumentPortalException(f"Failed to save PDF: {str(e)}", e) from e
+
     def read_pdf(self, pdf_path: str) -> str:
         try:
-            text_chunks = []
-            with fitz.open(pdf_path) as doc:
-                for page_num in range(doc.page_count):
-                    page = doc.load_page(page_num)
-                    text_chunks.append(f"\n--- Page {page_num + 1} ---\n{page.get_text()}")  # type: ignore
+            # shared page cache: a PDF already indexed or compared is not parsed again
+            extraction = extract_file(pdf_path)
+            text_chunks = [f"\n--- Page {p.index + 1} ---\n{p.text}" for p in extraction.pages]
             text = "\n".join(text_chunks)
             self.log.info("PDF read successfully", pdf_path=pdf_path, session_id=self.session_id, pages=len(text_chunks))
             return text
         except Exception as e:
             self.log.error("Failed to read PDF", error=str(e), pdf_path=pdf_path, session_id=self.session_id)
             raise DocumentPortalException(f"Could not process PDF: {pdf_path}", e) from e
-        
+
+    def read_metadata(self, pdf_path: str) -> Dict[str, Any]:
+        """Page count, title, author and dates straight from the PDF (no LLM needed)."""
+        try:
+            return pdf_metadata(str(pdf_path))
+        except Exception as e:
+            self.log.error("Failed to read PDF metadata", error=str(e), pdf_path=pdf_path, session_id=self.session_id)
+            raise DocumentPortalException(f"Could not read PDF metadata: {pdf_path}", e) from e
+
 class DocumentComparator:
     """
     Save, read & combine PDFs for comparison with session-based versioning.
@@ -239,34 +443,56 @@ class DocumentComparator:
             for fobj, out in ((reference_file, ref_path), (actual_file, act_path)):
                 if not fobj.name.lower().endswith(".pdf"):
                     raise ValueError("Only PDF files are allowed.")
-                with open(out, "wb") as f:
-                    if hasattr(fobj, "read"):
-                        f.write(fobj.read())
-                    else:
-                        f.write(fobj.getbuffer())
+                write_chunks(iter_upload_chunks(fobj), out)
             self.log.info("Files saved", reference=str(ref_path), actual=str(act_path), session=self.session_id)
             return ref_path, act_path
         except Exception as e:
             self.log.error("Error saving PDF files", error=str(e), session=self.session_id)
             raise DocumentPortalException("Error saving files", e) from e
 
+    async def asave_uploaded_files(self, reference_file, actual_file, max_file_bytes: Optional[int] = None,
+                                   max_total_bytes: Optional[int] = None):
+        """Async, chunked variant of save_uploaded_files for FastAPI UploadFiles."""
+        try:
+            for up in (reference_file, actual_file):
+                if not (up.filename or "").lower().endswith(".pdf"):
+                    raise ValueError("Only PDF files are allowed.")
+            ref, act = await save_uploads_async(
+                [reference_file, actual_file], self.session_path, max_file_bytes=max_file_bytes,
+                max_total_bytes=max_total_bytes, keep_names=True, extensions={".pdf"},
+            )
+            self.log.info("Files saved", reference=str(ref.path), actual=str(act.path), session=self.session_id)
+            return ref.path, act.path
+        except UploadTooLargeError:
+            raise
+        except Exception as e:
+            self.log.error("Error saving PDF files", error=str(e), session=self.session_id)
+            raise DocumentPortalException("Error saving files", e) from e
+
     def read_pdf(self, pdf_path: Path) -> str:
         try:
-            with fitz.open(pdf_path) as doc:
-                if doc.is_encrypted:
-                    raise ValueError(f"PDF is encrypted: {pdf_path.name}")
-                parts = []
-                for page_num in range(doc.page_count):
-                    page = doc.load_page(page_num)
-                    text = page.get_text()  # type: ignore
-                    if text.strip():
-                        parts.append(f"\n --- Page {page_num + 1} --- \n{text}")
+            extraction = extract_file(pdf_path)
+            if extraction.encrypted:
+                raise ValueError(f"PDF is encrypted: {pdf_path.name}")
+            parts = [f"\n --- Page {p.index + 1} --- \n{p.text}" for p in extraction.pages if p.text.strip()]
             self.log.info("PDF read successfully", file=str(pdf_path), pages=len(parts))
             return "\n".join(parts)
         except Exception as e:
             self.log.error("Error reading PDF", file=str(pdf_path), error=str(e))
             raise DocumentPortalException("Error reading PDF", e) from e
 
+    def read_pages(self, pdf_path: Path) -> List[str]:
+        """Text of every page in order (empty pages kept, so page numbers line up for alignment)."""
+        try:
+            extraction = extract_file(pdf_path)
+            if extraction.encrypted:
+                raise ValueError(f"PDF is encrypted: {pdf_path.name}")
+            self.log.info("PDF pages read", file=str(pdf_path), pages=len(extraction.pages))
+            return [p.text for p in extraction.pages]
+        except Exception as e:
+            self.log.error("Error reading PDF", file=str(pdf_path), error=str(e))
+            raise DocumentPortalException("Error reading PDF", e) from e
+
     def combine_documents(self) -> str:
         try:
             doc_parts = []
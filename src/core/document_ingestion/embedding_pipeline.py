@@ -0,0 +1,263 @@
+from __future__ import annotations
+import random
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.common.logger.custom_logger import CustomLogger
+from src.common.exception.custom_exception import DocumentPortalException
+from src.common.utils.metrics import count_items, timed
+
+log = CustomLogger().get_logger(__name__)
+
+DEFAULT_PIPELINE_CONFIG: Dict[str, Any] = {
+    "batch_tokens": 8000,             # max estimated tokens per embeddings request
+    "batch_size": 256,                # max inputs per request
+    "concurrency": 4,                 # requests in flight
+    "requests_per_minute": 3000,      # provider RPM budget (0 = unlimited)
+    "tokens_per_minute": 1000000,     # provider TPM budget (0 = unlimited)
+    "max_retries": 6,
+    "backoff_base": 1.0,              # seconds; doubled per attempt, with jitter
+    "backoff_max": 60.0,
+}
+
+_RETRYABLE_NAMES = ("RateLimit", "Timeout", "Connection", "ServiceUnavailable", "InternalServer")
+
+
+# ---------- Token counting ----------
+
+_encoder: Any = None
+_encoder_lock = threading.Lock()
+
+
+def count_tokens(text: str) -> int:
+    """tiktoken count when the encoding is available locally, else the ~4 chars/token estimate."""
+    global _encoder
+    if _encoder is None:
+        with _encoder_lock:
+            if _encoder is None:
+                try:
+                    import tiktoken
+                    _encoder = tiktoken.get_encoding("cl100k_base")
+                except Exception:
+                    _encoder = False  # offline / not installed: don't retry per call
+    if _encoder:
+        return len(_encoder.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+
+
+# ---------- Rate limiting ----------
+
+class TokenBucket:
+    """Per-minute budget refilled continuously; acquire() blocks until `amount` is available."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.available = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1.0) -> float:
+        if self.capacity <= 0:
+            return 0.0
+        # a single request larger than the whole budget waits for a full bucket instead of forever
+        amount = min(float(amount), self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.available >= amount:
+                    self.available -= amount
+                    return waited
+                delay = (amount - self.available) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+# ---------- Pipeline ----------
+
+@dataclass
+class EmbeddingStats:
+    chunks: int = 0
+    cached: int = 0
+    tokens: int = 0
+    batches: int = 0
+    retries: int = 0
+    throttled_seconds: float = 0.0
+    seconds: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = self.seconds or 1e-9
+        return {
+            "chunks": self.chunks,
+            "cached": self.cached,
+            "tokens": self.tokens,
+            "batches": self.batches,
+            "retries": self.retries,
+            "throttled_seconds": round(self.throttled_seconds, 3),
+            "seconds": round(self.seconds, 3),
+            "chunks_per_s": round(self.chunks / elapsed, 2),
+            "tokens_per_s": round(self.tokens / elapsed, 2),
+        }
+
+
+class EmbeddingPipeline:
+    """
+    Embeds a chunk list as token-bounded batches, several in flight at once, under an RPM/TPM
+    budget, retrying rate-limit / transient errors with jittered exponential backoff.
+
+    Finished batches are handed to `on_batch(indices, vectors)` on the caller's thread as they
+    complete, so they can be appended to the index while later batches are still in flight.
+    Texts already in the embedding cache are delivered first without touching the provider.
+    """
+
+    def __init__(self, embeddings: Any, batch_tokens: int = 8000, batch_size: int = 256, concurrency: int = 4,
+                 requests_per_minute: float = 3000, tokens_per_minute: float = 1000000, max_retries: int = 6,
+                 backoff_base: float = 1.0, backoff_max: float = 60.0):
+        self.embeddings = embeddings
+        self.batch_tokens = int(batch_tokens)
+        self.batch_size = int(batch_size)
+        self.concurrency = max(1, int(concurrency))
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = int(max_retries)
+        self.backoff_base = float(backoff_base)
+        self.backoff_max = float(backoff_max)
+
+    @classmethod
+    def from_config(cls, embeddings: Any, cfg: Optional[Dict[str, Any]] = None) -> "EmbeddingPipeline":
+        merged = {**DEFAULT_PIPELINE_CONFIG, **(cfg or {})}
+        return cls(embeddings, **merged)
+
+    def batches(self, indices: Sequence[int], token_counts: Dict[int, int]) -> List[List[int]]:
+        """Greedy packing in input order, bounded by batch_tokens and batch_size."""
+        out: List[List[int]] = []
+        cur: List[int] = []
+        cur_tokens = 0
+        for i in indices:
+            n = token_counts[i]
+            if cur and (cur_tokens + n > self.batch_tokens or len(cur) >= self.batch_size):
+                out.append(cur)
+                cur, cur_tokens = [], 0
+            cur.append(i)
+            cur_tokens += n
+        if cur:
+            out.append(cur)
+        return out
+
+    def run(self, texts: Sequence[str], on_batch: Callable[[List[int], np.ndarray], None]) -> EmbeddingStats:
+        stats = EmbeddingStats(chunks=len(texts))
+        start = time.perf_counter()
+        stats_lock = threading.Lock()
+
+        cached: Dict[int, List[float]] = {}
+        lookup = getattr(self.embeddings, "lookup", None)
+        if callable(lookup) and texts:
+            cached = lookup(list(texts))
+        if cached:
+            idx = sorted(cached)
+            on_batch(idx, np.asarray([cached[i] for i in idx], dtype=np.float32))
+            stats.cached = len(idx)
+
+        pending = [i for i in range(len(texts)) if i not in cached]
+        token_counts = {i: count_tokens(texts[i]) for i in pending}
+        plan = self.batches(pending, token_counts)
+
+        def _embed(batch: List[int]) -> np.ndarray:
+            n_tokens = sum(token_counts[i] for i in batch)
+            attempt = 0
+            while True:
+                throttled = self.requests.acquire(1) + self.tokens.acquire(n_tokens)
+                try:
+                    with timed("embed"):
+                        vectors = self.embeddings.embed_documents([texts[i] for i in batch])
+                    count_items("embed", "chunks", len(batch))
+                    count_items("embed", "tokens", n_tokens)
+                    with stats_lock:
+                        stats.tokens += n_tokens
+                        stats.batches += 1
+                        stats.throttled_seconds += throttled
+                    return np.asarray(vectors, dtype=np.float32)
+                except Exception as e:
+                    if attempt >= self.max_retries or not self._retryable(e):
+                        raise
+                    delay = self._retry_after(e)
+                    if delay is None:
+                        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt)) * random.uniform(0.5, 1.0)
+                    attempt += 1
+                    with stats_lock:
+                        stats.retries += 1
+                    log.warning("Embedding batch failed, retrying", attempt=attempt, delay=round(delay, 2),
+                                size=len(batch), error=str(e))
+                    time.sleep(delay)
+
+        if plan:
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(plan)),
+                                    thread_name_prefix="embed") as pool:
+                futures = {pool.submit(_embed, batch): batch for batch in plan}
+                not_done = set(futures)
+                try:
+                    while not_done:
+                        done, not_done = wait(not_done, return_when=FIRST_EXCEPTION)
+                        for fut in done:
+                            on_batch(futures[fut], fut.result())
+                except Exception as e:
+                    for fut in not_done:
+                        fut.cancel()
+                    log.error("Embedding pipeline failed", error=str(e), batches_done=stats.batches,
+                              batches=len(plan))
+                    raise DocumentPortalException("Embedding pipeline failed", e) from e
+
+        stats.seconds = time.perf_counter() - start
+        log.info("Embedding pipeline finished", **stats.as_dict())
+        return stats
+
+    def embed(self, texts: Sequence[str],
+              progress: Optional[Callable[[int], None]] = None) -> Tuple[np.ndarray, EmbeddingStats]:
+        """Embed everything and return the vectors in input order (for a first index build)."""
+        out: Optional[np.ndarray] = None
+        done = 0
+
+        def _collect(indices: List[int], vectors: np.ndarray) -> None:
+            nonlocal out, done
+            if out is None:
+                out = np.zeros((len(texts), vectors.shape[1]), dtype=np.float32)
+            out[indices] = vectors
+            done += len(indices)
+            if progress is not None:
+                progress(done)
+
+        stats = self.run(texts, _collect)
+        if out is None:
+            raise DocumentPortalException("No texts to embed", sys)
+        return out, stats
+
+    # ---------- Retry policy ----------
+
+    @staticmethod
+    def _status(e: Exception) -> Optional[int]:
+        status = getattr(e, "status_code", None) or getattr(getattr(e, "response", None), "status_code", None)
+        return int(status) if isinstance(status, int) else None
+
+    def _retryable(self, e: Exception) -> bool:
+        status = self._status(e)
+        if status is not None:
+            return status in (408, 409, 429) or status >= 500
+        return any(name in type(e).__name__ for name in _RETRYABLE_NAMES)
+
+    @staticmethod
+    def _retry_after(e: Exception) -> Optional[float]:
+        headers = getattr(getattr(e, "response", None), "headers", None) or {}
+        try:
+            value = headers.get("retry-after")
+            return float(value) if value is not None else None
+        except (TypeError, ValueError):
+            return None
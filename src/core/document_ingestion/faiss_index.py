@@ -0,0 +1,144 @@
+from __future__ import annotations
+from typing import Any, Dict, Optional
+
+import faiss
+import numpy as np
+
+from src.common.logger.custom_logger import CustomLogger
+
+log = CustomLogger().get_logger(__name__)
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+STORAGE_TYPES = ("float32", "float16", "int8", "binary")
+
+# per-vector code for flat / IVF / HNSW storage: 4, 2, 1 bytes per dimension
+_SQ_CODES = {"float32": "Flat", "float16": "SQfp16", "int8": "SQ8"}
+
+DEFAULT_INDEX_CONFIG: Dict[str, Any] = {
+    "type": "flat",
+    "nlist": 1024,          # IVF: number of coarse clusters
+    "nprobe": 16,           # IVF: clusters visited per query
+    "M": 32,                # HNSW: graph degree
+    "ef_construction": 200,  # HNSW: build-time beam width
+    "ef_search": 64,        # HNSW: query-time beam width
+    "pq_m": 16,             # PQ: sub-quantizers (must divide the dimension)
+    "pq_nbits": 8,          # PQ: bits per sub-quantizer code
+    "train_sample": 50000,  # max vectors used to train IVF/PQ/SQ
+    "storage": "float32",   # vector codes: float32 | float16 | int8 | binary (ignored by ivf_pq)
+    "rescore_factor": 16,   # binary: candidates re-scored with float16 vectors = k * rescore_factor
+}
+
+
+def resolve_index_config(faiss_cfg: Optional[Dict[str, Any]], collection: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Merge DEFAULT_INDEX_CONFIG <- faiss_db.index <- faiss_db.collections.<collection>.index.
+    """
+    faiss_cfg = faiss_cfg or {}
+    cfg = {**DEFAULT_INDEX_CONFIG, **(faiss_cfg.get("index") or {})}
+    if collection:
+        per = ((faiss_cfg.get("collections") or {}).get(collection) or {}).get("index") or {}
+        cfg.update(per)
+    cfg["type"] = str(cfg["type"]).lower()
+    if cfg["type"] not in INDEX_TYPES:
+        raise ValueError(f"Unsupported FAISS index type: {cfg['type']} (expected one of {INDEX_TYPES})")
+    cfg["storage"] = str(cfg["storage"]).lower()
+    if cfg["storage"] not in STORAGE_TYPES:
+        raise ValueError(f"Unsupported FAISS storage: {cfg['storage']} (expected one of {STORAGE_TYPES})")
+    if cfg["storage"] == "binary" and cfg["type"] != "flat":
+        raise ValueError("storage 'binary' is only supported with index type 'flat'")
+    return cfg
+
+
+def _flat_factory(storage: str) -> str:
+    if storage == "binary":
+        # sign bits (after a learned rotation) for the scan, float16 copies to re-score the shortlist
+        return "LSHrt,Refine(SQfp16)"
+    return _SQ_CODES[storage]
+
+
+def _factory_string(dim: int, n: int, cfg: Dict[str, Any]) -> str:
+    """Pick the faiss factory string, downgrading when there is too little data to train."""
+    kind, storage = cfg["type"], cfg["storage"]
+    if kind == "hnsw":
+        return f"HNSW{int(cfg['M'])}" + ("" if storage == "float32" else f"_{_SQ_CODES[storage]}")
+    if kind in ("ivf_flat", "ivf_pq"):
+        # faiss wants ~39 training points per centroid; shrink nlist for small collections
+        nlist = min(int(cfg["nlist"]), max(1, n // 39))
+        if nlist < 4:
+            log.warning("Too few vectors to train IVF, using flat index", vectors=n, requested=kind)
+            return _flat_factory(storage)
+        if kind == "ivf_flat":
+            return f"IVF{nlist},{_SQ_CODES[storage]}"
+        m, nbits = int(cfg["pq_m"]), int(cfg["pq_nbits"])
+        if dim % m != 0:
+            raise ValueError(f"pq_m={m} must divide the embedding dimension {dim}")
+        if n < 39 * (1 << nbits):
+            log.warning("Too few vectors to train PQ codebooks, using IVF-Flat", vectors=n)
+            return f"IVF{nlist},{_SQ_CODES[storage]}"
+        return f"IVF{nlist},PQ{m}x{nbits}"
+    return _flat_factory(storage)
+
+
+def build_index(vectors: np.ndarray, cfg: Dict[str, Any]) -> faiss.Index:
+    """Create an (untrained-safe) L2 index for `vectors`, training it on a sample when required."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+    factory = _factory_string(dim, n, cfg)
+    index = faiss.index_factory(dim, factory, faiss.METRIC_L2)
+
+    base = faiss.downcast_index(index)
+    if hasattr(base, "hnsw"):
+        base.hnsw.efConstruction = int(cfg["ef_construction"])
+
+    if not index.is_trained:
+        sample_size = min(n, int(cfg["train_sample"]))
+        rng = np.random.default_rng(0)
+        sample = vectors[rng.choice(n, size=sample_size, replace=False)] if sample_size < n else vectors
+        index.train(sample)
+
+    enable_reconstruct(index)
+    apply_search_params(index, cfg)
+    log.info("FAISS index created", factory=factory, vectors=n, dim=dim)
+    return index
+
+
+def enable_reconstruct(index: faiss.Index) -> faiss.Index:
+    """
+    IVF indexes can only reconstruct() stored vectors (MMR search needs them) through a direct
+    map from id to inverted-list slot; build it if the index has none. Added rows keep it current.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+        ivf.make_direct_map()
+    return index
+
+
+def apply_search_params(index: faiss.Index, cfg: Dict[str, Any]) -> None:
+    """Set query-time knobs (nprobe / efSearch / k_factor); they are not reliably persisted with the index."""
+    base = faiss.downcast_index(index)
+    if hasattr(base, "k_factor"):
+        base.k_factor = float(cfg["rescore_factor"])
+        index = base.base_index
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(int(cfg["nprobe"]), ivf.nlist)
+    base = faiss.downcast_index(index)
+    if hasattr(base, "hnsw"):
+        base.hnsw.efSearch = int(cfg["ef_search"])
+
+
+def read_index_mmap(path: str) -> faiss.Index:
+    """
+    Open a saved index memory-mapped (read-only): load cost no longer scales with the index size
+    and every worker process maps the same page-cache pages. IVF files map their inverted lists,
+    flat-code indexes (Flat / HNSW storage) map their code arrays. Falls back to a normal read if
+    this faiss build cannot map the file.
+    """
+    with open(path, "rb") as f:
+        fourcc = f.read(4)
+    flag = faiss.IO_FLAG_MMAP if fourcc.startswith(b"Iw") else getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+    try:
+        return enable_reconstruct(faiss.read_index(path, flag))
+    except RuntimeError as e:
+        log.warning("mmap read not supported for this index, loading into memory", path=path, error=str(e))
+        return enable_reconstruct(faiss.read_index(path))
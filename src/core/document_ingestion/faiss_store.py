@@ -0,0 +1,490 @@
+from __future__ import annotations
+import io
+import json
+import os
+import re
+import shutil
+import threading
+import uuid
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.vectorstores import FAISS
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are serialized
+    fcntl = None
+
+from src.common.logger.custom_logger import CustomLogger
+from src.common.utils.file_io import atomic_write_bytes, atomic_write_text
+from src.core.document_chat.hybrid_retriever import BM25Index
+from src.core.document_ingestion.chunk_store import SQLiteDocstore
+from src.core.document_ingestion.faiss_index import apply_search_params, read_index_mmap
+
+log = CustomLogger().get_logger(__name__)
+
+_SEGMENT_RE = re.compile(r"^(\d{8})\.seg\.npz$")
+
+
+class _DirLock:
+    """
+    Exclusive lock on one index directory: a thread RLock plus flock() on <index_dir>/.lock, so
+    store instances in other processes (or other instances in this one) take turns. Re-entrant
+    within the holding thread; the flock is only taken by the outermost acquire.
+    """
+
+    FILE = ".lock"
+
+    def __init__(self, index_dir: Path):
+        self.path = index_dir / self.FILE
+        self._rlock = threading.RLock()
+        self._depth = 0
+        self._fd: Optional[int] = None
+
+    def __enter__(self) -> "_DirLock":
+        self._rlock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                except BaseException:
+                    os.close(fd)
+                    raise
+            except BaseException:
+                self._rlock.release()
+                raise
+            self._fd = fd
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fd, self._fd = self._fd, None
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        self._rlock.release()
+
+
+_dir_locks: Dict[str, _DirLock] = {}
+_dir_locks_guard = threading.Lock()
+
+
+def _dir_lock(index_dir: Path) -> _DirLock:
+    key = str(index_dir.resolve())
+    with _dir_locks_guard:
+        lock = _dir_locks.get(key)
+        if lock is None:
+            lock = _dir_locks[key] = _DirLock(Path(key))
+        return lock
+
+
+class IdMap(Mapping):
+    """
+    FAISS position -> docstore id, backed by the base snapshot's mmap'd ids.npy plus a list for
+    rows added since. Stands in for the `index_to_docstore_id` dict LangChain keeps, without
+    building a Python dict of every id at load time.
+    """
+
+    def __init__(self, base_ids: Optional[np.ndarray] = None):
+        self.base = base_ids if base_ids is not None else np.empty(0, dtype="<U1")
+        self.delta: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.base) + len(self.delta)
+
+    def __getitem__(self, pos) -> str:
+        pos, n = int(pos), len(self.base)
+        if 0 <= pos < n:
+            return str(self.base[pos])
+        if n <= pos < len(self):
+            return self.delta[pos - n]
+        raise KeyError(pos)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(len(self)))
+
+    def update(self, other: Dict[int, str]) -> None:
+        # LangChain only ever appends positions len(self), len(self)+1, ...
+        for pos, _id in sorted(dict(other).items()):
+            if pos != len(self):
+                raise ValueError(f"IdMap positions must be appended in order (got {pos}, expected {len(self)})")
+            self.delta.append(_id)
+
+    def all_ids(self) -> np.ndarray:
+        return np.concatenate([np.asarray(self.base, dtype=str), np.asarray(self.delta, dtype=str)])
+
+
+class SegmentedIndex:
+    """
+    Read-only (usually mmap'd) base index + small in-memory flat delta for rows appended since
+    the last compaction. Exposes the subset of the faiss.Index API the LangChain FAISS wrapper
+    uses; positions >= base.ntotal address the delta.
+    """
+
+    def __init__(self, base: faiss.Index, base_path: Optional[str] = None):
+        self.base = base
+        self.base_path = base_path  # None while the base only exists in memory (fresh build)
+        self.d = base.d
+        self.metric_type = base.metric_type
+        self.is_trained = True
+        self.delta = faiss.IndexFlat(base.d, base.metric_type)
+
+    @property
+    def ntotal(self) -> int:
+        return self.base.ntotal + self.delta.ntotal
+
+    def add(self, x: np.ndarray) -> None:
+        self.delta.add(np.ascontiguousarray(x, dtype=np.float32))
+
+    def search(self, x: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        D, I = self.base.search(x, k)
+        if self.delta.ntotal == 0:
+            return D, I
+        Dd, Id = self.delta.search(x, min(k, self.delta.ntotal))
+        Id = np.where(Id >= 0, Id + self.base.ntotal, -1)
+        D, I = np.hstack([D, Dd]), np.hstack([I, Id])
+        larger_is_closer = self.metric_type == faiss.METRIC_INNER_PRODUCT
+        worst = -np.inf if larger_is_closer else np.inf
+        D = np.where(I >= 0, D, worst)
+        order = np.argsort(-D if larger_is_closer else D, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(D, order, axis=1), np.take_along_axis(I, order, axis=1)
+
+    def reconstruct(self, pos: int) -> np.ndarray:
+        if pos < self.base.ntotal:
+            return self.base.reconstruct(pos)
+        return self.delta.reconstruct(pos - self.base.ntotal)
+
+    def merged(self) -> faiss.Index:
+        """A writable index holding base + delta rows (reads the base fully into memory)."""
+        index = faiss.read_index(self.base_path) if self.base_path else self.base
+        if self.delta.ntotal:
+            index.add(self.delta.reconstruct_n(0, self.delta.ntotal))
+        return index
+
+
+class SegmentedFaissStore:
+    """
+    Append-friendly on-disk layout for one FAISS collection.
+
+        <index_dir>/
+          manifest.json                 {"base": "base-000002", "compacted_seq": 17, "base_rows": N}
+          index.chunks.sqlite           chunk text + metadata by id (shared by all generations)
+          base-000002/                  immutable snapshot: index.faiss, index.ids.npy, index.bm25.*
+          segments/00000018.seg.npz     one file per append: vectors + ids
+
+    Nothing is unpickled on load: the base index is memory-mapped, ids.npy is mmap'd and chunk
+    text is fetched from SQLite only for the hits a query returns. An append writes its chunks to
+    SQLite and a single segment file; a load replays segments newer than the base into an
+    in-memory delta (flat vectors + BM25 delta postings, so neither costs more as the base
+    grows). compact() writes the next base generation, switches the manifest
+    atomically, then deletes the old base and the replayed segments, so a crash at any point
+    leaves a loadable index. Writers hold an flock on <index_dir>/.lock and first catch up with
+    segments / compactions written by other store instances, so several processes may append
+    to one collection. Older layouts (pickled index.pkl docstore, flat or in a base-*
+    dir) are migrated on their first load.
+    """
+
+    MANIFEST = "manifest.json"
+    SEGMENTS = "segments"
+    CHUNKS_FILE = "{name}.chunks.sqlite"
+    IDS_FILE = "{name}.ids.npy"
+
+    def __init__(
+        self,
+        index_dir: str | Path,
+        embeddings: Any,
+        index_name: str = "index",
+        index_cfg: Optional[Dict[str, Any]] = None,
+        compact_ratio: float = 0.25,
+        max_segments: int = 512,
+        bm25_enabled: bool = True,
+    ):
+        self.index_dir = Path(index_dir)
+        self.embeddings = embeddings
+        self.index_name = index_name
+        self.index_cfg = index_cfg
+        self.compact_ratio = compact_ratio
+        self.max_segments = max_segments
+        self.bm25_enabled = bm25_enabled
+
+        self.vs: Optional[FAISS] = None
+        self.docstore: Optional[SQLiteDocstore] = None
+        self.bm25: Optional[BM25Index] = None
+        self.base_rows = 0
+        self.segment_rows = 0
+        self.replayed_ids: List[str] = []
+        self._lock = _dir_lock(self.index_dir)
+        self._base: Optional[str] = None      # manifest base the in-memory index was built from
+        self._applied_seqs: set = set()       # segments (by seq) whose rows are in memory
+        self._delta_ids: set = set()
+
+    # ---------- Layout ----------
+
+    def _manifest(self) -> Dict[str, Any]:
+        path = self.index_dir / self.MANIFEST
+        if path.exists():
+            return json.loads(path.read_text(encoding="utf-8"))
+        return {"base": None, "compacted_seq": 0, "base_rows": 0}
+
+    def base_dir(self) -> Path:
+        base = self._manifest().get("base")
+        return self.index_dir / base if base else self.index_dir
+
+    def _ids_path(self, base: Path) -> Path:
+        return base / self.IDS_FILE.format(name=self.index_name)
+
+    def _legacy_pickle(self, base: Path) -> Optional[Path]:
+        pkl = base / f"{self.index_name}.pkl"
+        return pkl if pkl.exists() and not self._ids_path(base).exists() else None
+
+    def exists(self) -> bool:
+        base = self.base_dir()
+        return (base / f"{self.index_name}.faiss").exists() and (
+            self._ids_path(base).exists() or (base / f"{self.index_name}.pkl").exists()
+        )
+
+    def _segment_files(self) -> List[Tuple[int, Path]]:
+        seg_dir = self.index_dir / self.SEGMENTS
+        if not seg_dir.is_dir():
+            return []
+        floor = int(self._manifest().get("compacted_seq", 0))
+        out = []
+        for p in seg_dir.iterdir():
+            m = _SEGMENT_RE.match(p.name)
+            if m and int(m.group(1)) > floor:
+                out.append((int(m.group(1)), p))
+        return sorted(out)
+
+    def _scan_last_seq(self) -> int:
+        segs = self._segment_files()
+        return max([int(self._manifest().get("compacted_seq", 0))] + [seq for seq, _ in segs])
+
+    @classmethod
+    def signature_paths(cls, index_dir: str | Path, index_name: str = "index") -> List[Path]:
+        """Paths whose stat() changes on every append/compaction (used for cache staleness checks)."""
+        d = Path(index_dir)
+        return [d / cls.MANIFEST, d / cls.SEGMENTS, d / f"{index_name}.faiss", d / f"{index_name}.pkl"]
+
+    @classmethod
+    def footprint_bytes(cls, index_dir: str | Path, index_name: str = "index") -> int:
+        """Approximate resident size once loaded: mapped base index + id map + live segments."""
+        store = cls(index_dir, embeddings=None, index_name=index_name)
+        base = store.base_dir()
+        paths = [base / f"{index_name}.faiss", store._ids_path(base), base / f"{index_name}.pkl"]
+        paths += [p for _, p in store._segment_files()]
+        return sum(p.stat().st_size for p in paths if p.exists())
+
+    def _open_docstore(self) -> SQLiteDocstore:
+        if self.docstore is None:
+            self.docstore = SQLiteDocstore(self.index_dir / self.CHUNKS_FILE.format(name=self.index_name))
+        return self.docstore
+
+    def _wrap(self, index: SegmentedIndex, id_map: IdMap) -> FAISS:
+        if self.index_cfg:
+            apply_search_params(index.base, self.index_cfg)
+        return FAISS(embedding_function=self.embeddings, index=index,
+                     docstore=self._open_docstore(), index_to_docstore_id=id_map)
+
+    # ---------- Segments ----------
+
+    @staticmethod
+    def _write_segment(path: Path, ids: Sequence[str], vectors: np.ndarray) -> None:
+        buf = io.BytesIO()
+        np.savez(buf, vectors=np.asarray(vectors, dtype=np.float32), ids=np.asarray(ids, dtype=str))
+        atomic_write_bytes(path, buf.getvalue())
+
+    @staticmethod
+    def _read_segment(path: Path):
+        with np.load(path, allow_pickle=False) as z:
+            vectors, ids = z["vectors"], [str(x) for x in z["ids"]]
+            # segments written before the SQLite chunk store carried their texts inline
+            payload = json.loads(z["payload"].tobytes().decode("utf-8")) if "payload" in z.files else None
+        return ids, vectors, payload
+
+    def _add_rows(self, ids: Sequence[str], vectors: np.ndarray) -> None:
+        start = len(self.vs.index_to_docstore_id)
+        self.vs.index.add(vectors)
+        self.vs.index_to_docstore_id.update({start + j: _id for j, _id in enumerate(ids)})
+
+    def _replay(self, segments: Sequence[Tuple[int, Path]]) -> None:
+        # segments newer than compacted_seq are never part of the base; dedupe only among them
+        for seq, path in segments:
+            self._applied_seqs.add(seq)
+            ids, vectors, payload = self._read_segment(path)
+            if payload is not None:
+                self.docstore.add({_id: Document(page_content=t, metadata=md)
+                                   for _id, t, md in zip(ids, payload["texts"], payload["metadatas"])})
+            keep = [i for i, _id in enumerate(ids) if _id not in self._delta_ids]
+            if not keep:
+                continue
+            kept_ids = [ids[i] for i in keep]
+            self._delta_ids.update(kept_ids)
+            self._add_rows(kept_ids, vectors[keep])
+            if self.bm25 is not None:
+                docs = self.docstore.mget(kept_ids)
+                self.bm25.add((_id, docs[_id].page_content) for _id in kept_ids if _id in docs)
+            self.replayed_ids.extend(kept_ids)
+            self.segment_rows += len(keep)
+
+    def _sync(self) -> None:
+        """Catch up with other store instances on this directory; call with the lock held."""
+        if self._manifest().get("base") != self._base:
+            self.load()  # compacted elsewhere: our base and replayed segments are gone
+            return
+        self._replay([(seq, p) for seq, p in self._segment_files() if seq not in self._applied_seqs])
+
+    # ---------- Public API ----------
+
+    def load(self) -> FAISS:
+        """Map the base snapshot and replay segments newer than it."""
+        with self._lock:
+            base = self.base_dir()
+            legacy = self._legacy_pickle(base)
+            if legacy is not None:
+                self.vs = self._migrate_pickle(base)
+            else:
+                faiss_path = str(base / f"{self.index_name}.faiss")
+                index = SegmentedIndex(read_index_mmap(faiss_path), base_path=faiss_path)
+                self.vs = self._wrap(index, IdMap(np.load(self._ids_path(base), mmap_mode="r")))
+            self.bm25 = None
+            if self.bm25_enabled and BM25Index.exists(base, self.index_name):
+                # appended / replayed rows stay in the BM25 delta until compact() writes a new base
+                self.bm25 = BM25Index.load(base, self.index_name, merge_ratio=None)
+            self.base_rows = self.vs.index.ntotal
+            self._base = self._manifest().get("base")
+
+            self.replayed_ids, self.segment_rows = [], 0
+            self._applied_seqs, self._delta_ids = set(), set()
+            segments = self._segment_files()
+            self._replay(segments)
+
+            if legacy is not None:
+                self.compact()  # persist the migrated layout; drops the pickle
+            log.info("FAISS store loaded", index_dir=str(self.index_dir), base=base.name,
+                     base_rows=self.base_rows, segments=len(segments), segment_rows=self.segment_rows)
+            return self.vs
+
+    def _migrate_pickle(self, base: Path) -> FAISS:
+        """One-time conversion of a LangChain save_local() snapshot into the SQLite chunk store."""
+        # our own file, read once; from here on nothing is unpickled
+        old = FAISS.load_local(str(base), self.embeddings, index_name=self.index_name,
+                               allow_dangerous_deserialization=True)
+        ids = [old.index_to_docstore_id[i] for i in range(old.index.ntotal)]
+        docs = {_id: old.docstore.search(_id) for _id in ids}
+        self._open_docstore().add({_id: d for _id, d in docs.items() if isinstance(d, Document)})
+        log.info("Migrated pickled docstore to SQLite", index_dir=str(self.index_dir), rows=len(ids))
+        return self._wrap(SegmentedIndex(old.index), IdMap(np.asarray(ids, dtype=str)))
+
+    def create(self, index: Any, ids: List[str], texts: List[str],
+               metadatas: List[Dict[str, Any]], vectors: np.ndarray) -> FAISS:
+        """Build a fresh collection around `index` and persist it as the first base snapshot."""
+        with self._lock:
+            # a fresh build supersedes whatever segments are lying around; compact() drops them
+            self._base = self._manifest().get("base")
+            self._applied_seqs = {seq for seq, _ in self._segment_files()}
+            self._delta_ids = set()
+            self.vs = self._wrap(SegmentedIndex(index), IdMap())
+            self.docstore.add({_id: Document(page_content=t, metadata=md)
+                               for _id, t, md in zip(ids, texts, metadatas)})
+            self._add_rows(ids, np.asarray(vectors, dtype=np.float32))
+            self.bm25 = BM25Index(merge_ratio=None) if self.bm25_enabled else None
+            if self.bm25 is not None:
+                self.bm25.add(zip(ids, texts))
+            self.compact()
+            return self.vs
+
+    def append(self, ids: List[str], texts: List[str],
+               metadatas: List[Dict[str, Any]], vectors: np.ndarray) -> int:
+        """Add rows in memory and persist them as chunk rows + one new segment file."""
+        if self.vs is None:
+            raise RuntimeError("Call load() or create() before append().")
+        if not ids:
+            return 0
+        with self._lock:
+            self._sync()
+            vectors = np.asarray(vectors, dtype=np.float32)
+            # chunks first, then the segment: once the segment is on disk the rows are replayable
+            self.docstore.add({_id: Document(page_content=t, metadata=md)
+                               for _id, t, md in zip(ids, texts, metadatas)})
+            seq = self._scan_last_seq() + 1  # rescanned under the lock: other stores append too
+            seg_dir = self.index_dir / self.SEGMENTS
+            seg_dir.mkdir(parents=True, exist_ok=True)
+            self._write_segment(seg_dir / f"{seq:08d}.seg.npz", ids, vectors)
+            self._applied_seqs.add(seq)
+
+            self._add_rows(ids, vectors)
+            self._delta_ids.update(ids)
+            if self.bm25 is not None:
+                self.bm25.add(zip(ids, texts))
+            self.segment_rows += len(ids)
+            log.info("Segment appended", index_dir=str(self.index_dir), seq=seq, rows=len(ids))
+            return len(ids)
+
+    def needs_compaction(self) -> bool:
+        if self.segment_rows == 0:
+            return False
+        return (len(self._segment_files()) >= self.max_segments
+                or self.segment_rows > self.compact_ratio * max(self.base_rows, 1))
+
+    def compact(self) -> None:
+        """Write base + delta as a new base generation, drop replayed segments and re-map it."""
+        if self.vs is None:
+            raise RuntimeError("Nothing loaded to compact.")
+        with self._lock:
+            self._sync()
+            manifest = self._manifest()
+            old_base = manifest.get("base")
+            gen = int(old_base.split("-")[1]) + 1 if old_base else 1
+            new_name = f"base-{gen:06d}"
+            # left behind by a compaction that died before its manifest switch
+            shutil.rmtree(self.index_dir / new_name, ignore_errors=True)
+            tmp_dir = self.index_dir / f".{new_name}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+            tmp_dir.mkdir(parents=True)
+
+            merged = self.vs.index.merged()
+            faiss.write_index(merged, str(tmp_dir / f"{self.index_name}.faiss"))
+            np.save(self._ids_path(tmp_dir), self.vs.index_to_docstore_id.all_ids())
+            if self.bm25 is not None:
+                self.bm25.merge()  # the only place segment postings join the base CSR
+                self.bm25.save(tmp_dir, self.index_name)
+            os.replace(tmp_dir, self.index_dir / new_name)
+
+            # the manifest switch is the commit point
+            compacted_seq = max([int(manifest.get("compacted_seq", 0))] + list(self._applied_seqs))
+            atomic_write_text(self.index_dir / self.MANIFEST, json.dumps({
+                "base": new_name, "compacted_seq": compacted_seq, "base_rows": merged.ntotal,
+            }))
+
+            if old_base:
+                shutil.rmtree(self.index_dir / old_base, ignore_errors=True)
+            else:
+                for legacy in (f"{self.index_name}.faiss", f"{self.index_name}.pkl",
+                               BM25Index.NPZ_FILE.format(name=self.index_name),
+                               BM25Index.VOCAB_FILE.format(name=self.index_name)):
+                    (self.index_dir / legacy).unlink(missing_ok=True)
+            seg_dir = self.index_dir / self.SEGMENTS
+            if seg_dir.is_dir():
+                for p in seg_dir.iterdir():
+                    m = _SEGMENT_RE.match(p.name)
+                    if m and int(m.group(1)) <= compacted_seq:
+                        p.unlink(missing_ok=True)
+
+            # swap the in-memory copy for the mapped snapshot so this process holds no private copy
+            new_dir = self.index_dir / new_name
+            faiss_path = str(new_dir / f"{self.index_name}.faiss")
+            self.vs.index = SegmentedIndex(read_index_mmap(faiss_path), base_path=faiss_path)
+            if self.index_cfg:
+                apply_search_params(self.vs.index.base, self.index_cfg)
+            self.vs.index_to_docstore_id = IdMap(np.load(self._ids_path(new_dir), mmap_mode="r"))
+
+            self.base_rows, self.segment_rows = merged.ntotal, 0
+            self._base, self._applied_seqs, self._delta_ids = new_name, set(), set()
+            log.info("FAISS store compacted", index_dir=str(self.index_dir), base=new_name, rows=self.base_rows)
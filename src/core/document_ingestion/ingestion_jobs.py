@@ -0,0 +1,420 @@
+from __future__ import annotations
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from src.common.utils.config_loader import load_config
+from src.common.utils.file_io import SavedFile
+from src.common.logger.custom_logger import CustomLogger
+
+log = CustomLogger().get_logger(__name__)
+
+ProgressFn = Callable[..., None]               # progress(stage, **counters)
+Runner = Callable[[Dict[str, Any], ProgressFn], Dict[str, Any]]
+SerialKey = Callable[[Dict[str, Any]], Optional[str]]  # jobs with the same key never run concurrently
+
+DEFAULT_JOBS_CONFIG: Dict[str, Any] = {
+    "path": "data/ingestion_jobs.sqlite",
+    "workers": 2,                    # jobs run concurrently per API process
+    "poll_seconds": 1.0,             # idle workers re-check the queue (and for orphaned jobs) this often
+    "stale_after_seconds": 600,      # a job on another host with no heartbeat for this long is requeued
+    "heartbeat_seconds": 30,         # running jobs' updated_at is refreshed this often
+    "max_attempts": 3,
+    "progress_interval": 0.5,        # seconds between progress writes within one stage
+}
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    status: str                      # "queued" | "running" | "succeeded" | "failed"
+    params: Dict[str, Any]
+    progress: Dict[str, Any] = field(default_factory=dict)
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    created_at: float = 0.0
+    updated_at: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        out = asdict(self)
+        out.pop("params")  # holds server-side paths
+        out["job_id"] = out.pop("id")
+        return out
+
+
+class IngestionJobQueue:
+    """
+    Durable background job queue: jobs live in a SQLite table and a small thread pool runs them.
+
+    Submitting only inserts a row, so requests return at once. Workers claim the oldest queued job
+    inside an IMMEDIATE transaction, so several API processes can share one queue file. While a job
+    runs, its process refreshes `updated_at` every `heartbeat_seconds`. A job whose process died
+    (same host, pid gone) is requeued at once; one owned by another host only once its heartbeat
+    is older than `stale_after_seconds`; a live local owner is never second-guessed. Requeues are
+    capped by `max_attempts`; runners are expected to be idempotent (ChatIngestor skips work already indexed).
+    A job whose kind has a serial key (e.g. the index directory it writes) is not claimed while
+    another job with the same key is running, so writes to one index stay sequential.
+    """
+
+    def __init__(self, path: str | Path, runners: Dict[str, Runner], workers: int = 2, poll_seconds: float = 1.0,
+                 stale_after_seconds: float = 600, max_attempts: int = 3, progress_interval: float = 0.5,
+                 heartbeat_seconds: float = 30, serial_keys: Optional[Dict[str, SerialKey]] = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.runners = dict(runners)
+        self.serial_keys = dict(serial_keys or {})
+        self.workers = max(1, int(workers))
+        self.poll_seconds = float(poll_seconds)
+        self.stale_after_seconds = float(stale_after_seconds)
+        self.max_attempts = int(max_attempts)
+        self.progress_interval = float(progress_interval)
+        self.heartbeat_seconds = float(heartbeat_seconds)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._running: set = set()  # ids of jobs executing in this process
+        self._heartbeat: Optional[threading.Thread] = None
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, params TEXT NOT NULL,"
+            " progress TEXT NOT NULL DEFAULT '{}', result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0,"
+            " owner TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL, serial_key TEXT)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "serial_key" not in columns:  # queue files created before serial keys
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN serial_key TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+    # ---------- Public API ----------
+
+    def submit(self, kind: str, params: Dict[str, Any]) -> Job:
+        if kind not in self.runners:
+            raise ValueError(f"Unknown job kind: {kind}")
+        now = time.time()
+        job = Job(id=uuid.uuid4().hex, kind=kind, status="queued", params=params, created_at=now, updated_at=now)
+        key_fn = self.serial_keys.get(kind)
+        serial_key = key_fn(params) if key_fn else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, status, params, created_at, updated_at, serial_key)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job.id, kind, job.status, json.dumps(params), now, now, serial_key),
+            )
+        self._wake.set()
+        log.info("Job submitted", job_id=job.id, kind=kind)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, kind, status, params, progress, result, error, attempts, created_at, updated_at"
+                " FROM jobs WHERE id=?", (job_id,)
+            ).fetchone()
+        return self._to_job(row) if row else None
+
+    def start(self) -> None:
+        """Start the worker threads (idempotent)."""
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            self._threads = [
+                threading.Thread(target=self._work, name=f"ingest-job-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+        self.requeue_orphans()
+        for t in self._threads:
+            t.start()
+        log.info("Job workers started", workers=self.workers, path=str(self.path))
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop taking new jobs; running jobs are requeued on the next start if they don't finish."""
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def run_pending(self) -> int:
+        """Run queued jobs on the calling thread until none are left (CLI / tests)."""
+        n = 0
+        while (job := self._claim()) is not None:
+            self._execute(job)
+            n += 1
+        return n
+
+    def requeue_orphans(self) -> int:
+        now = time.time()
+        requeued = 0
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, owner, attempts, updated_at FROM jobs WHERE status='running'"
+                ).fetchall()
+                for job_id, owner, attempts, updated_at in rows:
+                    alive = self._owner_alive(owner)
+                    if alive or (alive is None and now - updated_at <= self.stale_after_seconds):
+                        continue  # owner running (or, on another host, still sending heartbeats)
+                    if attempts >= self.max_attempts:
+                        self._conn.execute(
+                            "UPDATE jobs SET status='failed', error=?, updated_at=? WHERE id=?",
+                            (f"Abandoned after {attempts} attempts", now, job_id),
+                        )
+                    else:
+                        self._conn.execute(
+                            "UPDATE jobs SET status='queued', owner=NULL, updated_at=? WHERE id=?", (now, job_id)
+                        )
+                        requeued += 1
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if requeued:
+            log.warning("Interrupted jobs requeued", count=requeued)
+        return requeued
+
+    # ---------- Workers ----------
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            try:
+                job = self._claim()
+            except Exception as e:
+                log.error("Job claim failed", error=str(e))
+                job = None
+            if job is None:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+                try:
+                    self.requeue_orphans()
+                except Exception as e:
+                    log.error("Orphan check failed", error=str(e))
+                continue
+            self._execute(job)
+
+    def _claim(self) -> Optional[Job]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id, kind, status, params, progress, result, error, attempts, created_at, updated_at"
+                    " FROM jobs WHERE status='queued' AND (serial_key IS NULL OR serial_key NOT IN"
+                    " (SELECT serial_key FROM jobs WHERE status='running' AND serial_key IS NOT NULL))"
+                    " ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                now = time.time()
+                self._conn.execute(
+                    "UPDATE jobs SET status='running', owner=?, attempts=attempts+1, error=NULL, updated_at=?"
+                    " WHERE id=?", (self.owner, now, row[0]),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        job = self._to_job(row)
+        job.status, job.attempts, job.updated_at = "running", job.attempts + 1, now
+        return job
+
+    def _execute(self, job: Job) -> None:
+        progress = _ProgressWriter(self, job)
+        start = time.perf_counter()
+        log.info("Job started", job_id=job.id, kind=job.kind, attempt=job.attempts)
+        self._track(job.id)
+        try:
+            result = self.runners[job.kind](job.params, progress)
+        except Exception as e:
+            progress.flush()
+            self._finish(job.id, "failed", error=str(e))
+            log.error("Job failed", job_id=job.id, kind=job.kind, error=str(e))
+            return
+        finally:
+            self._untrack(job.id)
+        progress.flush()
+        self._finish(job.id, "succeeded", result=result)
+        log.info("Job finished", job_id=job.id, kind=job.kind, seconds=round(time.perf_counter() - start, 3))
+
+    def _finish(self, job_id: str, status: str, result: Optional[Dict[str, Any]] = None,
+                error: Optional[str] = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status=?, result=?, error=?, updated_at=? WHERE id=?",
+                (status, json.dumps(result, default=str) if result is not None else None, error, time.time(), job_id),
+            )
+        self._wake.set()  # jobs held back behind this one's serial key can run now
+
+    # ---------- Heartbeat ----------
+
+    def _track(self, job_id: str) -> None:
+        with self._lock:
+            self._running.add(job_id)
+            if self._heartbeat is None or not self._heartbeat.is_alive():
+                self._heartbeat = threading.Thread(target=self._beat, name="ingest-job-heartbeat", daemon=True)
+                self._heartbeat.start()
+
+    def _untrack(self, job_id: str) -> None:
+        with self._lock:
+            self._running.discard(job_id)
+
+    def _beat(self) -> None:
+        """Refresh updated_at of this process's running jobs, whether or not they report progress."""
+        while True:
+            time.sleep(self.heartbeat_seconds)
+            with self._lock:
+                running = list(self._running)
+                if not running:
+                    self._heartbeat = None
+                    return
+                try:
+                    marks = ",".join("?" * len(running))
+                    self._conn.execute(
+                        f"UPDATE jobs SET updated_at=? WHERE status='running' AND owner=? AND id IN ({marks})",
+                        (time.time(), self.owner, *running),
+                    )
+                except sqlite3.Error as e:
+                    log.error("Job heartbeat failed", error=str(e))
+
+    def _write_progress(self, job_id: str, progress: Dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET progress=?, updated_at=? WHERE id=?", (json.dumps(progress), time.time(), job_id)
+            )
+
+    # ---------- Helpers ----------
+
+    def _owner_alive(self, owner: Optional[str]) -> Optional[bool]:
+        """True / False for owners on this host (pid check), None when it cannot be verified."""
+        if not owner:
+            return False
+        host, _, pid = owner.rpartition(":")
+        if host != socket.gethostname() or not pid.isdigit():
+            return None  # another machine: only the heartbeat age tells
+        if int(pid) == os.getpid():
+            return True
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True  # exists, owned by another user
+        return True
+
+    @staticmethod
+    def _to_job(row) -> Job:
+        return Job(
+            id=row[0], kind=row[1], status=row[2], params=json.loads(row[3]), progress=json.loads(row[4] or "{}"),
+            result=json.loads(row[5]) if row[5] else None, error=row[6], attempts=row[7],
+            created_at=row[8], updated_at=row[9],
+        )
+
+
+class _ProgressWriter:
+    """progress(stage, **counters) callback: merges running totals, writes at most every progress_interval."""
+
+    def __init__(self, queue: IngestionJobQueue, job: Job):
+        self.queue = queue
+        self.job_id = job.id
+        self.state: Dict[str, Any] = dict(job.progress)
+        self._last_write = 0.0
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def __call__(self, stage: str, **counters: Any) -> None:
+        with self._lock:
+            changed_stage = self.state.get("stage") != stage
+            self.state["stage"] = stage
+            self.state.update(counters)
+            self._dirty = True
+            now = time.monotonic()
+            if not changed_stage and now - self._last_write < self.queue.progress_interval:
+                return
+            self._last_write = now
+            self._dirty = False
+            snapshot = dict(self.state)
+        self.queue._write_progress(self.job_id, snapshot)
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            snapshot = dict(self.state)
+        self.queue._write_progress(self.job_id, snapshot)
+
+
+# ---------- Runners ----------
+
+def run_chat_index_job(params: Dict[str, Any], progress: ProgressFn) -> Dict[str, Any]:
+    """Parse, split, embed and index files already saved by POST /chat/index."""
+    from src.core.document_ingestion.data_ingestion import ChatIngestor
+
+    ci = ChatIngestor(
+        temp_base=params["temp_base"],
+        faiss_base=params["faiss_base"],
+        use_session_dirs=params["use_session_dirs"],
+        session_id=params["session_id"],
+    )
+    files = [SavedFile(path=Path(f["path"]), name=f["name"], sha256=f["sha256"], size=f["size"])
+             for f in params["files"]]
+    ci.built_retriver(files, chunk_size=params["chunk_size"], chunk_overlap=params["chunk_overlap"],
+                      k=params["k"], progress=progress)
+    return {"session_id": ci.session_id, "k": params["k"], "use_session_dirs": params["use_session_dirs"],
+            **ci.last_stats}
+
+
+def chat_index_serial_key(params: Dict[str, Any]) -> str:
+    """The FAISS directory the job writes (ChatIngestor._resolve_dir)."""
+    base = Path(params["faiss_base"])
+    return os.path.abspath(base / params["session_id"] if params["use_session_dirs"] else base)
+
+
+JOB_RUNNERS: Dict[str, Runner] = {
+    "chat_index": run_chat_index_job,
+}
+
+JOB_SERIAL_KEYS: Dict[str, SerialKey] = {
+    "chat_index": chat_index_serial_key,
+}
+
+
+_queue: Optional[IngestionJobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> IngestionJobQueue:
+    """Process-wide queue from `ingestion_jobs` in the YAML config (workers not started yet)."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                try:
+                    cfg = load_config().get("ingestion_jobs") or {}
+                except FileNotFoundError:
+                    cfg = {}
+                merged = {**DEFAULT_JOBS_CONFIG, **cfg}
+                _queue = IngestionJobQueue(merged.pop("path"), JOB_RUNNERS, serial_keys=JOB_SERIAL_KEYS, **merged)
+    return _queue
+
+
+def shutdown_job_queue() -> None:
+    if _queue is not None:
+        _queue.stop()
@@ -11,6 +11,31 @@ Analyze this document:
 {document_text}
 """)
 
+# Map step of map-reduce analysis: notes for one section of a large document
+document_analysis_map_prompt = ChatPromptTemplate.from_template("""
+You are reading section {section_number} of {section_count} of a longer document.
+Write concise notes on this section only:
+- the key points, as short bullet points
+- any title, author, publisher, date or language information it states
+- the overall tone of the section
+
+Section:
+{section_text}
+""")
+
+# Reduce step of map-reduce analysis: combine section notes into the metadata schema
+document_analysis_reduce_prompt = ChatPromptTemplate.from_template("""
+You are a highly capable assistant trained to analyze and summarize documents.
+Below are notes taken section by section from one document, in order.
+Combine them into a single analysis of the whole document.
+Return ONLY valid JSON matching the exact schema below.
+
+{format_instructions}
+
+Section notes:
+{section_summaries}
+""")
+
 # Prompt for document comparison
 document_comparison_prompt = ChatPromptTemplate.from_template("""
 You will be provided with content from two PDFs. Your tasks are as follows:
@@ -29,6 +54,24 @@ Your response should follow this format:
 {format_instruction}
 """)
 
+# Prompt for comparing pre-aligned page pairs (only pages that differ are sent)
+document_comparison_pages_prompt = ChatPromptTemplate.from_template("""
+You will be provided with pairs of pages from a reference PDF and an actual PDF.
+Pages that are identical have already been removed; every pair below differs.
+
+1. For each pair, describe what changed between the REFERENCE and ACTUAL text
+2. A pair with an empty REFERENCE is a page added in the actual PDF; an empty ACTUAL is a removed page
+3. Return exactly one entry per pair and copy the pair's PAGE label into the Page field unchanged
+
+Page pairs:
+
+{page_pairs}
+
+Your response should follow this format:
+
+{format_instruction}
+""")
+
 # Prompt for contextual question rewriting
 contextualize_question_prompt = ChatPromptTemplate.from_messages([
     ("system", (
@@ -54,7 +97,10 @@ context_qa_prompt = ChatPromptTemplate.from_messages([
 # Central dictionary to register prompts
 PROMPT_REGISTRY = {
     "document_analysis": document_analysis_prompt,
+    "document_analysis_map": document_analysis_map_prompt,
+    "document_analysis_reduce": document_analysis_reduce_prompt,
     "document_comparison": document_comparison_prompt,
+    "document_comparison_pages": document_comparison_pages_prompt,
     "contextualize_question": contextualize_question_prompt,
     "context_qa": context_qa_prompt,
 }
\ No newline at end of file
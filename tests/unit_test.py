@@ -6,4 +6,989 @@ client = TestClient(app)
 def test_home():
     response = client.get("/")
     assert response.status_code == 200
-    assert "Document Portal" in response.text
\ No newline at end of file
+    assert "Document Portal" in response.text
+
+def test_vectorstore_cache_hits_and_reloads_on_change(tmp_path):
+    from src.core.document_chat.vectorstore_cache import VectorStoreCache
+
+    (tmp_path / "index.faiss").write_bytes(b"x" * 10)
+    (tmp_path / "index.pkl").write_bytes(b"y" * 10)
+    cache = VectorStoreCache(max_memory_mb=1)
+    loads = []
+    loader = lambda: loads.append(1) or object()
+
+    first = cache.get_vectorstore(str(tmp_path), "index", loader)
+    assert cache.get_vectorstore(str(tmp_path), "index", loader) is first
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    (tmp_path / "index.faiss").write_bytes(b"x" * 20)  # index rewritten by an append
+    assert cache.get_vectorstore(str(tmp_path), "index", loader) is not first
+    assert len(loads) == 2 and cache.stats()["reloads"] == 1
+
+
+def test_model_loader_reuses_clients(monkeypatch):
+    import threading
+    from src.common.utils import model_loader
+
+    monkeypatch.setenv("ENV", "production")  # no .env
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("GROQ_API_KEY", "gsk-test")
+    monkeypatch.delenv("LLM_PROVIDER", raising=False)
+    monkeypatch.delenv("EMBEDDING_PROVIDER", raising=False)
+    monkeypatch.setattr(model_loader, "_loader", None)
+
+    loaders = []
+    threads = [threading.Thread(target=lambda: loaders.append(model_loader.get_model_loader())) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    loader = model_loader.get_model_loader()
+    assert all(other is loader for other in loaders)
+
+    assert loader.load_llm() is loader.load_llm()
+    assert loader.load_embeddings() is loader.load_embeddings()
+    assert loader.load_llm(temperature=0.7) is not loader.load_llm()
+    assert len(loader.stats()["clients"]) == 3
+
+
+def test_cached_embeddings_embed_each_text_once(tmp_path):
+    from langchain_core.embeddings import Embeddings
+    from src.common.utils.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+    class CountingEmbeddings(Embeddings):
+        calls: list = []
+        def embed_documents(self, texts):
+            self.calls.extend(texts)
+            return [[float(len(t)), 1.0] for t in texts]
+        def embed_query(self, text):
+            return self.embed_documents([text])[0]
+
+    inner = CountingEmbeddings()
+    cache = EmbeddingCache(tmp_path / "emb.sqlite")
+    emb = CachedEmbeddings(inner, cache, "test-model", 2)
+    assert emb.embed_documents(["a", "bb", "a"]) == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    # a second session sharing the same cache file embeds nothing new
+    again = CachedEmbeddings(inner, EmbeddingCache(tmp_path / "emb.sqlite"), "test-model", 2)
+    assert again.embed_documents(["bb", "a"]) == [[2.0, 1.0], [1.0, 1.0]]
+    assert inner.calls == ["a", "bb"]
+
+    # queries stay in memory: embedded once, never written to the shared store
+    assert emb.embed_query("what is ccc?") == emb.embed_query("what is ccc?") == [12.0, 1.0]
+    assert inner.calls == ["a", "bb", "what is ccc?"] and cache.count() == 2
+
+
+def test_reupload_of_same_file_is_skipped(tmp_path, monkeypatch):
+    import io
+    from langchain_core.embeddings import Embeddings
+    from src.common.utils import extraction_cache, model_loader
+    from src.core.document_ingestion.data_ingestion import ChatIngestor
+
+    class FakeEmbeddings(Embeddings):
+        def embed_documents(self, texts):
+            return [[float(len(t)), float(sum(map(ord, t)) % 97), 1.0] for t in texts]
+        def embed_query(self, text):
+            return self.embed_documents([text])[0]
+
+    class FakeLoader:
+        config = {"embedding_cache": {"path": str(tmp_path / "emb.sqlite")}}
+        def load_embeddings(self):
+            return FakeEmbeddings()
+        def embedding_config(self):
+            return {"model_name": "fake", "dimensions": 3}
+
+    monkeypatch.setattr(model_loader, "_loader", FakeLoader())
+    monkeypatch.setattr(extraction_cache, "_cache", extraction_cache.ExtractionCache(tmp_path / "extract.sqlite"))
+
+    def upload(name, text):
+        f = io.BytesIO(text.encode())
+        f.name = name
+        return f
+
+    body = "\n\n".join(f"Paragraph {i} about clause {i}." for i in range(20))
+    ci = ChatIngestor(temp_base=str(tmp_path / "data"), faiss_base=str(tmp_path / "faiss"), session_id="s1")
+    retriever = ci.built_retriver([upload("a.txt", body), upload("a_copy.txt", body)], chunk_size=100, chunk_overlap=0)
+    assert ci.last_stats["files_added"] == 1 and ci.last_stats["files_skipped"] == 1
+    first_added = ci.last_stats["chunks_added"]
+    assert first_added > 1 and retriever.vectorstore.index.ntotal == first_added
+
+    ci.built_retriver([upload("again.txt", body)], chunk_size=100, chunk_overlap=0)
+    assert ci.last_stats == {"files_added": 0, "files_skipped": 1, "chunks_added": 0, "chunks_skipped": 0}
+
+
+def test_blocking_stages_overlap_on_event_loop():
+    import asyncio
+    import time
+    from src.common.utils.concurrency import run_in_stage
+
+    async def burst():
+        start = time.perf_counter()
+        await asyncio.gather(*(run_in_stage("io", time.sleep, 0.2) for _ in range(4)))
+        return time.perf_counter() - start
+
+    assert asyncio.run(burst()) < 0.6  # serial execution would take 0.8s
+
+
+def test_stage_slots_are_per_loop_and_released_with_it():
+    import asyncio
+    import gc
+    from src.common.utils import concurrency
+
+    async def take():
+        async with concurrency.stage_slot("llm"):
+            return dict(concurrency._semaphores[asyncio.get_running_loop()])
+
+    before = len(concurrency._semaphores)
+    first, second = asyncio.run(take()), asyncio.run(take())
+    assert first["llm"] is not second["llm"]
+    gc.collect()
+    assert len(concurrency._semaphores) == before
+
+
+def test_chat_query_stream_emits_sources_before_tokens(tmp_path, monkeypatch):
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from langchain_community.vectorstores import FAISS
+    from src.app.api.config import settings
+    from src.common.utils import model_loader
+
+    class FakeLoader:
+        config = {}
+        def load_llm(self):
+            return FakeListChatModel(responses=["streamed answer"])  # no history: no rewrite call
+        def load_embeddings(self):
+            return DeterministicFakeEmbedding(size=8)
+
+    monkeypatch.setattr(model_loader, "_loader", FakeLoader())
+    monkeypatch.setattr(settings, "FAISS_BASE", str(tmp_path))
+    FAISS.from_texts(["alpha"], DeterministicFakeEmbedding(size=8), metadatas=[{"source": "a.txt"}]).save_local(
+        str(tmp_path / "s1")
+    )
+
+    resp = client.post("/chat/query/stream", data={"question": "what?", "session_id": "s1", "k": 1})
+    assert resp.status_code == 200
+    events = [line.split(": ", 1)[1] for line in resp.text.splitlines() if line.startswith("event: ")]
+    assert events[0] == "sources" and events[-1] == "done" and "token" in events
+    assert '"answer": "streamed answer"' in resp.text
+
+
+def test_question_rewrite_runs_only_with_history_and_merges_hits(monkeypatch):
+    from langchain_core.documents import Document
+    from langchain_core.messages import AIMessage, HumanMessage
+    from langchain_core.runnables import RunnableLambda
+    from src.common.utils import model_loader
+    from src.common.utils.metrics import LLM_CALL_KEY
+    from src.core.document_chat.retrieval import ConversationalRAG
+
+    calls = []
+
+    def llm(prompt, config):
+        calls.append(config["metadata"][LLM_CALL_KEY])
+        return "rewritten question" if calls[-1] == "rewrite" else "answer"
+
+    class FakeLoader:
+        config = {"retriever": {"rewrite": {"min_history_messages": 1, "parallel_raw_retrieval": True},
+                                "rerank": {"enabled": False}, "answer_cache": {"enabled": False}}}
+        def load_llm(self):
+            return RunnableLambda(llm)
+
+    hits = {"raw question": ["a", "b", "c"], "rewritten question": ["b", "d", "e"]}
+    queries = []
+
+    def retrieve(query):
+        queries.append(query)
+        return [Document(page_content=t) for t in hits[query]]
+
+    monkeypatch.setattr(model_loader, "_loader", FakeLoader())
+    rag = ConversationalRAG(session_id="s1", retriever=RunnableLambda(retrieve))
+
+    assert rag.invoke("raw question", chat_history=[]) == "answer"
+    assert calls == ["answer"] and queries == ["raw question"]
+
+    calls.clear(), queries.clear()
+    history = [HumanMessage(content="earlier"), AIMessage(content="reply")]
+    docs = rag.retrieve_chain.invoke({"input": "raw question", "chat_history": history})
+    assert calls == ["rewrite"] and sorted(queries) == ["raw question", "rewritten question"]
+    assert [d.page_content for d in docs] == ["b", "a", "d"]  # rewritten first, interleaved, deduped, k kept
+
+    merged = ConversationalRAG._merge_candidates({"rewritten": [Document(page_content="x")],
+                                                  "raw": [Document(page_content="x"), Document(page_content="y")]})
+    assert [d.page_content for d in merged] == ["x", "y"]
+
+
+def test_rag_instances_share_retriever_but_not_llm_or_session(tmp_path, monkeypatch):
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from langchain_core.runnables import RunnableLambda
+    from langchain_community.vectorstores import FAISS
+    from src.common.utils import model_loader
+    from src.core.document_chat import vectorstore_cache
+    from src.core.document_chat.retrieval import ConversationalRAG
+    from src.core.document_ingestion.faiss_store import SegmentedFaissStore
+
+    replies = iter(["first llm", "second llm"])
+
+    class FakeLoader:
+        config = {"retriever": {"rerank": {"enabled": False}, "answer_cache": {"enabled": False}}}
+        def load_llm(self):
+            reply = next(replies)
+            return RunnableLambda(lambda prompt: reply)
+        def load_embeddings(self):
+            return DeterministicFakeEmbedding(size=8)
+
+    monkeypatch.setattr(model_loader, "_loader", FakeLoader())
+    monkeypatch.setattr(vectorstore_cache, "_cache", vectorstore_cache.VectorStoreCache())
+    FAISS.from_texts(["alpha"], DeterministicFakeEmbedding(size=8)).save_local(str(tmp_path / "s1"))
+    SegmentedFaissStore(tmp_path / "s1", DeterministicFakeEmbedding(size=8)).load()  # migrate the pickle
+
+    first, second = ConversationalRAG(session_id="a"), ConversationalRAG(session_id="b")
+    first.load_retriever_from_faiss(str(tmp_path / "s1"), k=1)
+    second.load_retriever_from_faiss(str(tmp_path / "s1"), k=1)
+    assert first.retriever is second.retriever and first.chain is not second.chain
+    assert first.invoke("q?") == "first llm" and second.invoke("q?") == "second llm"
+
+
+def test_answer_cache_exact_semantic_and_invalidation():
+    from src.core.document_chat.answer_cache import AnswerCache
+
+    cache = AnswerCache(ttl_seconds=60, max_entries=10, semantic_threshold=0.95)
+    scope = ("/idx/s1", "index@v1")
+    cache.put(scope, "What is the notice period?", "30 days", query_vector=[1.0, 0.0, 0.0])
+
+    assert cache.get(scope, "  what is the NOTICE period ").answer == "30 days"
+    assert cache.get(scope, "notice period length?", query_vector=[0.99, 0.05, 0.0]).answer == "30 days"
+    assert cache.get(scope, "who signed it?", query_vector=[0.0, 1.0, 0.0]) is None
+    assert cache.get(("/idx/s1", "index@v2"), "What is the notice period?") is None  # new index version
+
+    cache.invalidate("/idx/s1")
+    assert cache.get(scope, "What is the notice period?") is None
+    assert cache.stats()["exact_hits"] == 1 and cache.stats()["semantic_hits"] == 1
+
+
+def test_bm25_finds_exact_terms_and_round_trips(tmp_path):
+    from src.core.document_chat.hybrid_retriever import BM25Index, reciprocal_rank_fusion
+
+    idx = BM25Index()
+    idx.add([("d1", "General terms of the agreement."), ("d2", "Replace part AB-1234 every 6 months.")])
+    idx.add([("d3", "Clause 4.2.1 covers termination; see part AB-9999.")])
+    assert idx.search("AB-1234", k=3)[0][0] == "d2"
+    assert idx.search("clause 4.2.1", k=3)[0][0] == "d3"
+
+    idx.save(tmp_path)
+    loaded = BM25Index.load(tmp_path)
+    assert loaded.search("ab-9999", k=1) == idx.search("ab-9999", k=1)
+
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]])
+    assert [doc_id for doc_id, _ in fused] == ["a", "c", "b"]
+
+
+def test_bm25_adds_go_to_a_delta_scored_with_the_base():
+    import numpy as np
+    from src.core.document_chat.hybrid_retriever import BM25Index
+
+    docs = [(f"d{i}", f"clause {i} covers {'payment' if i % 3 else 'termination'} terms part-{i % 7}")
+            for i in range(300)]
+    bulk = BM25Index()
+    bulk.add(docs)
+    bulk.merge()
+
+    incremental = BM25Index(merge_ratio=None)  # merge only when asked
+    incremental.add(docs[:200])
+    incremental.merge()
+    base_postings = incremental.post_docs
+    for i in range(200, 300, 10):
+        incremental.add(docs[i:i + 10])
+    assert incremental.post_docs is base_postings and incremental.delta_postings > 0
+    for query in ("termination part-3", "payment clause 250", "unknown"):
+        assert incremental.search(query, k=5) == bulk.search(query, k=5)
+    assert np.allclose(incremental.idf(["payment", "part-3", "new"]), bulk.idf(["payment", "part-3", "new"]))
+
+    incremental.merge()
+    assert incremental.delta_postings == 0 and np.array_equal(incremental.post_docs, bulk.post_docs)
+
+    auto = BM25Index(merge_ratio=0.5)
+    auto.MIN_MERGE_POSTINGS = 100
+    auto.add(docs[:50])
+    assert auto.delta_postings == 0  # past the threshold: folded into the CSR
+
+
+def test_segmented_store_appends_segments_and_compacts(tmp_path):
+    import faiss
+    import numpy as np
+    from langchain_community.embeddings import FakeEmbeddings
+    from src.core.document_ingestion.faiss_store import SegmentedFaissStore
+
+    emb = FakeEmbeddings(size=8)
+    vecs = np.random.default_rng(0).normal(size=(6, 8)).astype(np.float32)
+    store = SegmentedFaissStore(tmp_path, emb, compact_ratio=10.0)
+    store.create(faiss.IndexFlatL2(8), ["a", "b", "c", "d"], ["alpha", "beta", "gamma", "delta"], [{}] * 4, vecs[:4])
+    base_file = store.base_dir() / "index.faiss"
+    base_mtime = base_file.stat().st_mtime_ns
+
+    base_postings = store.bm25.post_docs
+    store.append(["e", "f"], ["epsilon", "zeta"], [{}] * 2, vecs[4:])
+    assert len(list((tmp_path / "segments").glob("*.seg.npz"))) == 1
+    assert base_file.stat().st_mtime_ns == base_mtime
+    # the append's postings sit in the BM25 delta; the base CSR is untouched until compact()
+    assert store.bm25.post_docs is base_postings and store.bm25.search("zeta", k=1)[0][0] == "f"
+
+    reloaded = SegmentedFaissStore(tmp_path, emb)
+    assert reloaded.load().index.ntotal == 6
+    assert reloaded.replayed_ids == ["e", "f"] and reloaded.bm25.search("zeta", k=1)[0][0] == "f"
+
+    reloaded.compact()
+    assert not list((tmp_path / "segments").glob("*.seg.npz")) and not base_file.exists()
+    assert reloaded.bm25.delta_postings == 0
+    compacted = SegmentedFaissStore(tmp_path, emb)
+    assert compacted.load().index.ntotal == 6 and compacted.bm25.search("epsilon", k=1)[0][0] == "e"
+
+
+def test_segmented_store_instances_share_a_directory(tmp_path):
+    import faiss
+    import numpy as np
+    from langchain_community.embeddings import FakeEmbeddings
+    from src.core.document_ingestion.faiss_store import SegmentedFaissStore
+
+    emb = FakeEmbeddings(size=8)
+    vecs = np.random.default_rng(1).normal(size=(10, 8)).astype(np.float32)
+    SegmentedFaissStore(tmp_path, emb).create(faiss.IndexFlatL2(8), list("abcd"), list("abcd"), [{}] * 4, vecs[:4])
+
+    first, second = SegmentedFaissStore(tmp_path, emb), SegmentedFaissStore(tmp_path, emb)
+    first.load(), second.load()
+    first.append(["e", "f"], ["e", "f"], [{}] * 2, vecs[4:6])
+    second.append(["g", "h"], ["g", "h"], [{}] * 2, vecs[6:8])
+    assert len(list((tmp_path / "segments").glob("*.seg.npz"))) == 2
+    assert SegmentedFaissStore(tmp_path, emb).load().index.ntotal == 8
+
+    # compacting from a stale instance folds in the other's segment instead of dropping it
+    first.compact()
+    first.append(["i"], ["i"], [{}], vecs[8:9])
+    second.append(["j"], ["j"], [{}], vecs[9:10])
+    assert second.vs.index.ntotal == 10
+    reloaded = SegmentedFaissStore(tmp_path, emb).load()
+    assert sorted(reloaded.index_to_docstore_id.values()) == list("abcdefghij")
+
+
+def test_pickled_docstore_is_migrated_to_sqlite_and_mmap(tmp_path):
+    from langchain_community.embeddings import FakeEmbeddings
+    from langchain_community.vectorstores import FAISS
+    from src.core.document_ingestion.chunk_store import SQLiteDocstore
+    from src.core.document_ingestion.faiss_store import SegmentedFaissStore
+
+    emb = FakeEmbeddings(size=8)
+    FAISS.from_texts(["alpha", "beta", "gamma"], emb, ids=["a", "b", "c"]).save_local(str(tmp_path))
+
+    vs = SegmentedFaissStore(tmp_path, emb).load()
+    assert not (tmp_path / "index.pkl").exists() and not list(tmp_path.glob("base-*/*.pkl"))
+    assert isinstance(vs.docstore, SQLiteDocstore) and vs.docstore.search("b").page_content == "beta"
+
+    reloaded = SegmentedFaissStore(tmp_path, emb, bm25_enabled=False).load()
+    hit = reloaded.similarity_search_by_vector(emb.embed_query("x"), k=3)
+    assert sorted(d.page_content for d in hit) == ["alpha", "beta", "gamma"]
+
+
+def test_quantized_storage_shrinks_index_and_keeps_neighbours():
+    import faiss
+    import numpy as np
+    from src.core.document_ingestion.faiss_index import apply_search_params, build_index, resolve_index_config
+
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(3000, 64)).astype(np.float32)
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    sizes = {}
+    for storage in ("float32", "float16", "int8", "binary"):
+        cfg = resolve_index_config({"index": {"type": "flat", "storage": storage, "rescore_factor": 32}})
+        index = build_index(x, cfg)
+        index.add(x)
+        apply_search_params(index, cfg)
+        _, found = index.search(x[:20], 1)
+        assert (found[:, 0] == np.arange(20)).mean() >= 0.9
+        sizes[storage] = faiss.serialize_index(index).nbytes
+    assert sizes["float16"] < sizes["float32"] / 1.8 and sizes["int8"] < sizes["float32"] / 3.5
+
+
+def test_ann_index_types_match_flat_recall_and_reconstruct(tmp_path):
+    import faiss
+    import numpy as np
+    from src.core.document_ingestion.faiss_index import build_index, read_index_mmap, resolve_index_config
+
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(40, 32)).astype(np.float32)
+    x = (centers[rng.integers(0, 40, 4000)] + 0.3 * rng.normal(size=(4000, 32))).astype(np.float32)
+    queries, k = x[:50] + 0.05, 10
+    exact = faiss.IndexFlatL2(32)
+    exact.add(x)
+    _, truth = exact.search(queries, k)
+
+    for kind, extra in (("ivf_flat", {}), ("hnsw", {}), ("ivf_pq", {"pq_m": 16, "pq_nbits": 4})):
+        cfg = resolve_index_config({"index": {"type": kind, "nlist": 32, "nprobe": 8, **extra}})
+        index = build_index(x, cfg)
+        index.add(x)
+        _, found = index.search(queries, k)
+        recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+        assert recall >= (0.5 if kind == "ivf_pq" else 0.9), (kind, recall)  # PQ codes are lossy
+
+        # MMR re-reads stored vectors: IVF needs its direct map, also after a mapped reload
+        path = str(tmp_path / f"{kind}.faiss")
+        faiss.write_index(index, path)
+        for candidate in (index, read_index_mmap(path)):
+            assert candidate.reconstruct(7).shape == (32,)
+
+    small = build_index(x[:100], resolve_index_config({"index": {"type": "ivf_flat"}}))
+    assert isinstance(faiss.downcast_index(small), faiss.IndexFlat)  # too few vectors to train IVF
+
+
+def test_embedding_pipeline_batches_retries_and_streams():
+    from src.core.document_ingestion.embedding_pipeline import EmbeddingPipeline
+
+    class RateLimited(Exception):
+        status_code = 429
+
+    class FlakyEmbeddings:
+        def __init__(self):
+            self.calls = []
+        def embed_documents(self, texts):
+            self.calls.append(len(texts))
+            if len(self.calls) == 1:
+                raise RateLimited("slow down")
+            return [[float(len(t)), 1.0] for t in texts]
+
+    emb = FlakyEmbeddings()
+    pipeline = EmbeddingPipeline(emb, batch_tokens=10, batch_size=3, concurrency=2, backoff_base=0.01)
+    texts = ["x" * 16] * 5 + ["y" * 60]  # 4 + 15 estimated tokens
+    delivered = {}
+    stats = pipeline.run(texts, lambda idx, vecs: delivered.update(zip(idx, vecs[:, 0])))
+
+    assert sorted(delivered) == list(range(6)) and delivered[5] == 60.0
+    assert stats.retries == 1 and stats.batches == 4 and max(emb.calls) <= 3
+    assert stats.as_dict()["chunks_per_s"] > 0
+
+
+def test_uploads_stream_to_disk_with_size_caps(tmp_path):
+    import hashlib
+    import io
+    import anyio
+    import pytest
+    from fastapi import FastAPI, File, UploadFile as FastAPIUpload
+    from starlette.datastructures import UploadFile
+    from src.app.api.middleware import MaxBodySizeMiddleware
+    from src.common.utils.file_io import UploadTooLargeError, save_uploads_async
+
+    payload = b"%PDF" + b"x" * 3000
+    up = lambda name: UploadFile(io.BytesIO(payload), filename=name)
+    saved = anyio.run(lambda: save_uploads_async([up("a.pdf"), up("b.exe")], tmp_path, max_file_bytes=4096))
+    assert len(saved) == 1 and saved[0].size == len(payload)
+    assert saved[0].sha256 == hashlib.sha256(payload).hexdigest() and saved[0].path.read_bytes() == payload
+
+    with pytest.raises(UploadTooLargeError) as err:
+        anyio.run(lambda: save_uploads_async([up("c.pdf"), up("d.pdf")], tmp_path / "cap", max_total_bytes=5000))
+    assert err.value.scope == "request" and not list((tmp_path / "cap").iterdir())
+
+    mini = FastAPI()
+
+    @mini.post("/up")
+    async def _up(f: FastAPIUpload = File(...)):
+        return {"ok": True}
+
+    mini.add_middleware(MaxBodySizeMiddleware, max_bytes=1024)
+    c = TestClient(mini)
+    assert c.post("/up", files={"f": ("a.pdf", b"x" * 100)}).status_code == 200
+    assert c.post("/up", files={"f": ("a.pdf", b"x" * 5000)}).status_code == 413
+
+
+def test_parallel_parsing_yields_pages_in_order_and_is_cached(tmp_path, monkeypatch):
+    import shutil
+    import fitz
+    from src.common.utils import extraction_cache
+    from src.common.utils.document_ops import iter_documents, load_documents
+    from src.core.document_ingestion.data_ingestion import DocHandler
+
+    cache = extraction_cache.ExtractionCache(tmp_path / "extract.sqlite", memory_entries=1)
+    monkeypatch.setattr(extraction_cache, "_cache", cache)
+
+    paths = []
+    for name, pages in (("a.pdf", 5), ("b.pdf", 3)):
+        doc = fitz.open()
+        for i in range(pages):
+            doc.new_page().insert_text((72, 72), f"{name} page {i}")
+        doc.save(str(tmp_path / name))
+        paths.append(tmp_path / name)
+    (tmp_path / "c.txt").write_text("plain text", encoding="utf-8")
+    paths.append(tmp_path / "c.txt")
+
+    docs = list(iter_documents(paths, pages_per_task=2))  # 3 + 2 + 1 pool tasks
+    assert [d.page_content.strip() for d in docs[:6]] == [f"a.pdf page {i}" for i in range(5)] + ["b.pdf page 0"]
+    assert docs[4].metadata["page"] == 4 and docs[4].metadata["total_pages"] == 5
+    assert docs[-1].page_content == "plain text" and len(docs) == 9
+    assert len(load_documents([tmp_path / "b.pdf"])) == 3
+
+    # same bytes under another name, through the analyze path: served from the cache, not re-parsed
+    shutil.copy(tmp_path / "a.pdf", tmp_path / "renamed.pdf")
+    misses = cache.stats()["misses"]
+    text = DocHandler(data_dir=str(tmp_path / "an")).read_pdf(str(tmp_path / "renamed.pdf"))
+    assert "--- Page 5 ---" in text and "a.pdf page 4" in text
+    assert cache.stats()["misses"] == misses and cache.stats()["files"] == 3
+
+    # hashes known from the upload stream are used as-is: the file is not read just to hash it
+    from src.common.utils import document_ops
+    known = {str(tmp_path / "c.txt"): extraction_cache.file_sha256(tmp_path / "c.txt")}
+
+    def no_rehash(path):
+        raise AssertionError(f"re-hashed {path}")
+
+    monkeypatch.setattr(document_ops, "file_sha256", no_rehash)
+    assert [d.page_content for d in iter_documents([tmp_path / "c.txt"], shas=known)] == ["plain text"]
+
+
+def test_compare_sends_only_changed_pages_to_llm(monkeypatch):
+    import asyncio
+    import json
+    from langchain_core.messages import AIMessage
+    from langchain_core.runnables import RunnableLambda
+    from src.common.utils import model_loader
+    from src.core.document_compare.document_comparator import DocumentComparatorLLM
+
+    prompts = []
+
+    def fake_llm(prompt_value):
+        prompts.append(prompt_value.to_string())
+        rows = [{"Page": "Page 3 (actual 4)", "Changes": "Fee raised to $20"}] if "$20" in prompts[-1] else []
+        return AIMessage(content=json.dumps(rows))
+
+    class FakeLoader:
+        config = {"compare": {"max_pages_per_batch": 1}}
+        def load_llm(self):
+            return RunnableLambda(fake_llm)
+
+    monkeypatch.setattr(model_loader, "_loader", FakeLoader())
+    intro, terms = "Introduction to the agreement.", "Term: twelve months from signing."
+    fees, annex = "Fees: the monthly fee is $10 payable in advance.", "Annex A: contact details."
+    ref = [intro, terms, fees, annex]
+    act = [intro, "New section: data protection obligations.", "Term:  twelve months\nfrom signing.",
+           "Fees: the monthly fee is $20 payable in advance.", annex]
+
+    comp = DocumentComparatorLLM()
+    rows = asyncio.run(comp.acompare_pages(ref, act)).to_dict(orient="records")
+
+    assert [r["Page"] for r in rows] == ["1", "2 (added in actual)", "2 (actual 3)", "3 (actual 4)", "4 (actual 5)"]
+    assert [r["Changes"] for r in rows if r["Changes"] == "NO CHANGE"] == ["NO CHANGE"] * 3
+    assert rows[3]["Changes"] == "Fee raised to $20"
+    assert rows[1]["Changes"].startswith("Text changed")  # model returned no row for it: local summary
+    assert len(prompts) == 2  # one batch per changed page; identical / whitespace-only pages never sent
+    sent = "\n".join(prompts)
+    assert "$20" in sent and "data protection" in sent and intro not in sent and "Annex A" not in sent
+
+
+def test_large_document_analysis_is_map_reduced_with_pdf_metadata(tmp_path, monkeypatch):
+    import json
+    import fitz
+    from langchain_core.messages import AIMessage
+    from langchain_core.runnables import RunnableLambda
+    from src.common.utils import model_loader
+    from src.common.utils.parse_workers import pdf_metadata
+    from src.core.document_analyzer.data_analysis import DocumentAnalyzer, split_sections
+
+    calls = {"single": 0, "map": 0, "reduce": 0}
+    answer = json.dumps({
+        "Summary": ["combined"], "Title": "Guessed", "Author": ["Unknown"], "DateCreated": "n/a",
+        "LastModifiedDate": "n/a", "Publisher": "Acme", "Language": "English", "PageCount": "Not Available",
+        "SentimentTone": "neutral",
+    })
+
+    def fake_llm(prompt_value):
+        text = prompt_value.to_string()
+        if "Section notes:" in text:
+            calls["reduce"] += 1
+            assert "[Section 1]" in text
+            return AIMessage(content=answer)
+        if "Analyze this document:" in text:
+            calls["single"] += 1
+            return AIMessage(content=answer)
+        calls["map"] += 1
+        return AIMessage(content="- short note")
+
+    class FakeLoader:
+        config = {"analysis": {"single_pass_tokens": 200, "section_tokens": 120, "max_concurrency": 2}}
+        def load_llm(self):
+            return RunnableLambda(fake_llm)
+
+    monkeypatch.setattr(model_loader, "_loader", FakeLoader())
+    pdf = tmp_path / "big.pdf"
+    with fitz.open() as doc:
+        for i in range(6):
+            doc.new_page().insert_text((72, 72), f"Page {i} clause text")
+        doc.set_metadata({"title": "Master Services Agreement", "author": "Jane Doe; John Roe",
+                          "creationDate": "D:20240131093000+01'00'"})
+        doc.save(str(pdf))
+
+    text = "".join(f"\n--- Page {i + 1} ---\n" + ("word " * 150) for i in range(6))
+    sections = split_sections(text, 120)
+    assert len(sections) >= 6 and all(s.strip() for s in sections)
+
+    import asyncio
+    result = asyncio.run(DocumentAnalyzer().aanalyze_document(text, pdf_metadata=pdf_metadata(str(pdf))))
+    assert calls["map"] >= len(sections) and calls["reduce"] == 1
+    assert result["PageCount"] == 6 and result["Title"] == "Master Services Agreement"
+    assert result["Author"] == ["Jane Doe", "John Roe"] and result["DateCreated"] == "2024-01-31T09:30:00"
+    assert result["Publisher"] == "Acme" and result["LastModifiedDate"] == "n/a"
+
+    calls.update(single=0, map=0, reduce=0)
+    DocumentAnalyzer().analyze_document("small document")  # under single_pass_tokens: one call
+    assert calls == {"single": 1, "map": 0, "reduce": 0}
+
+
+def test_index_job_runs_in_background_and_survives_restart(tmp_path, monkeypatch):
+    import socket
+    import time
+    from langchain_core.embeddings import Embeddings
+    from src.app.api.config import settings
+    from src.common.utils import extraction_cache, model_loader
+    from src.core.document_ingestion import ingestion_jobs
+    from src.core.document_ingestion.ingestion_jobs import JOB_RUNNERS, IngestionJobQueue
+
+    class FakeEmbeddings(Embeddings):
+        def embed_documents(self, texts):
+            return [[float(len(t)), float(sum(map(ord, t)) % 97), 1.0] for t in texts]
+        def embed_query(self, text):
+            return self.embed_documents([text])[0]
+
+    class FakeLoader:
+        config = {"embedding_cache": {"path": str(tmp_path / "emb.sqlite")}, "embedding_pipeline": {"batch_size": 4}}
+        def load_embeddings(self):
+            return FakeEmbeddings()
+        def embedding_config(self):
+            return {"model_name": "fake", "dimensions": 3}
+
+    monkeypatch.setattr(model_loader, "_loader", FakeLoader())
+    monkeypatch.setattr(extraction_cache, "_cache", extraction_cache.ExtractionCache(tmp_path / "extract.sqlite"))
+    monkeypatch.setattr(settings, "UPLOAD_BASE", str(tmp_path / "data"))
+    monkeypatch.setattr(settings, "FAISS_BASE", str(tmp_path / "faiss"))
+    queue = IngestionJobQueue(tmp_path / "jobs.sqlite", JOB_RUNNERS, workers=1, poll_seconds=0.05)
+    monkeypatch.setattr(ingestion_jobs, "_queue", queue)
+
+    body = "\n\n".join(f"Paragraph {i} about clause {i}." for i in range(20))
+    try:
+        resp = client.post("/chat/index", files=[("files", ("a.txt", body.encode(), "text/plain"))],
+                           data={"session_id": "bg", "chunk_size": "100", "chunk_overlap": "0"})
+        assert resp.status_code == 202
+        status_url = resp.json()["status_url"]
+        for _ in range(200):
+            job = client.get(status_url).json()
+            if job["status"] in ("succeeded", "failed"):
+                break
+            time.sleep(0.05)
+    finally:
+        queue.stop()
+    assert job["status"] == "succeeded", job
+    assert job["result"]["session_id"] == "bg" and job["result"]["chunks_added"] > 1
+    progress = job["progress"]
+    assert progress["pages_parsed"] == 1 and progress["chunks"] == progress["chunks_embedded"]
+    assert progress["vectors_written"] == job["result"]["chunks_added"]
+    assert client.get("/chat/index/nope").status_code == 404
+
+    # a job left "running" by a dead process is requeued when the next process starts its workers
+    runs = []
+    path = tmp_path / "restart.sqlite"
+    first = IngestionJobQueue(path, {"echo": lambda params, progress: runs.append(params) or {"ok": True}})
+    job_id = first.submit("echo", {"n": 1}).id
+    first._conn.execute("UPDATE jobs SET status='running', owner=?, attempts=1 WHERE id=?",
+                        (f"{socket.gethostname()}:999999999", job_id))
+    second = IngestionJobQueue(path, {"echo": lambda params, progress: runs.append(params) or {"ok": True}})
+    assert second.requeue_orphans() == 1 and second.run_pending() == 1
+    done = second.get(job_id)
+    assert done.status == "succeeded" and done.attempts == 2 and runs == [{"n": 1}]
+
+
+def test_running_job_heartbeats_and_is_not_requeued_while_its_owner_lives(tmp_path):
+    import threading
+    import time
+    from src.core.document_ingestion.ingestion_jobs import IngestionJobQueue
+
+    release, runs = threading.Event(), []
+
+    def silent(params, progress):  # long stage, no progress callbacks
+        runs.append(params)
+        release.wait(5)
+        return {"ok": True}
+
+    queue = IngestionJobQueue(tmp_path / "jobs.sqlite", {"silent": silent}, workers=1, poll_seconds=0.02,
+                              stale_after_seconds=0.1, heartbeat_seconds=0.05)
+    job_id = queue.submit("silent", {"n": 1}).id
+    queue.start()
+    try:
+        while not runs:
+            time.sleep(0.01)
+        first_beat = queue.get(job_id).updated_at
+        time.sleep(0.3)  # several poll rounds past stale_after_seconds
+        assert queue.requeue_orphans() == 0 and queue.get(job_id).status == "running"
+        assert queue.get(job_id).updated_at > first_beat
+
+        # the same row seen from another host: fresh heartbeats keep it, a silent one is requeued
+        other = IngestionJobQueue(tmp_path / "jobs.sqlite", {"silent": silent}, stale_after_seconds=0.1)
+        queue._conn.execute("UPDATE jobs SET owner='elsewhere:1' WHERE id=?", (job_id,))
+        assert other.requeue_orphans() == 0
+        queue._conn.execute("UPDATE jobs SET updated_at=updated_at-10 WHERE id=?", (job_id,))
+        assert other.requeue_orphans() == 1
+    finally:
+        release.set()
+        queue.stop()
+
+
+def test_index_jobs_for_one_session_run_one_at_a_time(tmp_path, monkeypatch):
+    import hashlib
+    import threading
+    import time
+    from langchain_core.embeddings import Embeddings
+    from src.common.utils import extraction_cache, model_loader
+    from src.core.document_ingestion.faiss_store import SegmentedFaissStore
+    from src.core.document_ingestion.ingestion_jobs import (
+        JOB_SERIAL_KEYS, IngestionJobQueue, run_chat_index_job,
+    )
+
+    class FakeEmbeddings(Embeddings):
+        def embed_documents(self, texts):
+            return [[float(len(t)), float(sum(map(ord, t)) % 97), 1.0] for t in texts]
+        def embed_query(self, text):
+            return self.embed_documents([text])[0]
+
+    class FakeLoader:
+        config = {"embedding_cache": {"path": str(tmp_path / "emb.sqlite")}, "embedding_pipeline": {"batch_size": 4}}
+        def load_embeddings(self):
+            return FakeEmbeddings()
+        def embedding_config(self):
+            return {"model_name": "fake", "dimensions": 3}
+
+    monkeypatch.setattr(model_loader, "_loader", FakeLoader())
+    monkeypatch.setattr(extraction_cache, "_cache", extraction_cache.ExtractionCache(tmp_path / "extract.sqlite"))
+
+    running, overlaps = [], []
+    guard = threading.Lock()
+
+    def runner(params, progress):
+        with guard:
+            running.append(params["session_id"])
+            overlaps.append(running.count(params["session_id"]) > 1)
+        try:
+            time.sleep(0.1)
+            return run_chat_index_job(params, progress)
+        finally:
+            with guard:
+                running.remove(params["session_id"])
+
+    queue = IngestionJobQueue(tmp_path / "jobs.sqlite", {"chat_index": runner}, workers=2, poll_seconds=0.05,
+                              serial_keys=JOB_SERIAL_KEYS)
+    jobs = []
+    for name, word in (("a.txt", "alpha"), ("b.txt", "bravo")):
+        src = tmp_path / "uploads" / name
+        src.parent.mkdir(exist_ok=True)
+        src.write_text("\n\n".join(f"{word} paragraph {i}." for i in range(10)))
+        jobs.append(queue.submit("chat_index", {
+            "session_id": "s1", "use_session_dirs": True, "temp_base": str(tmp_path / "data"),
+            "faiss_base": str(tmp_path / "faiss"), "chunk_size": 40, "chunk_overlap": 0, "k": 3,
+            "files": [{"path": str(src), "name": name, "sha256": hashlib.sha256(src.read_bytes()).hexdigest(), "size": src.stat().st_size}],
+        }).id)
+    queue.start()
+    try:
+        for _ in range(200):
+            if all(queue.get(j).status in ("succeeded", "failed") for j in jobs):
+                break
+            time.sleep(0.05)
+    finally:
+        queue.stop()
+    assert [queue.get(j).status for j in jobs] == ["succeeded", "succeeded"]
+    assert overlaps == [False, False]
+
+    vs = SegmentedFaissStore(tmp_path / "faiss" / "s1", FakeEmbeddings()).load()
+    texts = [d.page_content for d in vs.similarity_search("paragraph", k=vs.index.ntotal)]
+    assert any("alpha" in t for t in texts) and any("bravo" in t for t in texts)
+
+
+def test_metrics_time_stages_llm_calls_tokens_and_parser_retries():
+    import pytest
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel, GenericFakeChatModel
+    from langchain_core.messages import AIMessage
+    from langchain_core.output_parsers import JsonOutputParser
+    from langchain.output_parsers import OutputFixingParser
+    from src.common.utils.metrics import (
+        LLM_SECONDS, LLM_TOKENS, PARSER_RETRIES, STAGE_ERRORS, STAGE_SECONDS, count_parser_retries,
+        llm_metrics_callback, tag_llm, timed,
+    )
+
+    before = STAGE_SECONDS.count(stage="unit_test"), STAGE_ERRORS.value(stage="unit_test")
+    with timed("unit_test"):
+        pass
+    with pytest.raises(RuntimeError), timed("unit_test"):
+        raise RuntimeError("boom")
+    assert STAGE_SECONDS.count(stage="unit_test") == before[0] + 2
+    assert STAGE_ERRORS.value(stage="unit_test") == before[1] + 1
+
+    usage = {"input_tokens": 11, "output_tokens": 4, "total_tokens": 15}
+    llm = GenericFakeChatModel(messages=iter([AIMessage(content="hi", usage_metadata=usage)]),
+                               callbacks=[llm_metrics_callback()])
+    tag_llm(llm, "unit_answer").invoke("hello")  # fake models report no model name
+    assert LLM_SECONDS.count(call="unit_answer", model="unknown") == 1
+    assert LLM_TOKENS.value(call="unit_answer", model="unknown", kind="prompt") == 11
+    assert LLM_TOKENS.value(call="unit_answer", model="unknown", kind="completion") == 4
+
+    fixer = FakeListChatModel(responses=['{"ok": true}'])
+    parser = count_parser_retries(OutputFixingParser.from_llm(parser=JsonOutputParser(), llm=fixer), "unit")
+    retries = PARSER_RETRIES.value(parser="unit")
+    assert parser.parse("not json") == {"ok": True}
+    assert PARSER_RETRIES.value(parser="unit") == retries + 1
+
+    resp = client.get("/metrics")
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'docportal_stage_seconds_bucket{stage="unit_test",le="+Inf"}' in resp.text
+    assert 'docportal_llm_tokens_total{call="unit_answer",model="unknown",kind="prompt"} 11' in resp.text
+    assert "# TYPE docportal_stage_seconds histogram" in resp.text
+
+
+def test_logging_is_configured_once_queued_and_sampled(tmp_path, monkeypatch):
+    import os
+    import json
+    from src.common.logger import custom_logger as cl
+
+    monkeypatch.chdir(tmp_path)
+    cl.shutdown_logging()
+    try:
+        path = cl.configure_logging("logs", config={"console": False, "sample": {"noisy": 0.25, "muted": 0}})
+        assert cl.CustomLogger().log_file_path == path == cl.CustomLogger("logs").log_file_path
+        log = cl.CustomLogger().get_logger("component.py")
+        for i in range(8):
+            log.info("noisy", i=i)
+            log.info("muted", i=i)
+        log.debug("below level")
+        log.error("kept", code=1)
+        stats = cl.logging_stats()
+        cl.shutdown_logging()  # drains the queue
+
+        lines = [json.loads(line) for line in open(path, encoding="utf-8")]
+        assert [l["event"] for l in lines] == ["noisy", "noisy", "kept"]
+        assert lines[0]["sampled_1_in"] == 4 and lines[2]["level"] == "error"
+        assert stats["sampled_events"] == {"noisy": 8}
+        assert os.listdir(tmp_path / "logs") == [os.path.basename(path)]
+    finally:
+        cl.shutdown_logging()
+        monkeypatch.undo()
+        cl.configure_logging()
+
+
+def test_offline_benchmark_runs_all_workloads_and_flags_regressions(tmp_path):
+    from src.common.utils.embedding_providers import HashingEmbeddings
+    from benchmarks.offline_benchmark import WORKLOADS, compare_to_baseline, run_benchmark
+    from src.common.utils import model_loader
+
+    emb = HashingEmbeddings(64)
+    assert emb.embed_query("late payment fee") == emb.embed_documents(["Late payment, fee!"])[0]
+
+    before = model_loader._loader
+    report = run_benchmark([2], docs=3, queries=3, latency=0.0, tokens_per_second=0, dimensions=64,
+                           workdir=tmp_path)
+    assert model_loader._loader is before  # the offline loader is uninstalled afterwards
+    results = report["results"]
+    assert sorted(results) == sorted(f"{w}/2" for w in WORKLOADS)
+    assert results["ingest/2"]["chunks"] > 0 and results["ingest/2"]["llm_tokens"] == 0
+    assert results["chat/2"]["n"] == 3 and results["chat/2"]["llm_tokens"] > 0
+    assert all(r["p50_ms"] <= r["p95_ms"] <= r["p99_ms"] and r["peak_rss_mb"] > 0 for r in results.values())
+
+    assert compare_to_baseline(report, report) == []
+    slower = {"results": {k: {**v, "p95_ms": v["p95_ms"] / 2, "throughput": v["throughput"] * 2}
+                          for k, v in results.items()}}
+    assert len(compare_to_baseline(report, slower, tolerance=0.2)) == 2 * len(WORKLOADS)
+
+
+def test_local_embedding_providers_are_selected_from_config(tmp_path, monkeypatch):
+    import os
+    import numpy as np
+    import pytest
+    from src.common.exception.custom_exception import DocumentPortalException
+    from src.common.utils.embedding_providers import HashingEmbeddings
+    from src.common.utils.model_loader import ModelLoader
+    from src.core.document_ingestion.data_ingestion import FaissManager
+
+    monkeypatch.setenv("ENV", "production")
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("GROQ_API_KEY", "gsk-test")
+    loader = ModelLoader()
+    loader.config["embedding_cache"] = {"path": str(tmp_path / "emb.sqlite")}
+    assert loader.embedding_config()["provider"] == "openai"
+    assert loader.embedding_pipeline_config()["requests_per_minute"] == 3000
+
+    monkeypatch.setenv("EMBEDDING_PROVIDER", "hashing")
+    emb = loader.load_embeddings()
+    assert isinstance(emb, HashingEmbeddings) and loader.load_embeddings() is emb
+    vecs = np.asarray(emb.embed_documents(["late payment fee", "fee for late payment", "server uptime", ""]))
+    assert vecs.shape == (4, loader.embedding_config()["dimensions"])
+    assert np.allclose(np.linalg.norm(vecs, axis=1), 1.0)
+    assert vecs[0] @ vecs[1] > vecs[0] @ vecs[2]
+    assert emb.embed_query("late payment fee") == emb.embed_documents(["late payment fee"])[0]
+
+    fm = FaissManager(tmp_path / "index", loader)  # no API budget or retries for in-process providers
+    assert fm.pipeline.max_retries == 0 and fm.pipeline.concurrency == (os.cpu_count() or 1)
+    assert fm.pipeline.batch_size == loader.config["embedding_pipeline"]["batch_size"]
+
+    loader.config["embedding_model"]["local"]["model_path"] = str(tmp_path / "missing-model")
+    monkeypatch.setenv("EMBEDDING_PROVIDER", "local")
+    with pytest.raises(DocumentPortalException):
+        loader.load_embeddings()
+    monkeypatch.setenv("EMBEDDING_PROVIDER", "nope")
+    with pytest.raises(DocumentPortalException):
+        loader.load_embeddings()
+
+
+def test_stale_ingestion_meta_without_index_is_ignored(tmp_path):
+    import json
+    from benchmarks.fakes import OfflineModelLoader
+    from src.core.document_ingestion.data_ingestion import FaissManager
+
+    loader = OfflineModelLoader(dimensions=16)
+    loader.config["embedding_cache"] = {"enabled": False}
+    texts = ["Invoices are payable within thirty days.", "The agreement renews every year."]
+    index_dir = tmp_path / "index"
+    index_dir.mkdir()
+    rows = {FaissManager._fingerprint(t, {}): True for t in texts}
+    (index_dir / "ingested_meta.json").write_text(json.dumps({"rows": rows, "files": {"abc": {"name": "a.txt"}}}))
+
+    fm = FaissManager(index_dir, loader)  # meta says everything is ingested, but there is no index
+    assert not fm.has_file("abc")
+    vs = fm.load_or_create(texts=texts, metadatas=[{}, {}])
+    assert fm.created == 2 and vs.index.ntotal == 2
+    assert FaissManager(index_dir, loader).load_or_create().index.ntotal == 2
+
+
+def test_rerank_over_fetches_top_k_and_keeps_best_k(tmp_path, monkeypatch):
+    import io
+    from langchain_core.documents import Document
+    from benchmarks.fakes import OfflineModelLoader, install_offline_loader
+    from src.common.utils import extraction_cache, model_loader
+    from src.common.utils.config_loader import load_config
+    from src.core.document_chat.reranker import LexicalReranker
+    from src.core.document_chat.retrieval import ConversationalRAG
+    from src.core.document_ingestion.data_ingestion import ChatIngestor
+
+    dup = "Invoices are payable within thirty days; late payment accrues interest."
+    candidates = [Document(page_content="Office opening hours and parking.", id="a"),
+                  Document(page_content=dup, id="b"), Document(page_content=dup + " ", id="c"),
+                  Document(page_content="Termination requires ninety days written notice.", id="d")]
+    picked = LexicalReranker(mmr_lambda=0.5).rerank("late payment interest on invoices", candidates, 2)
+    assert [d.id for d in picked][0] == "b" and "c" not in [d.id for d in picked]  # near-duplicate dropped
+    assert "rerank_score" in picked[0].metadata and "rerank_score" not in candidates[1].metadata
+
+    cfg = load_config()
+    cfg["embedding_cache"] = {"path": str(tmp_path / "emb.sqlite")}
+    cfg["retriever"] = {**cfg["retriever"], "top_k": 6, "search_type": "similarity", "answer_cache": {"enabled": False}}
+    monkeypatch.setattr(model_loader, "_loader", None)
+    install_offline_loader(OfflineModelLoader(cfg, latency=0.0, tokens_per_second=0, dimensions=64))
+    monkeypatch.setattr(extraction_cache, "_cache", extraction_cache.ExtractionCache(tmp_path / "extract.sqlite"))
+
+    f = io.BytesIO("\n\n".join(f"Clause {i}: topic {t} applies to section {i}." for i, t in
+                               enumerate(["payment", "privacy", "audit", "payment", "renewal", "audit"] * 3)).encode())
+    f.name = "contract.txt"
+    ci = ChatIngestor(temp_base=str(tmp_path / "data"), faiss_base=str(tmp_path / "faiss"), session_id="rr")
+    ci.built_retriver([f], chunk_size=60, chunk_overlap=0)
+
+    rag = ConversationalRAG(session_id="rr")
+    retriever = rag.load_retriever_from_faiss(str(ci.faiss_dir), k=2)
+    assert retriever.search_kwargs["k"] == 6  # first stage over-fetches retriever.top_k
+    docs = rag.retrieve_chain.invoke({"input": "payment clause", "chat_history": []})
+    assert len(docs) == 2 and all("rerank_score" in d.metadata for d in docs)
+    assert "payment" in docs[0].page_content